@@ -0,0 +1,60 @@
+"""Compare two benchmark reports written by `benchmarks.run`.
+
+    python -m benchmarks.compare benchmarks/results/before.json benchmarks/results/after.json
+"""
+import argparse
+import json
+from typing import Any, Dict, Optional
+
+# (label, path into a scenario result, whether higher is better)
+METRICS = [
+    ("throughput rps", ("throughput_rps",), True),
+    ("p50 ms", ("latency_ms", "p50"), False),
+    ("p95 ms", ("latency_ms", "p95"), False),
+    ("p99 ms", ("latency_ms", "p99"), False),
+    ("errors", ("errors",), False),
+    ("tcg calls", ("upstream_calls", "tcg", "total"), False),
+    ("notion calls", ("upstream_calls", "notion", "total"), False),
+    ("peak rss MB", ("peak_rss_mb",), False)
+]
+
+def lookup(result: Dict[str, Any], path) -> Optional[float]:
+    for key in path:
+        if not isinstance(result, dict):
+            return None
+        result = result.get(key, 0 if key == "total" else None)
+    return result
+
+def format_change(before: Optional[float], after: Optional[float], higher_is_better: bool) -> str:
+    if before is None or after is None:
+        return ""
+    if before == 0:
+        return "" if after == 0 else "new"
+    change = (after - before) / before * 100
+    better = change > 0 if higher_is_better else change < 0
+    return f"{change:+.1f}%{' (better)' if better and abs(change) >= 1 else ''}"
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    print(f"before: {before.get('commit')} ({before.get('timestamp')})")
+    print(f"after:  {after.get('commit')} ({after.get('timestamp')})")
+    for name in after["scenarios"]:
+        if name not in before["scenarios"]:
+            continue
+        print(f"\n{name}")
+        for label, path, higher_is_better in METRICS:
+            old = lookup(before["scenarios"][name], path)
+            new = lookup(after["scenarios"][name], path)
+            print(f"  {label:<15}{str(old):>12}{str(new):>12}  {format_change(old, new, higher_is_better)}")
+
+if __name__ == "__main__":
+    main()
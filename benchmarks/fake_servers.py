@@ -0,0 +1,227 @@
+"""Local stand-ins for the Pokemon TCG and Notion APIs used by the benchmarks.
+
+Both servers add a configurable latency to every request, can answer a share of
+requests with 429 + Retry-After, and count the calls they receive at `/_stats`.
+
+    python -m benchmarks.fake_servers --tcg-port 9001 --notion-port 9002 --latency-ms 80
+"""
+import argparse
+import asyncio
+import random
+import re
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from notion_integration import REQUIRED_PROPERTIES, get_rich_text
+
+# Card names cycled through every fake set
+CARD_NAMES = ["Pikachu", "Charizard", "Bulbasaur", "Squirtle", "Eevee", "Mewtwo", "Gengar", "Snorlax"]
+
+class FakeServerConfig:
+    """Behaviour shared by both fake servers."""
+
+    def __init__(self, latency_ms: float = 50.0, jitter_ms: float = 10.0, rate_limit_ratio: float = 0.0, retry_after: float = 0.5):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+
+def card_ids(sets: int, cards_per_set: int) -> List[str]:
+    """Ids of every card the fake Pokemon TCG API serves."""
+    return [f"bench{set_number}-{number}" for set_number in range(1, sets + 1) for number in range(1, cards_per_set + 1)]
+
+def make_card(card_id: str) -> Dict[str, Any]:
+    set_id, number = card_id.rsplit("-", 1)
+    return {
+        "id": card_id,
+        "name": CARD_NAMES[int(number) % len(CARD_NAMES)],
+        "set": {"id": set_id, "name": f"Benchmark Set {set_id[5:]}", "updatedAt": "2024/01/01 00:00:00"},
+        "rarity": "Rare" if int(number) % 5 == 0 else "Common",
+        "number": number,
+        "images": {"small": f"https://example.com/{card_id}.png", "large": f"https://example.com/{card_id}_hires.png"},
+        "cardmarket": {"prices": {"averageSellPrice": round(0.5 + int(number) * 0.75, 2)}}
+    }
+
+def add_instrumentation(app: FastAPI, config: FakeServerConfig) -> Counter:
+    """Count calls by route, add latency and inject 429s; returns the live counters."""
+    calls: Counter = Counter()
+
+    @app.middleware("http")
+    async def simulate(request: Request, call_next):
+        if request.url.path.startswith("/_"):
+            return await call_next(request)
+        route = re.sub(r"/[0-9a-f-]{32,36}|/bench\d+-\d+", "/{id}", request.url.path)
+        calls[f"{request.method} {route}"] += 1
+        calls["total"] += 1
+        delay = max(0.0, config.latency_ms + random.uniform(-config.jitter_ms, config.jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+        if config.rate_limit_ratio and random.random() < config.rate_limit_ratio:
+            calls["rate_limited"] += 1
+            return JSONResponse(
+                {"object": "error", "status": 429, "code": "rate_limited", "message": "Rate limited"},
+                status_code=429,
+                headers={"Retry-After": str(config.retry_after)}
+            )
+        return await call_next(request)
+
+    @app.get("/_stats")
+    async def stats():
+        return dict(calls)
+
+    @app.post("/_reset")
+    async def reset():
+        calls.clear()
+        return {}
+
+    return calls
+
+def create_tcg_app(config: FakeServerConfig, sets: int = 5, cards_per_set: int = 40) -> FastAPI:
+    """Fake Pokemon TCG API supporting the name, set and id queries the app sends."""
+    app = FastAPI()
+    add_instrumentation(app, config)
+    cards = {card_id: make_card(card_id) for card_id in card_ids(sets, cards_per_set)}
+
+    def matches(card: Dict[str, Any], query: str) -> bool:
+        ids = re.findall(r'id:"([^"]+)"', query)
+        if ids and "set.id" not in query:
+            return card["id"] in ids
+        name = re.search(r'name:"([^"]+)"', query)
+        if name and name.group(1).lower() not in card["name"].lower():
+            return False
+        set_id = re.search(r'set\.id:"?([\w.-]+)"?', query)
+        return not set_id or card["set"]["id"] == set_id.group(1)
+
+    @app.get("/v2/cards")
+    async def search(q: str = "", page: int = 1, pageSize: int = 250, select: Optional[str] = None):
+        found = [card for card in cards.values() if matches(card, q)]
+        data = found[(page - 1) * pageSize:page * pageSize]
+        if select:
+            fields = select.split(",")
+            data = [{field: card[field] for field in fields if field in card} for card in data]
+        return {"data": data, "page": page, "pageSize": pageSize, "count": len(data), "totalCount": len(found)}
+
+    @app.get("/v2/cards/{card_id}")
+    async def get_card(card_id: str):
+        if card_id not in cards:
+            return JSONResponse({"error": "Not found"}, status_code=404)
+        return {"data": cards[card_id]}
+
+    @app.get("/v2/sets")
+    async def get_sets(page: int = 1, pageSize: int = 250):
+        all_sets = list({card["set"]["id"]: card["set"] for card in cards.values()}.values())
+        return {"data": all_sets[(page - 1) * pageSize:page * pageSize], "totalCount": len(all_sets)}
+
+    return app
+
+def create_notion_app(config: FakeServerConfig, page_size: int = 100) -> FastAPI:
+    """Fake Notion API holding one in-memory database."""
+    app = FastAPI()
+    add_instrumentation(app, config)
+    pages: Dict[str, Dict[str, Any]] = {}
+    lock = threading.Lock()
+
+    def now() -> str:
+        return datetime.now(timezone.utc).isoformat()
+
+    @app.get("/v1/databases/{database_id}")
+    async def retrieve_database(database_id: str):
+        return {
+            "object": "database",
+            "id": database_id,
+            "title": [{"text": {"content": "Benchmark collection"}, "plain_text": "Benchmark collection"}],
+            "properties": {name: {"type": prop_type} for name, prop_type in REQUIRED_PROPERTIES.items()}
+        }
+
+    @app.patch("/v1/databases/{database_id}")
+    async def update_database(database_id: str):
+        return await retrieve_database(database_id)
+
+    @app.post("/v1/databases/{database_id}/query")
+    async def query_database(database_id: str, request: Request):
+        body = await request.json()
+        results = list(pages.values())
+        query_filter = body.get("filter") or {}
+        if query_filter.get("property") == "Card ID":
+            card_id = query_filter["rich_text"]["equals"]
+            results = [page for page in results if get_rich_text(page, "Card ID") == card_id]
+        elif "last_edited_time" in query_filter:
+            since = query_filter["last_edited_time"]["on_or_after"]
+            results = [page for page in results if page["last_edited_time"] >= since]
+
+        start = int(body.get("start_cursor") or 0)
+        size = min(body.get("page_size", page_size), page_size)
+        chunk = results[start:start + size]
+        has_more = start + size < len(results)
+        return {"object": "list", "results": chunk, "has_more": has_more, "next_cursor": str(start + size) if has_more else None}
+
+    def with_plain_text(properties: Dict[str, Any]) -> Dict[str, Any]:
+        for prop_name, prop in properties.items():
+            prop_type = REQUIRED_PROPERTIES.get(prop_name) or next(iter(prop))
+            prop["type"] = prop_type
+            if prop_type in ("title", "rich_text"):
+                for part in prop.get(prop_type) or []:
+                    part["plain_text"] = part.get("text", {}).get("content", "")
+        return properties
+
+    @app.post("/v1/pages")
+    async def create_page(request: Request):
+        body = await request.json()
+        page_id = str(uuid.uuid4())
+        page = {
+            "object": "page",
+            "id": page_id,
+            "archived": False,
+            "created_time": now(),
+            "last_edited_time": now(),
+            "properties": with_plain_text(body.get("properties", {}))
+        }
+        with lock:
+            pages[page_id] = page
+        return page
+
+    @app.patch("/v1/pages/{page_id}")
+    async def update_page(page_id: str, request: Request):
+        body = await request.json()
+        with lock:
+            page = pages.get(page_id)
+            if page is None:
+                return JSONResponse({"object": "error", "status": 404, "code": "object_not_found", "message": "Not found"}, status_code=404)
+            page["properties"].update(with_plain_text(body.get("properties", {})))
+            page["last_edited_time"] = now()
+        return page
+
+    return app
+
+def serve(app: FastAPI, port: int) -> uvicorn.Server:
+    """Start an app on a background thread and return its server."""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run fake Pokemon TCG and Notion APIs")
+    parser.add_argument("--tcg-port", type=int, default=9001)
+    parser.add_argument("--notion-port", type=int, default=9002)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Pokemon TCG API latency")
+    parser.add_argument("--notion-latency-ms", type=float, default=150.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="Share of Notion requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=0.5)
+    parser.add_argument("--sets", type=int, default=5)
+    parser.add_argument("--cards-per-set", type=int, default=40)
+    parser.add_argument("--notion-page-size", type=int, default=100)
+    args = parser.parse_args()
+
+    tcg = serve(create_tcg_app(FakeServerConfig(args.latency_ms, args.jitter_ms), args.sets, args.cards_per_set), args.tcg_port)
+    notion = create_notion_app(
+        FakeServerConfig(args.notion_latency_ms, args.jitter_ms, args.rate_limit_ratio, args.retry_after),
+        args.notion_page_size
+    )
+    uvicorn.run(notion, host="127.0.0.1", port=args.notion_port, log_level="warning")
@@ -0,0 +1,293 @@
+"""Benchmark the app end to end against local fake Pokemon TCG and Notion servers.
+
+Starts the fake servers and the app (via uvicorn) as subprocesses, drives the chosen
+endpoints at a fixed concurrency and writes a JSON report with throughput, latency
+percentiles, upstream call counts and the app's peak memory for each scenario.
+
+    python -m benchmarks.run --scenarios search,upload,report --concurrency 16 --requests 200
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+from PIL import Image, ImageDraw
+
+from benchmarks.fake_servers import CARD_NAMES, card_ids
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+# (method, path, httpx request kwargs) for the i-th request of a scenario
+RequestBuilder = Callable[[int], Tuple[str, str, Dict[str, Any]]]
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Process serving {url} exited with code {process.returncode}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+def git_revision() -> Dict[str, Any]:
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, text=True).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT, text=True).strip())
+        return {"commit": commit, "dirty": dirty}
+    except Exception:
+        return {"commit": None, "dirty": None}
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    """Peak resident memory of a process (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+def reset_peak_rss(pid: int) -> None:
+    """Restart peak memory tracking so each scenario reports its own peak (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+def make_card_image(card_id: str) -> Image.Image:
+    """A synthetic card image, deterministic per card id."""
+    rng = np.random.default_rng(zlib.crc32(card_id.encode()))
+    image = Image.new("RGB", (245, 342), "white")
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = rng.integers(0, 200), rng.integers(0, 300)
+        draw.rectangle([x, y, x + rng.integers(20, 80), y + rng.integers(20, 80)], fill=tuple(int(v) for v in rng.integers(0, 255, 3)))
+    return image
+
+def build_upload_fixtures(directory: str, ids: List[str]) -> Tuple[str, List[bytes]]:
+    """Write a hash index for the fake cards and return its path with one JPEG per card."""
+    from image_processing import HashIndex, compute_phash
+
+    images = [make_card_image(card_id) for card_id in ids]
+    index = HashIndex(ids, np.array([compute_phash(image) for image in images], dtype=np.uint64))
+    path = os.path.join(directory, "card_hashes.npz")
+    index.save(path)
+
+    encoded = []
+    for image in images:
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=85)
+        encoded.append(buffer.getvalue())
+    return path, encoded
+
+def scenario_builders(args: argparse.Namespace, images: List[bytes]) -> Dict[str, RequestBuilder]:
+    return {
+        "search": lambda i: ("GET", "/api/cards/search", {
+            "params": {"query": CARD_NAMES[i % len(CARD_NAMES)], "page_size": args.page_size}
+        }),
+        "upload": lambda i: ("POST", "/api/cards/upload", {
+            "files": {"file": (f"card{i}.jpg", images[i % len(images)], "image/jpeg")}
+        }),
+        "report": lambda i: ("POST", "/api/cards/report", {
+            "params": {
+                "query": CARD_NAMES[i % len(CARD_NAMES)],
+                "set_id": f"bench{i % args.sets + 1}",
+                "group_id": f"bench-{i}"
+            }
+        })
+    }
+
+async def drive(client: httpx.AsyncClient, build: RequestBuilder, requests: int, concurrency: int) -> Dict[str, Any]:
+    """Send `requests` requests from `concurrency` workers and summarize the latencies."""
+    latencies: List[float] = []
+    errors = 0
+    next_request = 0
+
+    async def worker() -> None:
+        nonlocal errors, next_request
+        while next_request < requests:
+            i = next_request
+            next_request += 1
+            method, path, kwargs = build(i)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                ok = response.status_code == 200 and response.json().get("success", True)
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - started
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "requests": requests,
+        "errors": errors,
+        "duration_seconds": round(duration, 3),
+        "throughput_rps": round(requests / duration, 2),
+        "latency_ms": {
+            "mean": round(float(latencies_ms.mean()), 2),
+            "p50": round(float(np.percentile(latencies_ms, 50)), 2),
+            "p95": round(float(np.percentile(latencies_ms, 95)), 2),
+            "p99": round(float(np.percentile(latencies_ms, 99)), 2),
+            "max": round(float(latencies_ms.max()), 2)
+        }
+    }
+
+async def run_scenarios(args: argparse.Namespace, app_url: str, upstream_urls: Dict[str, str], app_pid: int, images: List[bytes]) -> Dict[str, Any]:
+    builders = scenario_builders(args, images)
+    results = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=app_url, timeout=args.timeout, limits=limits) as client:
+        for name in args.scenarios:
+            for url in upstream_urls.values():
+                await client.post(f"{url}/_reset")
+            reset_peak_rss(app_pid)
+
+            print(f"Running {name}: {args.requests} requests at concurrency {args.concurrency}", file=sys.stderr)
+            result = await drive(client, builders[name], args.requests, args.concurrency)
+            result["upstream_calls"] = {
+                service: (await client.get(f"{url}/_stats")).json()
+                for service, url in upstream_urls.items()
+            }
+            result["peak_rss_mb"] = peak_rss_mb(app_pid)
+            results[name] = result
+    return results
+
+def print_summary(report: Dict[str, Any]) -> None:
+    print(f"{'scenario':<10}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}{'tcg':>7}{'notion':>8}{'rss MB':>9}")
+    for name, result in report["scenarios"].items():
+        latency = result["latency_ms"]
+        calls = result["upstream_calls"]
+        print(
+            f"{name:<10}{result['throughput_rps']:>10}{latency['p50']:>10}{latency['p95']:>10}{latency['p99']:>10}"
+            f"{result['errors']:>8}{calls['tcg'].get('total', 0):>7}{calls['notion'].get('total', 0):>8}"
+            f"{result['peak_rss_mb'] if result['peak_rss_mb'] is not None else '-':>9}"
+        )
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the app against local fake upstream APIs")
+    parser.add_argument("--scenarios", default="search,upload,report", help="Comma-separated: search, upload, report")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--page-size", type=int, default=50, help="page_size sent to /search")
+    parser.add_argument("--tcg-latency-ms", type=float, default=50.0)
+    parser.add_argument("--notion-latency-ms", type=float, default=150.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--notion-rate-limit-ratio", type=float, default=0.0, help="Share of Notion requests answered with 429")
+    parser.add_argument("--notion-retry-after", type=float, default=0.5)
+    parser.add_argument("--notion-page-size", type=int, default=100)
+    parser.add_argument("--notion-rate-limit", type=float, default=3.0, help="NOTION_RATE_LIMIT_PER_SECOND for the app")
+    parser.add_argument("--tcg-rate-limit", type=float, default=20.0, help="POKEMON_TCG_RATE_LIMIT_PER_SECOND for the app")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes, sharing one SHARED_CACHE_PATH")
+    parser.add_argument("--sets", type=int, default=5)
+    parser.add_argument("--cards-per-set", type=int, default=40)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="JSON report path (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--verbose", action="store_true", help="Show the app's request logs")
+    args = parser.parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+
+    revision = git_revision()
+    processes: List[subprocess.Popen] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            index_path, images = build_upload_fixtures(tmp, card_ids(args.sets, args.cards_per_set))
+
+            tcg_port, notion_port, app_port = free_port(), free_port(), free_port()
+            fakes = subprocess.Popen([
+                sys.executable, "-m", "benchmarks.fake_servers",
+                "--tcg-port", str(tcg_port), "--notion-port", str(notion_port),
+                "--latency-ms", str(args.tcg_latency_ms), "--notion-latency-ms", str(args.notion_latency_ms),
+                "--jitter-ms", str(args.jitter_ms), "--rate-limit-ratio", str(args.notion_rate_limit_ratio),
+                "--retry-after", str(args.notion_retry_after), "--sets", str(args.sets),
+                "--cards-per-set", str(args.cards_per_set), "--notion-page-size", str(args.notion_page_size)
+            ], cwd=REPO_ROOT)
+            processes.append(fakes)
+            upstream_urls = {"tcg": f"http://127.0.0.1:{tcg_port}", "notion": f"http://127.0.0.1:{notion_port}"}
+            for url in upstream_urls.values():
+                wait_until_up(f"{url}/_stats", fakes)
+
+            env = dict(
+                os.environ,
+                NOTION_TOKEN="bench-token",
+                NOTION_DATABASE_ID="bench-database",
+                NOTION_BASE_URL=upstream_urls["notion"],
+                POKEMON_TCG_BASE_URL=f"{upstream_urls['tcg']}/v2",
+                NOTION_RATE_LIMIT_PER_SECOND=str(args.notion_rate_limit),
+                POKEMON_TCG_RATE_LIMIT_PER_SECOND=str(args.tcg_rate_limit),
+                NOTION_SCHEMA_CACHE_PATH="",
+                CATALOG_PATH="",
+                JOB_STATE_PATH="",
+                PRICE_HISTORY_PATH="",
+                COLLECTION_REPLICA_PATH=os.path.join(tmp, "collection.db"),
+                COLLECTION_REPLICA_SYNC_SECONDS="0",
+                SHARED_CACHE_PATH=os.path.join(tmp, "shared_cache.db"),
+                CARD_HASH_INDEX_PATH=index_path
+            )
+            app = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(app_port),
+                 "--workers", str(args.workers), "--log-level", "warning"],
+                cwd=REPO_ROOT,
+                env=env,
+                stdout=None if args.verbose else subprocess.DEVNULL,
+                stderr=None if args.verbose else subprocess.DEVNULL
+            )
+            processes.append(app)
+            app_url = f"http://127.0.0.1:{app_port}"
+            wait_until_up(f"{app_url}/health", app)
+
+            scenarios = asyncio.run(run_scenarios(args, app_url, upstream_urls, app.pid, images))
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait(timeout=10)
+
+    report = {
+        **revision,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "scenarios": scenarios
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{revision['commit'] or 'unknown'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print_summary(report)
+    print(f"Results written to {output}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
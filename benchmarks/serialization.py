@@ -0,0 +1,66 @@
+"""Per-card cost of serializing card responses, validated versus the trusted fast path.
+
+    python -m benchmarks.serialization --cards 250 --repeat 200
+
+"validated" rebuilds every card as a CardBase, wraps them in a CardResponse and then
+validates and encodes that the way FastAPI does for a `response_model`. "trusted" is
+what the card endpoints do now: plain dicts encoded once with orjson.
+"""
+import argparse
+import os
+import time
+from typing import Any, Callable, Dict, List
+
+os.environ.setdefault("NOTION_TOKEN", "bench-token")
+os.environ.setdefault("NOTION_DATABASE_ID", "bench-database")
+os.environ.setdefault("CATALOG_PATH", "")
+os.environ.setdefault("JOB_STATE_PATH", "")
+
+from fastapi.responses import JSONResponse
+from fastapi.utils import create_response_field
+
+from benchmarks.fake_servers import card_ids, make_card
+from card_processing import CardBase, CardResponse, transform_card_data_for_notion, trusted_card, trusted_card_response
+
+response_field = create_response_field(name="response", type_=CardResponse)
+
+def validated(cards: List[Dict[str, Any]]) -> bytes:
+    response = CardResponse(
+        success=True,
+        message="Cards found successfully",
+        cards=[CardBase(**transform_card_data_for_notion(card)) for card in cards]
+    )
+    # What fastapi.routing.serialize_response does with a response_model
+    value, errors = response_field.validate(response, {}, loc=("response",))
+    assert not errors
+    return JSONResponse(response_field.serialize(value, mode="json")).body
+
+def trusted(cards: List[Dict[str, Any]]) -> bytes:
+    return trusted_card_response(
+        success=True,
+        message="Cards found successfully",
+        cards=[trusted_card(card) for card in cards]
+    ).body
+
+def per_card_us(encode: Callable[[List[Dict[str, Any]]], bytes], cards: List[Dict[str, Any]], repeat: int) -> float:
+    encode(cards)  # Warm up
+    started = time.perf_counter()
+    for _ in range(repeat):
+        encode(cards)
+    return (time.perf_counter() - started) / repeat / len(cards) * 1e6
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark card response serialization")
+    parser.add_argument("--cards", type=int, default=250, help="Cards per response")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    cards = [dict(make_card(card_id), market_price=1.5) for card_id in card_ids(-(-args.cards // 40), 40)[:args.cards]]
+    before = per_card_us(validated, cards, args.repeat)
+    after = per_card_us(trusted, cards, args.repeat)
+    print(f"{args.cards} cards per response, {args.repeat} responses")
+    print(f"  validated  {before:8.2f} us/card")
+    print(f"  trusted    {after:8.2f} us/card  ({before / after:.1f}x faster)")
+
+if __name__ == "__main__":
+    main()
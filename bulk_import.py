@@ -0,0 +1,341 @@
+import asyncio
+import csv
+import json
+import logging
+import os
+import tempfile
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from itertools import islice
+from typing import Any, Callable, Dict, IO, Iterator, List, Optional, Tuple
+
+from fastapi import UploadFile
+
+from config import get_settings
+from pokemon_tcg_api import normalize_query
+from rate_limit import CircuitOpenError, is_retryable
+from schemas import JobStatus
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = {"csv": "csv", "json": "json", "jsonl": "json", "ndjson": "json"}
+
+# Bytes read at a time from uploads and JSON imports
+CHUNK_SIZE = 1024 * 1024
+
+# Full card lists of this many sets are kept while resolving rows by set and number
+SET_CACHE_SIZE = 8
+
+# Per-row errors kept on the job; the rest are only counted as failed
+MAX_IMPORT_ERRORS = 100
+
+# Times a batch is resolved while the Pokemon TCG API is down or failing before the import fails
+RESOLVE_ATTEMPTS = 4
+
+# Column names accepted for each row field, compared case-insensitively
+ROW_FIELDS = {
+    "card_id": "card_id", "id": "card_id",
+    "name": "name",
+    "set": "set", "set_id": "set", "set_name": "set",
+    "number": "number", "variant_number": "number"
+}
+
+def import_format(filename: Optional[str], requested: Optional[str] = None) -> str:
+    """The import format, "csv" or "json", from an explicit choice or the file extension."""
+    extension = (requested or (filename or "").rsplit(".", 1)[-1]).lower()
+    if extension not in IMPORT_FORMATS:
+        raise ValueError("Imports must be .csv, .json, .jsonl or .ndjson files")
+    return IMPORT_FORMATS[extension]
+
+def normalize_row(raw: Any) -> Dict[str, str]:
+    """Map a CSV or JSON row onto card_id, name, set and number; a bare string is a card id."""
+    if isinstance(raw, str):
+        return {"card_id": raw.strip()}
+    if not isinstance(raw, dict):
+        return {}
+    row = {}
+    for key, value in raw.items():
+        field = ROW_FIELDS.get(str(key).strip().lower())
+        if field and value is not None and str(value).strip():
+            row[field] = str(value).strip()
+    return row
+
+def normalize_number(number: str) -> str:
+    """Collector number as used in card ids: "004/102" -> "4"."""
+    return number.split("/", 1)[0].strip().lstrip("0") or "0"
+
+def iter_json_rows(f: IO[str], chunk_size: int = CHUNK_SIZE) -> Iterator[Any]:
+    """Yield the values of a top-level JSON array, or of JSON Lines, reading one chunk at a time."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    eof = False
+    while True:
+        buffer = buffer.lstrip(" \t\r\n,[]")
+        if buffer:
+            try:
+                value, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise ValueError(f"Invalid JSON near: {buffer[:50]!r}")
+            else:
+                buffer = buffer[end:]
+                yield value
+                continue
+        elif eof:
+            return
+        # The next value is incomplete, so read more of it
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer += chunk
+
+def iter_rows(f: IO[str], fmt: str) -> Iterator[Dict[str, str]]:
+    """Stream normalized rows from an open import file."""
+    raw_rows = csv.DictReader(f) if fmt == "csv" else iter_json_rows(f)
+    for raw in raw_rows:
+        yield normalize_row(raw)
+
+def count_rows(path: str, fmt: str) -> int:
+    """Number of rows in an import file, counted without keeping them."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return sum(1 for _ in iter_rows(f, fmt))
+
+async def save_upload(file: UploadFile, fmt: str) -> str:
+    """Copy an uploaded import to IMPORT_UPLOAD_PATH chunk by chunk, so a resumed job can read it again."""
+    directory = get_settings().IMPORT_UPLOAD_PATH or tempfile.gettempdir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{uuid.uuid4().hex}.{fmt}")
+    try:
+        with open(path, "wb") as out:
+            while True:
+                chunk = await file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                await asyncio.to_thread(out.write, chunk)
+    except BaseException:
+        # No job was queued for a partial upload, so nothing else would remove it
+        remove_upload(path)
+        raise
+    return path
+
+class CardResolver:
+    """Resolve import rows to Pokemon TCG cards in batches.
+
+    Rows with a card id, or with a set and number (card ids are "<set id>-<number>"),
+    are looked up together through the batched `get_cards`. Rows that still did not
+    match are grouped by set and matched against the set's full card list, fetched once.
+    """
+
+    def __init__(self, api):
+        self.api = api
+        self._set_ids: Optional[Dict[str, str]] = None
+        self._set_cards: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+
+    async def set_id(self, value: str) -> Optional[str]:
+        """The set id for a set id or set name, matched case-insensitively."""
+        if self._set_ids is None:
+            self._set_ids = {}
+            for card_set in await self.api.get_sets():
+                self._set_ids[normalize_query(card_set["name"])] = card_set["id"]
+                self._set_ids[card_set["id"].lower()] = card_set["id"]
+        return self._set_ids.get(normalize_query(value))
+
+    async def set_cards(self, set_id: str) -> List[Dict[str, Any]]:
+        """Every card of a set, keeping the most recently used sets."""
+        if set_id in self._set_cards:
+            self._set_cards.move_to_end(set_id)
+            return self._set_cards[set_id]
+        cards = await self.api.get_set_cards(set_id)
+        self._set_cards[set_id] = cards
+        while len(self._set_cards) > SET_CACHE_SIZE:
+            self._set_cards.popitem(last=False)
+        return cards
+
+    @staticmethod
+    def match(cards: List[Dict[str, Any]], row: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        """The card of a set a row refers to, by number and then by name if that is unambiguous."""
+        candidates = cards
+        if row.get("number"):
+            number = normalize_number(row["number"]).lower()
+            candidates = [card for card in candidates if normalize_number(card.get("number", "")).lower() == number]
+        if row.get("name"):
+            name = normalize_query(row["name"])
+            named = [card for card in candidates if normalize_query(card["name"]) == name]
+            candidates = named or (candidates if row.get("number") else [])
+        return candidates[0] if len(candidates) == 1 else None
+
+    async def resolve(self, rows: List[Dict[str, str]]) -> List[Tuple[Optional[Dict[str, Any]], Optional[str]]]:
+        """(card, None) or (None, error) for every row, in order."""
+        results: List[Tuple[Optional[Dict[str, Any]], Optional[str]]] = [(None, None)] * len(rows)
+        candidates: Dict[int, str] = {}
+        row_sets: Dict[int, str] = {}
+        for index, row in enumerate(rows):
+            if row.get("card_id"):
+                candidates[index] = row["card_id"]
+            elif row.get("set") and (row.get("number") or row.get("name")):
+                set_id = await self.set_id(row["set"])
+                if set_id is None:
+                    results[index] = (None, f"unknown set {row['set']!r}")
+                    continue
+                row_sets[index] = set_id
+                if row.get("number"):
+                    candidates[index] = f"{set_id}-{normalize_number(row['number'])}"
+            else:
+                results[index] = (None, "a row needs a card_id, or a set with a number or name")
+
+        found = await self.api.get_cards(list(dict.fromkeys(candidates.values()))) if candidates else {}
+        by_set: Dict[str, List[int]] = defaultdict(list)
+        for index, card_id in candidates.items():
+            if card_id in found:
+                results[index] = (found[card_id], None)
+            elif index in row_sets:
+                by_set[row_sets[index]].append(index)
+            else:
+                results[index] = (None, f"card {card_id} not found")
+        for index, set_id in row_sets.items():
+            if index not in candidates:
+                by_set[set_id].append(index)
+
+        for set_id, indexes in by_set.items():
+            cards = await self.set_cards(set_id)
+            for index in indexes:
+                card = self.match(cards, rows[index])
+                results[index] = (card, None) if card is not None else (None, f"no single card in set {set_id} matches")
+        return results
+
+async def run_import(job: JobStatus, api, writer, transform: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Dict[str, Any]:
+    """Resolve and write an import file batch by batch, resuming after the rows already done.
+
+    The next batch is resolved against the Pokemon TCG API while the current one is
+    written to Notion, so the import runs at the pace of the slower rate limit.
+    `job.checkpoint` records the finished batches and the finished rows of the current
+    one, so an interrupted import neither skips nor re-creates rows.
+    """
+    path, fmt = job.params["path"], job.params["format"]
+    group_id, upsert = job.params["group_id"], job.params.get("upsert", False)
+    settings = get_settings()
+    batch_rows = settings.IMPORT_BATCH_ROWS
+    # An open circuit refuses calls for this long, so retries wait at least as much
+    retry_delay = settings.UPSTREAM_CIRCUIT_RESET_SECONDS
+    resolver = CardResolver(api)
+    notion = writer.notion
+
+    rows_done = job.checkpoint.get("rows_done", 0)
+    if not job.progress.total:
+        job.progress.total = await asyncio.to_thread(count_rows, path, fmt)
+
+    def record_error(row_number: int, error: str) -> None:
+        job.progress.failed += 1
+        if len(job.errors) < MAX_IMPORT_ERRORS:
+            job.errors.append(f"row {row_number}: {error}")
+
+    async def resolve(start: int, rows: List[Dict[str, str]]) -> Tuple[int, List[Dict[str, str]], List[Tuple[Optional[Dict[str, Any]], Optional[str]]]]:
+        attempt = 1
+        while True:
+            try:
+                return start, rows, await resolver.resolve(rows)
+            except Exception as e:
+                # Rows are never marked failed for an outage: it is waited out, and if it
+                # persists the job fails with its checkpoint showing how far it got
+                if attempt >= RESOLVE_ATTEMPTS or not (isinstance(e, CircuitOpenError) or is_retryable(e)):
+                    logger.error(f"Error resolving import rows {start + 1}-{start + len(rows)}: {str(e)}")
+                    raise
+                logger.warning(f"Error resolving import rows {start + 1}-{start + len(rows)} ({str(e)}), retry {attempt}/{RESOLVE_ATTEMPTS - 1}")
+                await asyncio.sleep(retry_delay * attempt)
+                attempt += 1
+
+    async def write(start: int, rows: List[Dict[str, str]], resolved: List[Tuple[Optional[Dict[str, Any]], Optional[str]]]) -> None:
+        done_rows = job.checkpoint.setdefault("done_rows", [])
+        finished = set(done_rows)
+        cards, row_indexes = [], []
+        seen = set()
+        for index, (card, error) in enumerate(resolved, start):
+            if index in finished:
+                continue
+            if card is None:
+                record_error(index + 1, error)
+            elif upsert and card["id"] in seen:
+                # A card listed twice in one batch was just written for its first row
+                job.progress.unchanged += 1
+            else:
+                seen.add(card["id"])
+                card_data = transform(card)
+                card_data["group_id"] = group_id
+                cards.append(card_data)
+                row_indexes.append(index)
+                continue
+            job.progress.processed += 1
+            done_rows.append(index)
+
+        if not upsert:
+            repeated = await asyncio.to_thread(lambda: [notion.check_existing_card(card_data["card_id"]) for card_data in cards])
+            for card_data, is_repeated in zip(cards, repeated):
+                card_data["repeated"] = is_repeated
+
+        # Rows waiting for each card's write; a card listed twice is written twice, in either order
+        pending_rows: Dict[str, deque] = defaultdict(deque)
+        for card_data, index in zip(cards, row_indexes):
+            pending_rows[card_data["card_id"]].append((index, card_data.get("repeated", False)))
+
+        def record_result(result: Dict[str, Any]) -> None:
+            index, is_repeated = pending_rows[result["card_id"]].popleft()
+            job.progress.processed += 1
+            if not result["success"]:
+                record_error(index + 1, result["error"])
+            elif result.get("action") == "updated":
+                job.progress.updated += 1
+            elif result.get("action") == "unchanged":
+                job.progress.unchanged += 1
+            else:
+                job.progress.created += 1
+                job.progress.repeated += is_repeated
+            # Checkpointed as soon as it is written, so an interrupted batch is not written again
+            done_rows.append(index)
+
+        write_cards = writer.upsert_cards if upsert else writer.write_cards
+        await write_cards(cards, method="Import", group_id=group_id, on_result=record_result)
+        job.checkpoint.update(rows_done=start + len(rows), done_rows=[])
+
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        rows_iter = iter_rows(f, fmt)
+
+        def read_batch() -> List[Dict[str, str]]:
+            return list(islice(rows_iter, batch_rows))
+
+        # Batches finished before an interruption are read past, not resolved again
+        await asyncio.to_thread(lambda: sum(1 for _ in islice(rows_iter, rows_done)))
+
+        pending = None
+        batch = await asyncio.to_thread(read_batch)
+        if batch:
+            pending = asyncio.ensure_future(resolve(rows_done, batch))
+        try:
+            while pending is not None:
+                start, rows, resolved = await pending
+                pending = None
+                batch = await asyncio.to_thread(read_batch)
+                if batch:
+                    pending = asyncio.ensure_future(resolve(start + len(rows), batch))
+                await write(start, rows, resolved)
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+    summary = {
+        "rows": job.progress.total,
+        "created": job.progress.created,
+        "updated": job.progress.updated,
+        "unchanged": job.progress.unchanged,
+        "repeated": job.progress.repeated,
+        "failed": job.progress.failed
+    }
+    logger.info(f"Import {job.job_id} finished: {summary}")
+    return summary
+
+def remove_upload(path: str) -> None:
+    """Delete an import file once its job has finished."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Could not remove import file {path}: {str(e)}")
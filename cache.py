@@ -0,0 +1,312 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+HIT = "hit"
+STALE = "stale"
+MISS = "miss"
+
+# Expired rows are deleted from the shared cache once every this many writes
+SHARED_PRUNE_INTERVAL = 1000
+
+# Keys looked up per shared cache query, below SQLite's limit on query parameters
+SHARED_READ_BATCH_SIZE = 500
+
+# How long a write waits for another worker's transaction before giving up on the write
+SHARED_BUSY_TIMEOUT_MS = 200
+
+class SharedCache:
+    """SQLite cache shared by every worker process on the host.
+
+    WAL mode lets readers run alongside a writer, so each worker reads values the others
+    fetched. Keys and values are stored as JSON together with the wall-clock time they
+    were written. SQLite errors are logged and treated as misses; the cache never fails a request.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Open the cache database, creating it on first use. Caller holds the lock."""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=SHARED_BUSY_TIMEOUT_MS / 1000)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Losing the last writes on power failure only costs a few upstream calls
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "namespace TEXT, key BLOB, value BLOB, stored_at REAL, PRIMARY KEY (namespace, key)"
+                ") WITHOUT ROWID;"
+                "CREATE INDEX IF NOT EXISTS idx_entries_stored_at ON entries (namespace, stored_at);"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def get(self, namespace: str, key: Hashable) -> Optional[Tuple[float, Any]]:
+        """(age in seconds, value) stored for a key by any worker, or None."""
+        return self.get_many(namespace, [key]).get(key)
+
+    def get_many(self, namespace: str, keys: List[Hashable]) -> Dict[Hashable, Tuple[float, Any]]:
+        """(age in seconds, value) of every key some worker stored, read in one query per batch."""
+        encoded = {orjson.dumps(key): key for key in keys}
+        blobs = list(encoded)
+        rows = []
+        try:
+            with self._lock:
+                for start in range(0, len(blobs), SHARED_READ_BATCH_SIZE):
+                    batch = blobs[start:start + SHARED_READ_BATCH_SIZE]
+                    rows += self.conn.execute(
+                        f"SELECT key, value, stored_at FROM entries WHERE namespace = ? AND key IN ({', '.join('?' * len(batch))})",
+                        (namespace, *batch)
+                    ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Shared cache read failed: {str(e)}")
+            return {}
+        now = time.time()
+        return {encoded[key]: (max(now - stored_at, 0.0), orjson.loads(value)) for key, value, stored_at in rows}
+
+    def set_many(self, namespace: str, items: Iterable[Tuple[Hashable, Any]], max_age: float) -> None:
+        """Store several values in one transaction, pruning entries older than `max_age` now and then."""
+        now = time.time()
+        rows = [(namespace, orjson.dumps(key), orjson.dumps(value), now) for key, value in items]
+        if not rows:
+            return
+        try:
+            with self._lock:
+                with self.conn:
+                    self.conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", rows)
+                    self._writes += len(rows)
+                    if self._writes >= SHARED_PRUNE_INTERVAL:
+                        self._writes = 0
+                        self.conn.execute(
+                            "DELETE FROM entries WHERE namespace = ? AND stored_at < ?", (namespace, now - max_age)
+                        )
+        except sqlite3.Error as e:
+            logger.warning(f"Shared cache write failed: {str(e)}")
+
+    def delete(self, namespace: str, key: Hashable) -> None:
+        """Drop a single entry for every worker."""
+        try:
+            with self._lock:
+                with self.conn:
+                    self.conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, orjson.dumps(key)))
+        except sqlite3.Error as e:
+            logger.warning(f"Shared cache delete failed: {str(e)}")
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after a TTL.
+
+    Expired entries are kept for an extra `stale_ttl` seconds so they can be served
+    while a background refresh fetches the new value (stale-while-revalidate).
+    With a `shared` cache, local misses are looked up there and every value is written
+    through, so worker processes fill the cache for each other. Inside the event loop the
+    shared reads (`lookup_many`, `get_or_load`) and writes run in worker threads.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, stale_ttl: float = 0.0,
+                 shared: Optional[SharedCache] = None, namespace: str = ""):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.shared = shared
+        self.namespace = namespace
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._refreshing: Set[Hashable] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._writes: Set[asyncio.Future] = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lookup_local(self, key: Hashable) -> Optional[Tuple[str, Any]]:
+        """(HIT | STALE, value) from this process's entries, or None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        age = time.monotonic() - entry[0]
+        if age < self.ttl:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return HIT, entry[1]
+        if age < self.ttl + self.stale_ttl:
+            self._entries.move_to_end(key)
+            self.stale_hits += 1
+            return STALE, entry[1]
+        del self._entries[key]
+        return None
+
+    def _lookup_shared(self, key: Hashable, found: Optional[Tuple[float, Any]]) -> Tuple[str, Any]:
+        """(HIT | STALE | MISS, value) for what the shared cache held for a local miss."""
+        if found is None or found[0] >= self.ttl + self.stale_ttl:
+            self.misses += 1
+            return MISS, None
+        age, value = found
+        self._store(key, value, time.monotonic() - age)
+        self.shared_hits += 1
+        if age < self.ttl:
+            self.hits += 1
+            return HIT, value
+        self.stale_hits += 1
+        return STALE, value
+
+    def lookup(self, key: Hashable) -> Tuple[str, Any]:
+        """Return (HIT | STALE | MISS, value) for a key and update the counters."""
+        result = self._lookup_local(key)
+        if result is not None:
+            return result
+        return self._lookup_shared(key, self.shared.get(self.namespace, key) if self.shared is not None else None)
+
+    async def lookup_many(self, keys: List[Hashable]) -> Dict[Hashable, Tuple[str, Any]]:
+        """`lookup` for several keys, reading their local misses from the shared cache in a worker thread."""
+        results = {key: self._lookup_local(key) for key in keys}
+        missing = [key for key, result in results.items() if result is None]
+        found = {}
+        if missing and self.shared is not None:
+            found = await asyncio.to_thread(self.shared.get_many, self.namespace, missing)
+        for key in missing:
+            results[key] = self._lookup_shared(key, found.get(key))
+        return results
+
+    def _store(self, key: Hashable, value: Any, stored_at: float) -> None:
+        self._entries[key] = (stored_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used entries past the size bound."""
+        self.set_many([(key, value)])
+
+    def set_many(self, items: List[Tuple[Hashable, Any]]) -> None:
+        """Store several values, writing them to the shared cache in one transaction."""
+        now = time.monotonic()
+        for key, value in items:
+            self._store(key, value, now)
+        if self.shared is not None and items:
+            self._write_shared(self.shared.set_many, self.namespace, list(items), self.ttl + self.stale_ttl)
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop a single entry."""
+        self._entries.pop(key, None)
+        if self.shared is not None:
+            self._write_shared(self.shared.delete, self.namespace, key)
+
+    def _write_shared(self, write: Callable[..., None], *args: Any) -> None:
+        """Run a shared cache write in a worker thread from the event loop, or right away elsewhere."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            write(*args)
+            return
+        future = asyncio.ensure_future(asyncio.to_thread(write, *args))
+        self._writes.add(future)
+        future.add_done_callback(self._writes.discard)
+
+    async def flush(self) -> None:
+        """Wait for the shared cache writes still running."""
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    def clear(self) -> None:
+        """Drop every entry held by this process."""
+        self._entries.clear()
+
+    def refresh_in_background(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> None:
+        """Reload a stale entry without blocking the caller, once per key at a time."""
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+
+        async def refresh() -> None:
+            try:
+                value = await loader()
+                if value:
+                    self.set(key, value)
+            except Exception as e:
+                logger.error(f"Error refreshing cache entry {key}: {str(e)}")
+            finally:
+                self._refreshing.discard(key)
+
+        task = asyncio.create_task(refresh())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def refresh_many_in_background(self, keys: List[Hashable], loader: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]) -> None:
+        """Reload several stale entries with one batched `loader` call returning a key -> value map."""
+        keys = [key for key in keys if key not in self._refreshing]
+        if not keys:
+            return
+        self._refreshing.update(keys)
+
+        async def refresh() -> None:
+            try:
+                self.set_many(list((await loader(keys)).items()))
+            except Exception as e:
+                logger.error(f"Error refreshing {len(keys)} cache entries: {str(e)}")
+            finally:
+                self._refreshing.difference_update(keys)
+
+        task = asyncio.create_task(refresh())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Serve a key from the cache, calling `loader` on a miss and refreshing stale entries.
+
+        Empty results are not cached so that upstream failures are retried.
+        """
+        status, value = (await self.lookup_many([key]))[key]
+        if status == HIT:
+            return value
+        if status == STALE:
+            self.refresh_in_background(key, loader)
+            return value
+
+        value = await loader()
+        if value:
+            self.set(key, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters for monitoring."""
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "shared_hits": self.shared_hits,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0
+        }
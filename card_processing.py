@@ -1,17 +1,28 @@
-from fastapi import APIRouter, UploadFile, File
-from typing import Dict, Any, Optional
-from schemas import CardBase, CardResponse
-from notion_integration import NotionIntegration
-from pokemon_tcg_api import PokemonTCGAPI
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from typing import AsyncIterator, Dict, Any, List, Literal, Optional
+from schemas import CardBase, CardResponse, ImageResult, JobStatus, JobProgress, Suggestion, Suggestions
+from notion_integration import get_notion
+from notion_writer import NotionBatchWriter
+from jobs import JobManager
+from pokemon_tcg_api import PokemonTCGAPI, MAX_PAGE_SIZE
 from config import get_settings
-from image_processing import process_card_image
+from image_processing import process_card_image, process_card_images
+from price_refresh import refresh_market_prices
+from price_history import get_price_history
+from typeahead import MAX_SUGGESTIONS, Typeahead
+from bulk_import import import_format, remove_upload, run_import, save_upload
+import asyncio
 import logging
+import orjson
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["cards"])
-notion = NotionIntegration()
+notion_writer = NotionBatchWriter()
+job_manager = JobManager(settings.JOB_WORKERS, settings.JOB_STATE_PATH)
 pokemon_tcg = PokemonTCGAPI()
+typeahead = Typeahead(pokemon_tcg.catalog) if pokemon_tcg.catalog is not None else None
 
 def transform_card_data_for_notion(card_data: Dict[str, Any]) -> Dict[str, Any]:
     """Transform Pokemon TCG API card data to match our schema."""
@@ -21,17 +32,60 @@ def transform_card_data_for_notion(card_data: Dict[str, Any]) -> Dict[str, Any]:
         "market_price": float(card_data.get("market_price", 0.0)),
         "rarity": str(card_data.get("rarity", "Unknown")),
         "image_url": str(card_data.get("images", {}).get("large", "https://example.com/placeholder.jpg")),
+        "thumbnail_url": f"/api/images/{card_data['id']}?size=thumb" if card_data.get("id") else None,
         "variant_number": str(card_data.get("number", "")),
         "card_id": str(card_data.get("id", "")),
         "repeated": False  # This will be updated when we check if the card exists
     }
 
+# Field defaults, so fast-path payloads have the same shape as validated models
+CARD_DEFAULTS = {name: field.default for name, field in CardBase.model_fields.items() if not field.is_required()}
+CARD_RESPONSE_DEFAULTS = {name: field.default for name, field in CardResponse.model_fields.items() if not field.is_required()}
+
+def trusted_card(card_data: Dict[str, Any]) -> Dict[str, Any]:
+    """CardBase-shaped dict for a card from the Pokemon TCG API, without model validation.
+
+    Cards we normalize ourselves always satisfy CardBase, so validating them again
+    (URL parsing included) only costs CPU on large result lists.
+    """
+    return dict(CARD_DEFAULTS, **transform_card_data_for_notion(card_data))
+
+def trusted_card_response(**fields: Any) -> ORJSONResponse:
+    """Encode a CardResponse holding trusted cards with orjson, skipping FastAPI's response re-validation."""
+    return ORJSONResponse(dict(CARD_RESPONSE_DEFAULTS, **fields))
+
+async def stream_search_results(query: str, set_id: Optional[str], page_size: int) -> AsyncIterator[bytes]:
+    """Emit each transformed card as an NDJSON line as soon as its page arrives."""
+    try:
+        async for cards in pokemon_tcg.iter_search_pages(query, set_id, page_size):
+            for card in cards:
+                yield orjson.dumps(trusted_card(card)) + b"\n"
+    except Exception as e:
+        logger.error(f"Error streaming search results: {str(e)}")
+        yield orjson.dumps({"error": str(e)}) + b"\n"
+
 @router.get("/search", response_model=CardResponse)
-async def search_card(query: str, set_id: Optional[str] = None):
-    """Search for a card using the Pokemon TCG API."""
+async def search_card(
+    query: str,
+    set_id: Optional[str] = None,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    stream: bool = False
+):
+    """Search for a card using the Pokemon TCG API.
+
+    With `stream` every page of results is sent as newline-delimited JSON, one card
+    per line, instead of a single page wrapped in a CardResponse.
+    """
+    if stream:
+        return StreamingResponse(
+            stream_search_results(query, set_id, page_size),
+            media_type="application/x-ndjson"
+        )
+
     try:
         # Search for the card
-        cards = pokemon_tcg.search_card(query, set_id)
+        cards = await pokemon_tcg.search_card(query, set_id, page=page, page_size=page_size)
         
         if not cards:
             return CardResponse(
@@ -40,13 +94,12 @@ async def search_card(query: str, set_id: Optional[str] = None):
                 error="Card not found in Pokemon TCG API"
             )
         
-        # Transform all cards to match our schema
-        transformed_cards = [CardBase(**transform_card_data_for_notion(card)) for card in cards]
-        
-        return CardResponse(
+        return trusted_card_response(
             success=True,
             message="Cards found successfully",
-            cards=transformed_cards
+            cards=[trusted_card(card) for card in cards],
+            page=page,
+            page_size=page_size
         )
         
     except Exception as e:
@@ -57,6 +110,33 @@ async def search_card(query: str, set_id: Optional[str] = None):
             error=str(e)
         )
 
+@router.get("/autocomplete", response_model=Suggestions)
+async def autocomplete(q: str, limit: int = Query(10, ge=1, le=MAX_SUGGESTIONS)):
+    """Suggest card and set names for a partially typed query from the in-memory name index.
+
+    Answered without calling the Pokemon TCG API; needs a synced local catalog.
+    """
+    try:
+        if typeahead is None or not await typeahead.ready():
+            return Suggestions(success=False, query=q, error="The local card catalog has not been synced")
+
+        names, sets = typeahead.suggest(q, limit)
+        return Suggestions(
+            success=True,
+            query=q,
+            names=[Suggestion(**name) for name in names],
+            sets=[Suggestion(**card_set) for card_set in sets]
+        )
+
+    except Exception as e:
+        logger.error(f"Error suggesting card names: {str(e)}")
+        return Suggestions(success=False, query=q, error=str(e))
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss/eviction counters for the card search and price caches."""
+    return pokemon_tcg.cache_stats()
+
 @router.post("/upload", response_model=CardResponse)
 async def upload_card(file: UploadFile = File(...)):
     """Upload and process a card image."""
@@ -71,8 +151,12 @@ async def upload_card(file: UploadFile = File(...)):
                 error=result["error"]
             )
         
-        # Search for the card using the extracted text
-        cards = pokemon_tcg.search_card(result["text"])
+        # Recognition identifies the exact card; fall back to a name search when only text is known
+        if result.get("card_id"):
+            card = await pokemon_tcg.get_card(result["card_id"])
+            cards = [card] if card else []
+        else:
+            cards = await pokemon_tcg.search_card(result["text"])
         
         if not cards:
             return CardResponse(
@@ -81,13 +165,10 @@ async def upload_card(file: UploadFile = File(...)):
                 error="Card not found in Pokemon TCG API"
             )
         
-        # Transform all cards to match our schema
-        transformed_cards = [CardBase(**transform_card_data_for_notion(card)) for card in cards]
-        
-        return CardResponse(
+        return trusted_card_response(
             success=True,
             message="Cards processed successfully",
-            cards=transformed_cards
+            cards=[trusted_card(card) for card in cards]
         )
         
     except Exception as e:
@@ -98,12 +179,67 @@ async def upload_card(file: UploadFile = File(...)):
             error=str(e)
         )
 
-@router.post("/report", response_model=CardResponse)
-async def create_card_report(query: str, set_id: str, group_id: str):
-    """Create a Notion report for cards matching the search query."""
+@router.post("/upload/batch", response_model=CardResponse)
+async def upload_cards(files: List[UploadFile] = File(...)):
+    """Upload several card images and identify them in one request."""
+    if len(files) > settings.UPLOAD_BATCH_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"At most {settings.UPLOAD_BATCH_MAX_FILES} images per batch")
+
+    try:
+        # Recognition runs across the process pool; results come back in upload order
+        results = await process_card_images(files)
+        images = [
+            ImageResult(
+                filename=file.filename or "",
+                success=result["success"],
+                card_id=result.get("card_id"),
+                error=result.get("error")
+            )
+            for file, result in zip(files, results)
+        ]
+
+        # The same card photographed twice is looked up once
+        card_ids = list(dict.fromkeys(image.card_id for image in images if image.success))
+        cards = await pokemon_tcg.get_cards(card_ids) if card_ids else {}
+        for image in images:
+            if image.success and image.card_id not in cards:
+                image.success = False
+                image.error = "Card not found in Pokemon TCG API"
+
+        if not cards:
+            return CardResponse(
+                success=False,
+                message="No cards found",
+                images=images,
+                error="No card could be identified in the uploaded images"
+            )
+
+        transformed_cards = [trusted_card(cards[card_id]) for card_id in card_ids if card_id in cards]
+        recognized = sum(image.success for image in images)
+
+        return trusted_card_response(
+            success=True,
+            message=f"Identified {len(transformed_cards)} cards in {recognized} of {len(images)} images",
+            cards=transformed_cards,
+            images=[image.model_dump() for image in images]
+        )
+
+    except Exception as e:
+        logger.error(f"Error processing card images: {str(e)}")
+        return CardResponse(
+            success=False,
+            message="Error processing card images",
+            error=str(e)
+        )
+
+async def run_card_report(query: str, set_id: str, group_id: str, upsert: bool = False, job: Optional[JobStatus] = None) -> CardResponse:
+    """Search for cards and create a Notion report for each, updating the job's progress if given.
+
+    With `upsert` cards already in Notion update their existing page instead of getting a new one.
+    """
     try:
         # Search for cards
-        cards = pokemon_tcg.search_card(query, set_id)
+        cards = await pokemon_tcg.search_card(query, set_id)
         if not cards:
             return CardResponse(
                 success=False,
@@ -111,44 +247,91 @@ async def create_card_report(query: str, set_id: str, group_id: str):
                 cards=None,
                 error="No cards found matching the search criteria"
             )
-        
+
+        # Skip cards a resumed job already wrote before it was interrupted
+        written_card_ids = set(job.checkpoint.get("written_card_ids", [])) if job else set()
+        if job:
+            job.progress.total = len(cards)
+
+        # Transform cards and flag the ones already in Notion
+        notion = get_notion()
+        if not upsert:
+            try:
+                # Loading or reconciling the Card ID index queries Notion page by page
+                await asyncio.to_thread(notion.ensure_card_index)
+            except Exception as e:
+                logger.error(f"Error loading Card ID index: {str(e)}")
         transformed_cards = []
-        created_cards = 0
-        repeated_cards = 0
-        
-        # Transform and create reports for each card
         for card in cards:
-            # Check if card already exists
-            exists = notion.check_existing_card(card["id"])
-            
-            # Transform card data
+            if card["id"] in written_card_ids:
+                continue
             transformed_card = transform_card_data_for_notion(card)
-            transformed_card["repeated"] = exists
             transformed_card["group_id"] = group_id  # Set the group_id to indicate these cards are grouped together
-            
-            if exists:
-                repeated_cards += 1
-            
-            # Create Notion report for all cards
-            try:
-                page_id = notion.create_card_report(transformed_card, method="Manual", group_id=group_id)
-                if page_id:
-                    created_cards += 1
-                    transformed_cards.append(transformed_card)
-            except Exception as e:
-                logger.error(f"Error creating Notion report for card {card['id']}: {str(e)}")
-                continue
-        
-        message = f"Successfully added {created_cards} cards to Notion"
+            transformed_cards.append(transformed_card)
+        repeated_cards = 0
+        if not upsert:
+            # A check that misses the index queries Notion through the blocking retry layer
+            repeated = await asyncio.to_thread(lambda: [notion.check_existing_card(card["card_id"]) for card in transformed_cards])
+            for transformed_card, is_repeated in zip(transformed_cards, repeated):
+                transformed_card["repeated"] = is_repeated
+            repeated_cards = sum(repeated)
+
+        repeated_card_ids = {card["card_id"] for card in transformed_cards if card.get("repeated")}
+
+        def record_progress(result: Dict[str, Any]) -> None:
+            if result["success"] and result.get("action") is None:
+                result["action"] = "created"
+            if not job:
+                return
+            job.progress.processed += 1
+            if result["success"]:
+                if result["action"] == "updated":
+                    job.progress.updated += 1
+                elif result["action"] == "unchanged":
+                    job.progress.unchanged += 1
+                else:
+                    job.progress.created += 1
+                job.checkpoint.setdefault("written_card_ids", []).append(result["card_id"])
+                if result["card_id"] in repeated_card_ids:
+                    job.checkpoint.setdefault("repeated_card_ids", []).append(result["card_id"])
+            else:
+                job.progress.failed += 1
+                job.errors.append(f"{result['card_id']}: {result['error']}")
+
+        if job:
+            # Rebuilt rather than added to, since a resumed job checks and retries every card it has not written
+            job.progress.processed = len(written_card_ids)
+            job.progress.repeated = len(job.checkpoint.get("repeated_card_ids", [])) + repeated_cards
+            job.progress.failed = 0
+            job.errors = []
+
+        # Write Notion reports for all cards concurrently, within Notion's rate limit
+        write = notion_writer.upsert_cards if upsert else notion_writer.write_cards
+        results = await write(transformed_cards, method="Manual", group_id=group_id, on_result=record_progress)
+        written = [(card, result) for card, result in zip(transformed_cards, results) if result["success"]]
+        created = [card for card, result in written if result["action"] == "created"]
+        updated = [card for card, result in written if result["action"] == "updated"]
+        unchanged = len(written) - len(created) - len(updated)
+        failed_cards = len(transformed_cards) - len(written)
+        for result in results:
+            if not result["success"]:
+                logger.error(f"Error writing Notion report for card {result['card_id']}: {result['error']}")
+
+        message = f"Successfully added {len(created)} cards to Notion"
+        if upsert:
+            message += f", updated {len(updated)}, {unchanged} unchanged"
         if repeated_cards > 0:
             message += f" ({repeated_cards} repeated cards)"
-        
+        if failed_cards > 0:
+            message += f", {failed_cards} failed"
+
         return CardResponse(
             success=True,
             message=message,
-            cards=transformed_cards
+            cards=created + updated,
+            results=results
         )
-            
+
     except Exception as e:
         logger.error(f"Error creating card report: {str(e)}")
         return CardResponse(
@@ -156,4 +339,126 @@ async def create_card_report(query: str, set_id: str, group_id: str):
             message="Error creating card report",
             cards=None,
             error=str(e)
-        ) 
\ No newline at end of file
+        )
+
+async def run_report_job(job: JobStatus) -> Dict[str, Any]:
+    """Job handler for reports queued with `async_mode`."""
+    response = await run_card_report(**job.params, job=job)
+    if not response.success:
+        raise RuntimeError(response.error or response.message)
+    return response.model_dump(mode="json")
+
+job_manager.register("report", run_report_job)
+
+@router.post("/report", response_model=CardResponse)
+async def create_card_report(query: str, set_id: str, group_id: str, async_mode: bool = False, upsert: bool = False):
+    """Create a Notion report for cards matching the search query.
+
+    With `upsert` cards already in Notion have their "Quantity" and "Last Seen" updated,
+    only when they changed, instead of getting a new page.
+    With `async_mode` the report runs as a background job and its id is returned
+    immediately; poll `/jobs/{job_id}` for progress.
+    """
+    if async_mode:
+        try:
+            job = job_manager.submit("report", {"query": query, "set_id": set_id, "group_id": group_id, "upsert": upsert})
+        except Exception as e:
+            logger.error(f"Error queueing card report: {str(e)}")
+            return CardResponse(
+                success=False,
+                message="Error queueing card report",
+                error=str(e)
+            )
+        return CardResponse(
+            success=True,
+            message="Report job queued",
+            job_id=job.job_id
+        )
+
+    return await run_card_report(query, set_id, group_id, upsert)
+
+async def run_import_job(job: JobStatus) -> Dict[str, Any]:
+    """Job handler for bulk imports; the uploaded file is removed once the job is done."""
+    try:
+        result = await run_import(job, pokemon_tcg, notion_writer, transform_card_data_for_notion)
+    except asyncio.CancelledError:
+        # Interrupted by shutdown; the file is needed to resume
+        raise
+    except Exception:
+        remove_upload(job.params["path"])
+        raise
+    remove_upload(job.params["path"])
+    return result
+
+job_manager.register("import", run_import_job)
+
+@router.post("/import", response_model=CardResponse)
+async def import_cards(
+    group_id: str,
+    file: UploadFile = File(...),
+    upsert: bool = False,
+    format: Optional[Literal["csv", "json"]] = None
+):
+    """Queue a bulk import of a CSV or JSON card list; poll `/jobs/{job_id}` for progress.
+
+    Rows give a `card_id`, or a `set` (id or name) with a `number` and/or `name`.
+    """
+    path = None
+    try:
+        import_type = import_format(file.filename, format)
+        path = await save_upload(file, import_type)
+        job = job_manager.submit("import", {"path": path, "format": import_type, "group_id": group_id, "upsert": upsert})
+    except Exception as e:
+        logger.error(f"Error queueing card import: {str(e)}")
+        if path:
+            remove_upload(path)
+        return CardResponse(
+            success=False,
+            message="Error queueing card import",
+            error=str(e)
+        )
+    return CardResponse(
+        success=True,
+        message="Import job queued",
+        job_id=job.job_id
+    )
+
+async def run_price_refresh_job(job: JobStatus) -> Dict[str, Any]:
+    """Job handler for market price refreshes."""
+    return await refresh_market_prices(pokemon_tcg, notion_writer, get_notion(), job=job, history=get_price_history())
+
+job_manager.register("price_refresh", run_price_refresh_job)
+
+@router.post("/prices/refresh", response_model=CardResponse)
+async def refresh_prices():
+    """Queue a refresh of the market price stored on every Notion page."""
+    try:
+        job = job_manager.submit("price_refresh", {})
+    except Exception as e:
+        logger.error(f"Error queueing price refresh: {str(e)}")
+        return CardResponse(
+            success=False,
+            message="Error queueing price refresh",
+            error=str(e)
+        )
+    return CardResponse(
+        success=True,
+        message="Price refresh job queued",
+        job_id=job.job_id
+    )
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    """Get the status, progress and result of a background job."""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs/{job_id}/progress", response_model=JobProgress)
+async def get_job_progress(job_id: str):
+    """Get just the progress counters of a background job."""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.progress
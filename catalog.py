@@ -0,0 +1,308 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Dict, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Number of sets downloaded concurrently during a sync
+SYNC_CONCURRENCY = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cards (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    name_norm TEXT NOT NULL,
+    set_id TEXT NOT NULL,
+    number TEXT NOT NULL,
+    rarity TEXT NOT NULL,
+    data TEXT NOT NULL,
+    synced_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cards_name ON cards (name_norm);
+CREATE INDEX IF NOT EXISTS idx_cards_set_number ON cards (set_id, number);
+CREATE INDEX IF NOT EXISTS idx_cards_rarity ON cards (rarity);
+CREATE TABLE IF NOT EXISTS card_name_tokens (
+    token TEXT NOT NULL,
+    card_id TEXT NOT NULL,
+    PRIMARY KEY (token, card_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sets (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    updated_at TEXT,
+    data TEXT NOT NULL,
+    synced_at REAL NOT NULL
+);
+"""
+
+def tokenize(text: str) -> List[str]:
+    """Split a card name into lowercase word tokens, matching the upstream phrase search."""
+    return re.findall(r"\w+", text.lower())
+
+class CardCatalog:
+    """On-disk mirror of the Pokemon TCG card and set catalog."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._synced = False
+        # Bumped on every write so in-memory indexes know when to rebuild
+        self.version = 0
+
+    def exists(self) -> bool:
+        """Whether the catalog has been created on disk."""
+        return self._conn is not None or os.path.exists(self.path)
+
+    def is_synced(self) -> bool:
+        """Whether at least one full sync has completed, making the catalog authoritative."""
+        if not self._synced and self.exists():
+            with self._lock:
+                self._synced = self.conn.execute("SELECT 1 FROM sets LIMIT 1").fetchone() is not None
+        return self._synced
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Open the catalog database, creating it on first use."""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        """Close the database connection."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def search(self, name: str, set_id: Optional[str] = None, max_age: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Find cards whose name contains the given phrase, like the upstream `name:"..."` query.
+
+        Returns an empty list when nothing matches or when any match is older than
+        `max_age` seconds, so callers know to fall back to the live API.
+        """
+        tokens = tokenize(name)
+        if not tokens or not self.exists():
+            return []
+
+        query = (
+            "SELECT c.name_norm, c.data, c.synced_at FROM card_name_tokens t "
+            "JOIN cards c ON c.id = t.card_id WHERE t.token = ?"
+        )
+        params: List[Any] = [tokens[0]]
+        if set_id:
+            query += " AND c.set_id = ?"
+            params.append(set_id)
+        query += " ORDER BY c.rowid"
+
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+
+        phrase = f" {' '.join(tokens)} "
+        matches = [row for row in rows if phrase in f" {row[0]} "]
+        if not matches:
+            return []
+        if max_age is not None and min(row[2] for row in matches) < time.time() - max_age:
+            return []
+        return [json.loads(row[1]) for row in matches]
+
+    def find(self, set_id: Optional[str] = None, number: Optional[str] = None, rarity: Optional[str] = None) -> List[Dict[str, Any]]:
+        """List cards by set, collector number and/or rarity."""
+        if not self.exists():
+            return []
+
+        conditions = []
+        params = []
+        for column, value in (("set_id", set_id), ("number", number), ("rarity", rarity)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        query = "SELECT data FROM cards"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY rowid"
+
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get_card(self, card_id: str, max_age: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Get a single card by its id, or None if it is missing or older than `max_age` seconds."""
+        if not self.exists():
+            return None
+        with self._lock:
+            row = self.conn.execute("SELECT data, synced_at FROM cards WHERE id = ?", (card_id,)).fetchone()
+        if not row or (max_age is not None and row[1] < time.time() - max_age):
+            return None
+        return json.loads(row[0])
+
+    def _insert_cards(self, cards: List[Dict[str, Any]], synced_at: float) -> None:
+        """Insert or replace cards and their name tokens. Caller holds the lock."""
+        ids = [(card["id"],) for card in cards]
+        self.conn.executemany("DELETE FROM card_name_tokens WHERE card_id = ?", ids)
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO cards (id, name, name_norm, set_id, number, rarity, data, synced_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    card["id"],
+                    card["name"],
+                    " ".join(tokenize(card["name"])),
+                    card["set"]["id"],
+                    str(card.get("number", "")),
+                    str(card.get("rarity", "Unknown")),
+                    json.dumps(card),
+                    synced_at
+                )
+                for card in cards
+            ]
+        )
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO card_name_tokens (token, card_id) VALUES (?, ?)",
+            [(token, card["id"]) for card in cards for token in set(tokenize(card["name"]))]
+        )
+
+    def upsert_cards(self, cards: List[Dict[str, Any]]) -> None:
+        """Write cards fetched from the live API back into the catalog."""
+        with self._lock, self.conn:
+            self._insert_cards(cards, time.time())
+        self.version += 1
+
+    def replace_set(self, card_set: Dict[str, Any], cards: List[Dict[str, Any]]) -> None:
+        """Replace every card of a set, dropping cards that no longer exist upstream."""
+        synced_at = time.time()
+        with self._lock, self.conn:
+            stale = self.conn.execute("SELECT id FROM cards WHERE set_id = ?", (card_set["id"],)).fetchall()
+            self.conn.executemany("DELETE FROM card_name_tokens WHERE card_id = ?", stale)
+            self.conn.execute("DELETE FROM cards WHERE set_id = ?", (card_set["id"],))
+            self._insert_cards(cards, synced_at)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sets (id, name, updated_at, data, synced_at) VALUES (?, ?, ?, ?, ?)",
+                (card_set["id"], card_set["name"], card_set.get("updatedAt"), json.dumps(card_set), synced_at)
+            )
+        self.version += 1
+
+    def touch_sets(self, set_ids: List[str]) -> None:
+        """Mark sets confirmed unchanged upstream, and their cards, as freshly synced."""
+        if not set_ids:
+            return
+        synced_at = time.time()
+        params = [(synced_at, set_id) for set_id in set_ids]
+        with self._lock, self.conn:
+            self.conn.executemany("UPDATE sets SET synced_at = ? WHERE id = ?", params)
+            self.conn.executemany("UPDATE cards SET synced_at = ? WHERE set_id = ?", params)
+        self.version += 1
+
+    def get_sets(self) -> List[Dict[str, Any]]:
+        """List all synced sets."""
+        if not self.exists():
+            return []
+        with self._lock:
+            rows = self.conn.execute("SELECT data FROM sets ORDER BY rowid").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def set_versions(self) -> Dict[str, Optional[str]]:
+        """Map each synced set id to the upstream `updatedAt` it was synced at."""
+        if not self.exists():
+            return {}
+        with self._lock:
+            rows = self.conn.execute("SELECT id, updated_at FROM sets").fetchall()
+        return dict(rows)
+
+    def name_counts(self) -> List[Tuple[str, int]]:
+        """Every distinct card name with the number of cards printed under it."""
+        if not self.exists():
+            return []
+        with self._lock:
+            return self.conn.execute("SELECT name, COUNT(*) FROM cards GROUP BY name").fetchall()
+
+    def set_card_counts(self) -> List[Tuple[str, str, int]]:
+        """Every synced set as (id, name, number of cards)."""
+        if not self.exists():
+            return []
+        with self._lock:
+            return self.conn.execute(
+                "SELECT s.id, s.name, COUNT(c.id) FROM sets s LEFT JOIN cards c ON c.set_id = s.id GROUP BY s.id"
+            ).fetchall()
+
+    def count_cards(self) -> int:
+        """Number of cards in the catalog."""
+        if not self.exists():
+            return 0
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM cards").fetchone()[0]
+
+async def sync_catalog(api, catalog: CardCatalog, full: bool = False) -> Dict[str, int]:
+    """Mirror the upstream catalog, re-downloading only sets whose `updatedAt` changed."""
+    sets = await api.get_sets()
+    versions = {} if full else await asyncio.to_thread(catalog.set_versions)
+    changed = [card_set for card_set in sets if versions.get(card_set["id"]) != card_set.get("updatedAt")]
+    logger.info(f"Catalog sync: {len(changed)} of {len(sets)} sets need updating")
+    # Unchanged sets are as fresh as the changed ones, so searches keep treating them as current
+    changed_ids = {card_set["id"] for card_set in changed}
+    await asyncio.to_thread(catalog.touch_sets, [card_set["id"] for card_set in sets if card_set["id"] not in changed_ids])
+
+    semaphore = asyncio.Semaphore(SYNC_CONCURRENCY)
+    synced_cards = 0
+
+    async def sync_set(card_set: Dict[str, Any]) -> None:
+        nonlocal synced_cards
+        async with semaphore:
+            try:
+                cards = await api.get_set_cards(card_set["id"])
+                # Writing a whole set takes a while, so keep it off the event loop
+                await asyncio.to_thread(catalog.replace_set, card_set, cards)
+                synced_cards += len(cards)
+            except Exception as e:
+                logger.error(f"Error syncing set {card_set['id']}: {str(e)}")
+
+    await asyncio.gather(*(sync_set(card_set) for card_set in changed))
+    logger.info(f"Catalog sync completed: {synced_cards} cards updated")
+    return {"sets": len(sets), "updated_sets": len(changed), "cards": synced_cards}
+
+async def run_catalog_sync_loop(api, catalog: CardCatalog, interval_hours: float) -> None:
+    """Keep the catalog in sync by re-running the incremental sync periodically."""
+    while True:
+        try:
+            await sync_catalog(api, catalog)
+        except Exception as e:
+            logger.error(f"Error syncing catalog: {str(e)}")
+        await asyncio.sleep(interval_hours * 3600)
+
+async def _run_sync(full: bool) -> None:
+    from pokemon_tcg_api import PokemonTCGAPI
+
+    api = PokemonTCGAPI()
+    if api.catalog is None:
+        logger.error("CATALOG_PATH is not set; nothing to sync")
+        return
+    try:
+        result = await sync_catalog(api, api.catalog, full=full)
+        logger.info(f"Catalog now holds {api.catalog.count_cards()} cards ({result})")
+    finally:
+        await api.aclose()
+        api.catalog.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync the local Pokemon TCG catalog")
+    parser.add_argument("command", choices=["sync"])
+    parser.add_argument("--full", action="store_true", help="Re-download every set")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(_run_sync(args.full))
@@ -0,0 +1,158 @@
+from fastapi import APIRouter, Query
+from datetime import datetime, timedelta
+from typing import Dict, Literal, Optional
+import asyncio
+import logging
+
+import numpy as np
+
+from schemas import CollectionCount, CollectionList, CollectionPage, CollectionValue, SetValue
+from notion_integration import get_notion
+from price_history import PriceHistory, get_price_history
+from price_refresh import card_set_id
+from replica import CollectionReplica, ensure_replica, get_replica
+
+logger = logging.getLogger(__name__)
+router = APIRouter(tags=["collection"])
+
+# Default valuation window when no start date is given
+DEFAULT_VALUATION_DAYS = 30
+
+async def open_replica() -> CollectionReplica:
+    """The collection replica, seeded from Notion on first use."""
+    replica = get_replica()
+    if replica is None:
+        raise RuntimeError("COLLECTION_REPLICA_PATH is not set")
+    if not replica.is_synced():
+        await asyncio.to_thread(ensure_replica, get_notion(), replica)
+    return replica
+
+@router.get("", response_model=CollectionList)
+async def list_collection(
+    set: Optional[str] = None,
+    rarity: Optional[str] = None,
+    group_id: Optional[str] = None,
+    repeated: Optional[bool] = None,
+    card_id: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
+):
+    """List collection pages from the local replica, filtered by set, rarity, group or repeated flag."""
+    try:
+        replica = await open_replica()
+        filters = {"set": set, "rarity": rarity, "group_id": group_id, "repeated": repeated, "card_id": card_id}
+        rows, total = replica.list_pages(filters, limit, offset)
+        return CollectionList(
+            success=True,
+            total=total,
+            limit=limit,
+            offset=offset,
+            pages=[CollectionPage(**row) for row in rows]
+        )
+
+    except Exception as e:
+        logger.error(f"Error listing collection: {str(e)}")
+        return CollectionList(
+            success=False,
+            error=str(e)
+        )
+
+@router.get("/count", response_model=CollectionCount)
+async def count_collection(
+    set: Optional[str] = None,
+    rarity: Optional[str] = None,
+    group_id: Optional[str] = None,
+    repeated: Optional[bool] = None,
+    card_id: Optional[str] = None,
+    group_by: Optional[Literal["set", "rarity", "group_id", "repeated"]] = None
+):
+    """Count collection pages from the local replica, optionally grouped by a column."""
+    try:
+        replica = await open_replica()
+        filters = {"set": set, "rarity": rarity, "group_id": group_id, "repeated": repeated, "card_id": card_id}
+        total, groups = replica.count(filters, group_by)
+        return CollectionCount(
+            success=True,
+            total=total,
+            groups=groups
+        )
+
+    except Exception as e:
+        logger.error(f"Error counting collection: {str(e)}")
+        return CollectionCount(
+            success=False,
+            error=str(e)
+        )
+
+def seed_price_history(history: PriceHistory, notion) -> int:
+    """Record the indexed page price of held cards the price history has no point for yet."""
+    pages = [(card_id, price) for _, card_id, price in notion.get_card_pages() if price]
+    # Another worker may have recorded some of these cards since this one last read the history
+    history.refresh()
+    missing = history.index_of([card_id for card_id, _ in pages]) < 0
+    return history.record({card_id: price for (card_id, price), new in zip(pages, missing) if new})
+
+def value_collection(history: PriceHistory, holdings: Dict[str, int], start: datetime, end: datetime) -> CollectionValue:
+    """Value the held cards at `start` and `end` with vectorized lookups over the price history."""
+    card_ids = list(holdings)
+    quantities = np.fromiter(holdings.values(), dtype=np.float64, count=len(holdings))
+    columns = history.index_of(card_ids)
+
+    def by_card(prices: np.ndarray) -> np.ndarray:
+        # Cards without history have column -1, which picks the trailing NaN
+        return np.append(prices.astype(np.float64), np.nan)[columns]
+
+    start_prices = by_card(history.prices_at(start.timestamp()))
+    end_prices = by_card(history.prices_at(end.timestamp()))
+    # Cards first priced inside the window start from that first price, not from zero
+    first_prices = by_card(history.first_prices(end.timestamp()))
+    start_prices = np.where(np.isnan(start_prices), first_prices, start_prices)
+    start_values = np.nan_to_num(start_prices) * quantities
+    end_values = np.nan_to_num(end_prices) * quantities
+    unpriced = np.isnan(end_prices)
+
+    set_ids, set_columns = np.unique(np.array([card_set_id(card_id) for card_id in card_ids], dtype=str), return_inverse=True)
+    set_cards = np.bincount(set_columns, weights=quantities, minlength=len(set_ids))
+    set_values = np.bincount(set_columns, weights=end_values, minlength=len(set_ids))
+    set_start_values = np.bincount(set_columns, weights=start_values, minlength=len(set_ids))
+    order = np.argsort(-set_values, kind="stable")
+
+    return CollectionValue(
+        success=True,
+        start=start,
+        end=end,
+        cards=int(quantities.sum()),
+        unpriced_cards=int(quantities[unpriced].sum()),
+        value=round(float(end_values.sum()), 2),
+        start_value=round(float(start_values.sum()), 2),
+        change=round(float(end_values.sum() - start_values.sum()), 2),
+        sets=[
+            SetValue(
+                set_id=str(set_ids[i]),
+                cards=int(set_cards[i]),
+                value=round(float(set_values[i]), 2),
+                start_value=round(float(set_start_values[i]), 2),
+                change=round(float(set_values[i] - set_start_values[i]), 2)
+            )
+            for i in order
+        ]
+    )
+
+@router.get("/value", response_model=CollectionValue)
+async def get_collection_value(start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """Total collection value, per-set breakdown and change between two dates."""
+    try:
+        end = end or datetime.now()
+        start = start or end - timedelta(days=DEFAULT_VALUATION_DAYS)
+        notion, history = get_notion(), get_price_history()
+        holdings = await asyncio.to_thread(notion.get_holdings)
+        # Cards written before the history existed are valued from their page prices
+        await asyncio.to_thread(seed_price_history, history, notion)
+        return value_collection(history, holdings, start, end)
+
+    except Exception as e:
+        logger.error(f"Error valuing collection: {str(e)}")
+        return CollectionValue(
+            success=False,
+            error=str(e)
+        )
@@ -6,9 +6,77 @@ class Settings(BaseSettings):
     # Notion settings
     NOTION_TOKEN: str
     NOTION_DATABASE_ID: str
+    NOTION_BASE_URL: str = "https://api.notion.com"
+    NOTION_CARD_INDEX_RECONCILE_SECONDS: float = 300.0
+    NOTION_RATE_LIMIT_PER_SECOND: float = 3.0
+    NOTION_WRITE_CONCURRENCY: int = 4
+    NOTION_MAX_RETRIES: int = 5
+    NOTION_SCHEMA_CACHE_PATH: Optional[str] = "data/notion_schema.json"
+    NOTION_SCHEMA_CACHE_TTL_HOURS: float = 24.0
     
     # API settings
     POKEMON_TCG_API_KEY: Optional[str] = None
+    POKEMON_TCG_BASE_URL: str = "https://api.pokemontcg.io/v2"
+    POKEMON_TCG_MAX_CONNECTIONS: int = 20
+    POKEMON_TCG_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    POKEMON_TCG_KEEPALIVE_EXPIRY: float = 30.0
+    POKEMON_TCG_TIMEOUT: float = 15.0
+    POKEMON_TCG_CONNECT_TIMEOUT: float = 5.0
+    POKEMON_TCG_RATE_LIMIT_PER_SECOND: float = 20.0
+    POKEMON_TCG_MAX_RETRIES: int = 3
+
+    # Retry and circuit breaker settings shared by both upstream APIs
+    UPSTREAM_BACKOFF_BASE_SECONDS: float = 0.5
+    UPSTREAM_BACKOFF_MAX_SECONDS: float = 30.0
+    UPSTREAM_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    UPSTREAM_CIRCUIT_RESET_SECONDS: float = 30.0
+
+    # Local card catalog settings
+    CATALOG_PATH: Optional[str] = "data/catalog.db"
+    CATALOG_MAX_AGE_HOURS: float = 24.0
+    CATALOG_SYNC_INTERVAL_HOURS: float = 0.0
+
+    # Card image recognition settings
+    CARD_HASH_INDEX_PATH: Optional[str] = "data/card_hashes.npz"
+    CARD_MATCH_MAX_DISTANCE: int = 12
+    RECOGNITION_WORKERS: int = 0  # 0 uses one worker process per CPU
+    UPLOAD_BATCH_MAX_FILES: int = 100
+
+    # Bulk import settings
+    IMPORT_UPLOAD_PATH: Optional[str] = "data/imports"  # Kept until the import job finishes
+    IMPORT_BATCH_ROWS: int = 500
+
+    # Card image proxy cache
+    IMAGE_CACHE_PATH: Optional[str] = "data/images"
+    IMAGE_CACHE_MAX_MB: float = 500.0
+    IMAGE_THUMBNAIL_WIDTH: int = 200
+
+    # Local replica of the Notion collection database
+    COLLECTION_REPLICA_PATH: Optional[str] = "data/collection.db"
+    COLLECTION_REPLICA_SYNC_SECONDS: float = 300.0  # 0 disables the background sync
+
+    # Market price refresh settings
+    PRICE_REFRESH_INTERVAL_HOURS: float = 0.0  # 0 disables the scheduled refresh
+    PRICE_REFRESH_MIN_CHANGE: float = 0.05
+    PRICE_REFRESH_MIN_CHANGE_PERCENT: float = 2.0
+    PRICE_HISTORY_PATH: Optional[str] = "data/price_history"
+
+    # Video processing settings
+    VIDEO_SAMPLE_FPS: float = 6.0
+    VIDEO_FRAME_DIFF_THRESHOLD: float = 6.0
+    VIDEO_MIN_DETECTIONS: int = 2
+
+    # In-process cache settings
+    CACHE_MAX_ENTRIES: int = 5000
+    CARD_CACHE_TTL_SECONDS: float = 3600.0
+    PRICE_CACHE_TTL_SECONDS: float = 600.0
+    CACHE_STALE_TTL_SECONDS: float = 3600.0
+    SHARED_CACHE_PATH: Optional[str] = "data/shared_cache.db"  # Shared by the worker processes on a host
+
+    # Background job settings
+    JOB_WORKERS: int = 2
+    JOB_STATE_PATH: Optional[str] = "data/jobs.json"
+    JOB_SHUTDOWN_TIMEOUT_SECONDS: float = 20.0
     
     # CORS settings
     CORS_ORIGINS: list[str] = ["*"]
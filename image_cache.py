@@ -0,0 +1,286 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, RedirectResponse, Response
+from collections import OrderedDict
+from functools import lru_cache
+from io import BytesIO
+from typing import BinaryIO, Literal, NamedTuple, Optional, Tuple
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+
+import httpx
+from PIL import Image
+from starlette.background import BackgroundTask
+
+from config import get_settings
+from card_processing import pokemon_tcg
+from metrics import track_upstream
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+router = APIRouter(tags=["images"])
+
+# Card images never change once published, so browsers may keep them for a year
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Card ids as used by the Pokemon TCG API; anything else could escape the cache directory
+CARD_ID_PATTERN = re.compile(r"[A-Za-z0-9][\w.-]*")
+
+MEDIA_TYPES = {"png": "image/png", "jpg": "image/jpeg", "webp": "image/webp"}
+
+ImageSize = Literal["large", "small", "thumb"]
+
+class CachedImage(NamedTuple):
+    path: str
+    size: int
+    etag: str
+
+    @property
+    def media_type(self) -> str:
+        return MEDIA_TYPES.get(self.path.rsplit(".", 1)[-1], "application/octet-stream")
+
+class ImageCache:
+    """Size-bounded on-disk cache of card images with least-recently-used eviction.
+
+    Files are named `<key>.<etag>.<ext>`, with the etag taken from the content hash, so
+    the index and recency order can be rebuilt from the directory (by access time) on start.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CachedImage]" = OrderedDict()
+        self._bytes = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self) -> None:
+        """Index the files already on disk, oldest access first. Caller holds the lock."""
+        os.makedirs(self.path, exist_ok=True)
+        found = []
+        for name in os.listdir(self.path):
+            if name.endswith(".tmp"):
+                # Left behind by a write interrupted before it was renamed into place
+                os.remove(os.path.join(self.path, name))
+                continue
+            parts = name.rsplit(".", 3)
+            if len(parts) != 4 or parts[3] not in MEDIA_TYPES:
+                continue
+            file_path = os.path.join(self.path, name)
+            stat = os.stat(file_path)
+            found.append((stat.st_atime, f"{parts[0]}.{parts[1]}", CachedImage(file_path, stat.st_size, f'"{parts[2]}"')))
+        for _, key, image in sorted(found, key=lambda item: item[0]):
+            self._entries[key] = image
+            self._bytes += image.size
+        self._loaded = True
+
+    def get(self, key: str) -> Optional[CachedImage]:
+        """The cached image for a key, marked as most recently used."""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            image = self._entries.get(key)
+            if image is None:
+                return None
+            self._entries.move_to_end(key)
+        try:
+            # Persist the recency so eviction order survives restarts
+            os.utime(image.path)
+        except FileNotFoundError:
+            with self._lock:
+                if self._entries.get(key) is image:
+                    del self._entries[key]
+                    self._bytes -= image.size
+            return None
+        return image
+
+    def put(self, key: str, content: bytes, extension: str) -> CachedImage:
+        """Store an image and evict the least recently used ones beyond the size limit."""
+        etag = hashlib.sha256(content).hexdigest()[:32]
+        file_path = os.path.join(self.path, f"{key}.{etag}.{extension}")
+        with self._lock:
+            if not self._loaded:
+                self._load()
+        # Write under a temporary name so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(content)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+        image = CachedImage(file_path, len(content), f'"{etag}"')
+        evicted = []
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+                if old.path != file_path:
+                    evicted.append(old)
+            self._entries[key] = image
+            self._bytes += image.size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, oldest = self._entries.popitem(last=False)
+                self._bytes -= oldest.size
+                evicted.append(oldest)
+        for old_image in evicted:
+            try:
+                os.remove(old_image.path)
+            except FileNotFoundError:
+                pass
+        return image
+
+@lru_cache()
+def get_image_cache() -> Optional[ImageCache]:
+    """The shared image cache, or None when IMAGE_CACHE_PATH is unset."""
+    settings = get_settings()
+    if not settings.IMAGE_CACHE_PATH:
+        return None
+    return ImageCache(settings.IMAGE_CACHE_PATH, int(settings.IMAGE_CACHE_MAX_MB * 1024 * 1024))
+
+def make_thumbnail(content: bytes, width: int) -> bytes:
+    """Scale an image down to `width` pixels wide as WebP, keeping transparent corners."""
+    with Image.open(BytesIO(content)) as image:
+        image.thumbnail((width, width * 2))
+        output = BytesIO()
+        image.save(output, format="WEBP", quality=80, method=4)
+    return output.getvalue()
+
+def read_file(f: BinaryIO) -> bytes:
+    with f:
+        return f.read()
+
+def held_path(f: BinaryIO) -> str:
+    """A path that reaches the open file even after eviction unlinks it, where the OS provides one."""
+    proc_path = f"/proc/self/fd/{f.fileno()}"
+    return proc_path if os.path.exists(proc_path) else f.name
+
+image_flights = SingleFlight()
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def get_client() -> httpx.AsyncClient:
+    """Keep-alive client for the image CDN, created in the running event loop."""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        settings = get_settings()
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.POKEMON_TCG_TIMEOUT, connect=settings.POKEMON_TCG_CONNECT_TIMEOUT),
+            follow_redirects=True
+        )
+        _client_loop = loop
+    return _client
+
+async def close_client() -> None:
+    """Close the image CDN connections."""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+
+async def upstream_image_url(card_id: str, size: ImageSize) -> str:
+    """The CDN URL of a card image; thumbnails are made from the large image."""
+    card = await pokemon_tcg.get_card(card_id, include_price=False)
+    url = ((card or {}).get("images") or {}).get("small" if size == "small" else "large")
+    if not url:
+        raise LookupError(f"No image for card {card_id}")
+    return url
+
+async def fetch_image(url: str) -> Tuple[bytes, str]:
+    """Download an image from the CDN and return it with its file extension."""
+    with track_upstream("images", "fetch"):
+        response = await get_client().get(url)
+        response.raise_for_status()
+    extension = url.rsplit(".", 1)[-1].lower()
+    if extension == "jpeg":
+        extension = "jpg"
+    if extension not in MEDIA_TYPES:
+        extension = "png"
+    return response.content, extension
+
+async def load_image(cache: ImageCache, card_id: str, size: ImageSize) -> CachedImage:
+    """A card image from the disk cache, downloaded or generated once on a miss."""
+    key = f"{card_id}.{size}"
+    image = await asyncio.to_thread(cache.get, key)
+    if image is not None:
+        return image
+
+    async def fill() -> CachedImage:
+        if size == "thumb":
+            _, large = await open_image(cache, card_id, "large")
+            content = await asyncio.to_thread(read_file, large)
+            thumbnail = await asyncio.to_thread(make_thumbnail, content, get_settings().IMAGE_THUMBNAIL_WIDTH)
+            return await asyncio.to_thread(cache.put, key, thumbnail, "webp")
+        content, extension = await fetch_image(await upstream_image_url(card_id, size))
+        return await asyncio.to_thread(cache.put, key, content, extension)
+
+    return await image_flights.do(key, fill)
+
+async def open_image(cache: ImageCache, card_id: str, size: ImageSize) -> Tuple[CachedImage, BinaryIO]:
+    """A cached card image and its open file, loaded again if it was evicted before it could be opened.
+
+    An open file stays readable after eviction removes it, so it is safe to serve.
+    """
+    image = await load_image(cache, card_id, size)
+    try:
+        return image, await asyncio.to_thread(open, image.path, "rb")
+    except FileNotFoundError:
+        image = await load_image(cache, card_id, size)
+        return image, await asyncio.to_thread(open, image.path, "rb")
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+@router.get("/{card_id}")
+async def get_card_image(card_id: str, request: Request, size: ImageSize = "thumb"):
+    """Serve a card image from the local cache, with strong ETags and a long cache lifetime.
+
+    `large` and `small` are the Pokemon TCG images; `thumb` is generated once from `large`.
+    """
+    if not CARD_ID_PATTERN.fullmatch(card_id):
+        raise HTTPException(status_code=404, detail="Card not found")
+
+    cache = get_image_cache()
+    try:
+        if cache is None:
+            if size == "thumb":
+                size = "small"
+            return RedirectResponse(await upstream_image_url(card_id, size))
+        if request.headers.get("if-none-match"):
+            # Revalidate against the cached copy's etag without opening or fetching anything
+            image = await asyncio.to_thread(cache.get, f"{card_id}.{size}")
+            if image is not None and etag_matches(request, image.etag):
+                return Response(status_code=304, headers={"ETag": image.etag, "Cache-Control": CACHE_CONTROL})
+        image, f = await open_image(cache, card_id, size)
+
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Card image not found")
+    except Exception as e:
+        logger.error(f"Error loading image of card {card_id}: {str(e)}")
+        raise HTTPException(status_code=502, detail="Could not fetch the card image")
+
+    headers = {"ETag": image.etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request, image.etag):
+        f.close()
+        return Response(status_code=304, headers=headers)
+    # Served through the open file, so servers with path sending use sendfile and eviction cannot break it
+    return FileResponse(
+        held_path(f),
+        headers=headers,
+        media_type=image.media_type,
+        stat_result=os.fstat(f.fileno()),
+        background=BackgroundTask(f.close)
+    )
@@ -1,17 +1,250 @@
-from typing import Dict, Any
+import argparse
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+import httpx
+import numpy as np
 from fastapi import UploadFile
+from PIL import Image, ImageOps
 
-async def process_card_image(file: UploadFile) -> Dict[str, Any]:
-    """Process an uploaded card image and extract text."""
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Images are reduced to HASH_IMAGE_SIZE^2 greyscale before the DCT; the top-left
+# HASH_SIZE^2 low frequencies form the 64-bit perceptual hash
+HASH_IMAGE_SIZE = 32
+HASH_SIZE = 8
+
+# Number of card images downloaded concurrently while building the index
+INDEX_DOWNLOAD_CONCURRENCY = 16
+
+def _dct_matrix(size: int) -> np.ndarray:
+    """Orthonormal DCT-II basis, so a 2D DCT is two matrix products."""
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.sqrt(2.0 / size) * np.cos(np.pi * (2 * n + 1) * k / (2 * size))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+DCT_MATRIX = _dct_matrix(HASH_IMAGE_SIZE)
+
+# Number of set bits in every 16-bit value, for vectorized Hamming distances
+POPCOUNT_TABLE = np.array([bin(value).count("1") for value in range(1 << 16)], dtype=np.uint8)
+
+def compute_phash(image: Image.Image) -> int:
+    """Compute the 64-bit perceptual hash (pHash) of an image."""
+    image = ImageOps.exif_transpose(image).convert("L").resize(
+        (HASH_IMAGE_SIZE, HASH_IMAGE_SIZE), Image.LANCZOS
+    )
+    pixels = np.asarray(image, dtype=np.float64)
+    frequencies = (DCT_MATRIX @ pixels @ DCT_MATRIX.T)[:HASH_SIZE, :HASH_SIZE]
+    # Compare against the median of the AC terms so overall brightness does not matter
+    bits = (frequencies > np.median(frequencies.flatten()[1:])).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+class HashIndex:
+    """Perceptual hashes of every card image, packed into a uint64 array for vectorized search."""
+
+    def __init__(self, card_ids: List[str], hashes: np.ndarray):
+        self.card_ids = card_ids
+        self.hashes = hashes.astype(np.uint64)
+
+    def __len__(self) -> int:
+        return len(self.card_ids)
+
+    @classmethod
+    def load(cls, path: str) -> "HashIndex":
+        """Load an index written by `save`."""
+        with np.load(path) as data:
+            return cls(data["card_ids"].tolist(), data["hashes"])
+
+    def save(self, path: str) -> None:
+        """Write the index as a compressed .npz file."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.savez_compressed(path, card_ids=np.array(self.card_ids), hashes=self.hashes)
+
+    def distances(self, image_hash: int) -> np.ndarray:
+        """Hamming distance from the hash to every card in the index."""
+        diff = self.hashes ^ np.uint64(image_hash)
+        return POPCOUNT_TABLE[diff.view(np.uint16)].reshape(-1, 4).sum(axis=1, dtype=np.uint8)
+
+    def nearest(self, image_hash: int, k: int = 1) -> List[Tuple[str, int]]:
+        """The k closest cards as (card_id, distance), closest first."""
+        if not self.card_ids:
+            return []
+        distances = self.distances(image_hash)
+        k = min(k, len(distances))
+        candidates = np.argpartition(distances, k - 1)[:k]
+        candidates = candidates[np.argsort(distances[candidates], kind="stable")]
+        return [(self.card_ids[i], int(distances[i])) for i in candidates]
+
+_hash_index: Optional[HashIndex] = None
+
+def get_hash_index() -> Optional[HashIndex]:
+    """Shared hash index, loaded on first use, or None if it has not been built yet."""
+    global _hash_index
+    if _hash_index is None:
+        path = get_settings().CARD_HASH_INDEX_PATH
+        if not path or not os.path.exists(path):
+            logger.warning("Card hash index not found; run `python image_processing.py build-index`")
+            return None
+        _hash_index = HashIndex.load(path)
+        logger.info(f"Loaded card hash index with {len(_hash_index)} cards")
+    return _hash_index
+
+def recognize_image(image: Image.Image) -> Dict[str, Any]:
+    """Identify the card in a decoded image by its nearest perceptual hash."""
+    index = get_hash_index()
+    if index is None:
+        return {
+            "success": False,
+            "error": "Card recognition index is not available"
+        }
+
+    matches = index.nearest(compute_phash(image))
+    max_distance = get_settings().CARD_MATCH_MAX_DISTANCE
+    if not matches or matches[0][1] > max_distance:
+        return {
+            "success": False,
+            "error": "No matching card found"
+        }
+
+    card_id, distance = matches[0]
+    return {
+        "success": True,
+        "card_id": card_id,
+        "distance": distance
+    }
+
+def recognize_card(data: bytes) -> Dict[str, Any]:
+    """Identify the card in an encoded image file."""
+    try:
+        return recognize_image(Image.open(io.BytesIO(data)))
+
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+def recognize_frame(frame: np.ndarray) -> Dict[str, Any]:
+    """Identify the card in a decoded BGR video frame."""
     try:
-        # Mock response for testing
+        return recognize_image(Image.fromarray(np.ascontiguousarray(frame[..., ::-1])))
+
+    except Exception as e:
         return {
-            "success": True,
-            "text": "Charizard"  # Mock text for testing
+            "success": False,
+            "error": str(e)
         }
-        
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Shared process pool for CPU-bound recognition, started on first use."""
+    global _process_pool
+    if _process_pool is None:
+        # Spawned workers avoid forking a process that is running threads and an event loop
+        _process_pool = ProcessPoolExecutor(
+            max_workers=get_settings().RECOGNITION_WORKERS or None,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=get_hash_index
+        )
+    return _process_pool
+
+def shutdown_process_pool() -> None:
+    """Stop the recognition workers, if they were started."""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(cancel_futures=True)
+        _process_pool = None
+
+async def process_card_image(file: UploadFile) -> Dict[str, Any]:
+    """Process an uploaded card image and identify the card it shows."""
+    try:
+        data = await file.read()
+        # Decoding and hashing are CPU bound, so keep them off the event loop
+        return await asyncio.to_thread(recognize_card, data)
+
     except Exception as e:
         return {
             "success": False,
             "error": str(e)
-        } 
\ No newline at end of file
+        }
+
+async def process_card_images(files: List[UploadFile]) -> List[Dict[str, Any]]:
+    """Identify the cards in several uploaded images in parallel, in input order."""
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+
+    async def process(file: UploadFile) -> Dict[str, Any]:
+        try:
+            data = await file.read()
+            return await loop.run_in_executor(pool, recognize_card, data)
+
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
+    return await asyncio.gather(*(process(file) for file in files))
+
+async def build_hash_index(cards: List[Dict[str, Any]]) -> HashIndex:
+    """Download every card's small image and hash it."""
+    semaphore = asyncio.Semaphore(INDEX_DOWNLOAD_CONCURRENCY)
+    card_ids = []
+    hashes = []
+
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        async def hash_card(card: Dict[str, Any]) -> None:
+            url = card.get("images", {}).get("small")
+            if not url:
+                return
+            async with semaphore:
+                try:
+                    response = await client.get(url)
+                    response.raise_for_status()
+                    image_hash = await asyncio.to_thread(compute_phash, Image.open(io.BytesIO(response.content)))
+                except Exception as e:
+                    logger.error(f"Error hashing image for card {card['id']}: {str(e)}")
+                    return
+            card_ids.append(card["id"])
+            hashes.append(image_hash)
+
+        await asyncio.gather(*(hash_card(card) for card in cards))
+
+    return HashIndex(card_ids, np.array(hashes, dtype=np.uint64))
+
+async def _run_build_index() -> None:
+    from catalog import CardCatalog
+
+    settings = get_settings()
+    catalog = CardCatalog(settings.CATALOG_PATH)
+    if not catalog.is_synced():
+        logger.error("The card catalog is empty; run `python catalog.py sync` first")
+        return
+    cards = catalog.find()
+    logger.info(f"Hashing {len(cards)} card images")
+    index = await build_hash_index(cards)
+    index.save(settings.CARD_HASH_INDEX_PATH)
+    logger.info(f"Saved hash index with {len(index)} cards to {settings.CARD_HASH_INDEX_PATH}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the card image recognition index")
+    parser.add_argument("command", choices=["build-index"])
+    parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(_run_build_index())
@@ -0,0 +1,197 @@
+import asyncio
+import fcntl
+import itertools
+import json
+import logging
+import os
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from schemas import JobStatus
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs kept around for status polling
+MAX_FINISHED_JOBS = 500
+
+JobHandler = Callable[[JobStatus], Awaitable[Optional[Dict[str, Any]]]]
+
+class JobManager:
+    """Runs long operations on a pool of background workers with pollable progress.
+
+    Unfinished jobs are written to `state_path` on shutdown and re-queued on the next
+    start, so handlers should use `job.checkpoint` to skip work already done. Each process
+    claims its own numbered state file, since jobs only live in the process that ran them.
+    """
+
+    def __init__(self, workers: int, state_path: Optional[str] = None):
+        self.worker_count = workers
+        self.state_path = state_path
+        self._state_file: Optional[str] = None
+        self._state_lock = None
+        self.jobs: Dict[str, JobStatus] = {}
+        self._handlers: Dict[str, JobHandler] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._workers: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._stopping = False
+        self._loaded = False
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        """Register the coroutine that runs jobs of the given kind."""
+        self._handlers[kind] = handler
+
+    def get(self, job_id: str) -> Optional[JobStatus]:
+        """Look up a job by id."""
+        return self.jobs.get(job_id)
+
+    def start(self) -> None:
+        """Start the workers in the running event loop and re-queue persisted jobs."""
+        if self.state_path and self._state_lock is None:
+            self._claim_state_file()
+        if not self._loaded:
+            self._load_state()
+            self._loaded = True
+
+        self._stopping = False
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+        for job in sorted(self.jobs.values(), key=lambda job: job.created_at):
+            if job.status == "queued":
+                self._queue.put_nowait(job.job_id)
+        logger.info(f"Started {self.worker_count} job workers")
+
+    def _ensure_started(self) -> None:
+        if self._loop is not asyncio.get_running_loop() or not self._workers:
+            self.start()
+
+    def submit(self, kind: str, params: Dict[str, Any]) -> JobStatus:
+        """Queue a new job and return its status record."""
+        if self._stopping:
+            raise RuntimeError("Job manager is shutting down")
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        self._ensure_started()
+        job = JobStatus(job_id=uuid.uuid4().hex, kind=kind, params=params, created_at=datetime.now())
+        self.jobs[job.job_id] = job
+        self._queue.put_nowait(job.job_id)
+        self._prune()
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                job = self.jobs.get(job_id)
+                if job is None or job.status != "queued" or self._stopping:
+                    continue
+                task = asyncio.create_task(self._run(job))
+                self._running[job_id] = task
+                try:
+                    await asyncio.shield(task)
+                finally:
+                    self._running.pop(job_id, None)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: JobStatus) -> None:
+        job.status = "running"
+        job.started_at = datetime.now()
+        try:
+            job.result = await self._handlers[job.kind](job)
+            job.status = "completed"
+        except asyncio.CancelledError:
+            # Interrupted by shutdown; resumed from its checkpoint on the next start
+            job.status = "queued"
+            raise
+        except Exception as e:
+            logger.error(f"Job {job.job_id} ({job.kind}) failed: {str(e)}")
+            job.errors.append(str(e))
+            job.status = "failed"
+        finally:
+            if job.status != "queued":
+                job.finished_at = datetime.now()
+
+    async def shutdown(self, timeout: float) -> None:
+        """Stop taking jobs, give in-flight jobs `timeout` seconds to finish and persist the rest."""
+        self._stopping = True
+        running = list(self._running.values())
+        if running:
+            logger.info(f"Waiting up to {timeout}s for {len(running)} running jobs")
+            _, pending = await asyncio.wait(running, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._save_state()
+        self._release_state_file()
+
+    def _prune(self) -> None:
+        finished = [job for job in self.jobs.values() if job.status in ("completed", "failed")]
+        if len(finished) > MAX_FINISHED_JOBS:
+            finished.sort(key=lambda job: job.finished_at or job.created_at)
+            for job in finished[:len(finished) - MAX_FINISHED_JOBS]:
+                del self.jobs[job.job_id]
+
+    def _claim_state_file(self) -> None:
+        """Lock the first state file no other process holds: `state_path`, then `name.1.ext` and so on."""
+        root, ext = os.path.splitext(self.state_path)
+        try:
+            directory = os.path.dirname(self.state_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            for slot in itertools.count():
+                path = self.state_path if slot == 0 else f"{root}.{slot}{ext}"
+                lock = open(f"{path}.lock", "a")
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    lock.close()
+                    continue
+                self._state_file, self._state_lock = path, lock
+                return
+        except Exception as e:
+            logger.error(f"Error claiming job state file: {str(e)}")
+
+    def _release_state_file(self) -> None:
+        if self._state_lock is not None:
+            self._state_lock.close()
+            self._state_lock = None
+
+    def _save_state(self) -> None:
+        if not self._state_file:
+            return
+        unfinished = [job.model_dump(mode="json") for job in self.jobs.values() if job.status in ("queued", "running")]
+        try:
+            if not unfinished:
+                if os.path.exists(self._state_file):
+                    os.remove(self._state_file)
+                return
+            with open(self._state_file, "w") as f:
+                json.dump(unfinished, f)
+            logger.info(f"Saved {len(unfinished)} unfinished jobs to {self._state_file}")
+        except Exception as e:
+            logger.error(f"Error saving job state: {str(e)}")
+
+    def _load_state(self) -> None:
+        if not self._state_file or not os.path.exists(self._state_file):
+            return
+        try:
+            with open(self._state_file) as f:
+                for data in json.load(f):
+                    job = JobStatus(**data)
+                    job.status = "queued"
+                    self.jobs[job.job_id] = job
+            os.remove(self._state_file)
+            logger.info(f"Restored {len(self.jobs)} unfinished jobs from {self._state_file}")
+        except Exception as e:
+            logger.error(f"Error loading job state: {str(e)}")
@@ -1,16 +1,30 @@
+import time
+
+# Measured from the first import so the startup time includes loading the app modules
+process_started = time.perf_counter()
+
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, PlainTextResponse
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 from datetime import datetime
 import os
 from dotenv import load_dotenv
 
-from card_processing import router as card_router
+from card_processing import router as card_router, pokemon_tcg, job_manager
+from video_processing import router as video_router
+from collection import router as collection_router
+from image_cache import router as image_router, close_client as close_image_client
+from catalog import run_catalog_sync_loop
+from price_refresh import run_price_refresh_loop
+from replica import get_replica, run_replica_sync_loop
 from config import get_settings
-from notion_integration import verify_database
+from image_processing import shutdown_process_pool
+from notion_integration import get_notion, verify_database
+from metrics import observe_request, render_metrics, start_request_timings
 
 # Configure logging
 logging.basicConfig(
@@ -22,18 +36,10 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # Startup
+async def verify_database_in_background(database_id: str) -> None:
+    """Verify the Notion database from a worker thread, logging rather than raising errors."""
     try:
-        database_id = os.getenv("NOTION_DATABASE_ID")
-        if not database_id:
-            logger.error("NOTION_DATABASE_ID environment variable is not set")
-            yield
-            return
-            
-        logger.info(f"Verifying Notion database connection... Database ID: {database_id}")
-        verify_database(database_id)
+        await asyncio.to_thread(verify_database, database_id)
         logger.info("Notion database connection verified successfully")
     except Exception as e:
         logger.error(f"Error verifying database: {str(e)}")
@@ -41,9 +47,60 @@ async def lifespan(app: FastAPI):
         logger.error(f"Exception type: {type(e)}")
         import traceback
         logger.error(traceback.format_exc())
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup
+    job_manager.start()
+    catalog_sync_task = None
+    if pokemon_tcg.catalog is not None and settings.CATALOG_SYNC_INTERVAL_HOURS > 0:
+        logger.info("Starting background catalog sync")
+        catalog_sync_task = asyncio.create_task(
+            run_catalog_sync_loop(pokemon_tcg, pokemon_tcg.catalog, settings.CATALOG_SYNC_INTERVAL_HOURS)
+        )
+    price_refresh_task = None
+    if settings.PRICE_REFRESH_INTERVAL_HOURS > 0:
+        logger.info(f"Scheduling market price refresh every {settings.PRICE_REFRESH_INTERVAL_HOURS}h")
+        price_refresh_task = asyncio.create_task(
+            run_price_refresh_loop(job_manager, settings.PRICE_REFRESH_INTERVAL_HOURS)
+        )
+
+    replica = get_replica()
+    replica_sync_task = None
+    if replica is not None and settings.COLLECTION_REPLICA_SYNC_SECONDS > 0:
+        logger.info("Starting background collection replica sync")
+        replica_sync_task = asyncio.create_task(
+            run_replica_sync_loop(get_notion(), replica, settings.COLLECTION_REPLICA_SYNC_SECONDS)
+        )
+
+    database_id = os.getenv("NOTION_DATABASE_ID")
+    verify_task = None
+    if not database_id:
+        logger.error("NOTION_DATABASE_ID environment variable is not set")
+    else:
+        # Verification talks to Notion, so it runs once in the background instead of delaying startup
+        logger.info(f"Verifying Notion database connection in the background... Database ID: {database_id}")
+        verify_task = asyncio.create_task(verify_database_in_background(database_id))
+
+    app.state.startup_seconds = time.perf_counter() - process_started
+    logger.info(f"Startup completed in {app.state.startup_seconds * 1000:.1f} ms")
     yield
     # Shutdown
     logger.info("Shutting down application...")
+    await job_manager.shutdown(settings.JOB_SHUTDOWN_TIMEOUT_SECONDS)
+    if verify_task is not None and not verify_task.done():
+        verify_task.cancel()
+    if catalog_sync_task is not None:
+        catalog_sync_task.cancel()
+    if price_refresh_task is not None:
+        price_refresh_task.cancel()
+    if replica_sync_task is not None:
+        replica_sync_task.cancel()
+    shutdown_process_pool()
+    await pokemon_tcg.aclose()
+    await close_image_client()
+    if get_notion.cache_info().currsize:
+        get_notion().close()
 
 # Initialize FastAPI app with lifespan
 app = FastAPI(title="Pokemon Card Tracker", lifespan=lifespan)
@@ -65,6 +122,9 @@ templates = Jinja2Templates(directory="templates")
 
 # Include routers
 app.include_router(card_router, prefix="/api/cards", tags=["cards"])
+app.include_router(video_router, prefix="/api/videos")
+app.include_router(collection_router, prefix="/api/collection")
+app.include_router(image_router, prefix="/api/images")
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
@@ -81,7 +141,15 @@ async def read_root(request: Request):
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "startup_seconds": getattr(app.state, "startup_seconds", None)
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Request and upstream API metrics in the Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
@@ -93,8 +161,15 @@ async def http_exception_handler(request, exc):
 
 @app.middleware("http")
 async def log_requests(request, call_next):
-    """Log all requests."""
+    """Log all requests and report where their time went."""
     logger.info(f"Request: {request.method} {request.url}")
+    started = time.perf_counter()
+    timings = start_request_timings()
     response = await call_next(request)
+    elapsed = time.perf_counter() - started
+    # Label by route template rather than URL so card ids do not explode the series count
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    observe_request(request.method, route, response.status_code, elapsed)
+    response.headers["Server-Timing"] = timings.server_timing(elapsed)
     logger.info(f"Response: {response.status_code}")
-    return response 
\ No newline at end of file
+    return response
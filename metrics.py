@@ -0,0 +1,147 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from rate_limit import error_status
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Counter:
+    """Monotonic counter keyed by label values."""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Labels, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(labels)} {value:g}")
+        return lines
+
+class Histogram:
+    """Cumulative histogram keyed by label values."""
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        # Label values -> (per-bucket counts with a final +Inf bucket, sum, count)
+        self._series: Dict[Labels, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Labels, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    bucket_labels = format_labels(labels, 'le="%g"' % bound)
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                inf_labels = format_labels(labels, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{inf_labels} {count}")
+                lines.append(f"{self.name}_sum{format_labels(labels)} {total:.6f}")
+                lines.append(f"{self.name}_count{format_labels(labels)} {count}")
+        return lines
+
+UPSTREAM_REQUESTS = Counter("upstream_requests_total", "Calls to the Pokemon TCG and Notion APIs by outcome.")
+UPSTREAM_DURATION = Histogram("upstream_request_duration_seconds", "Latency of calls to the Pokemon TCG and Notion APIs.")
+HTTP_REQUESTS = Counter("http_requests_total", "Requests served by the app.")
+HTTP_DURATION = Histogram("http_request_duration_seconds", "Latency of requests served by the app.")
+
+class RequestTimings:
+    """Time spent in each upstream phase while serving one request."""
+
+    def __init__(self):
+        self.phases: Dict[str, List[float]] = {}  # phase -> [seconds, calls]
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, seconds: float) -> None:
+        # Notion calls run in worker threads, so several may finish at once
+        with self._lock:
+            entry = self.phases.setdefault(phase, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    def server_timing(self, total: float) -> str:
+        """Server-Timing header value with one entry per phase plus the total."""
+        with self._lock:
+            entries = [
+                f'{phase};desc="{calls} calls";dur={seconds * 1000:.1f}'
+                for phase, (seconds, calls) in self.phases.items()
+            ]
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+_request_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+def start_request_timings() -> RequestTimings:
+    """Collect upstream timings for the current request; worker threads share them via the context."""
+    timings = RequestTimings()
+    _request_timings.set(timings)
+    return timings
+
+def classify_error(error: Exception) -> str:
+    """Outcome label for a failed upstream call."""
+    return "rate_limited" if error_status(error) == 429 else "error"
+
+@contextmanager
+def track_upstream(service: str, operation: str) -> Iterator[None]:
+    """Record the count, latency and outcome of one upstream call."""
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except Exception as e:
+        status = classify_error(e)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        labels = (("service", service), ("operation", operation))
+        UPSTREAM_DURATION.observe(labels, elapsed)
+        UPSTREAM_REQUESTS.inc(labels + (("status", status),))
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.add(f"{service}_{operation}", elapsed)
+
+def observe_request(method: str, route: str, status_code: int, seconds: float) -> None:
+    """Record one request served by the app."""
+    HTTP_DURATION.observe((("method", method), ("route", route)), seconds)
+    HTTP_REQUESTS.inc((("method", method), ("route", route), ("status", str(status_code))))
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in (HTTP_REQUESTS, HTTP_DURATION, UPSTREAM_REQUESTS, UPSTREAM_DURATION):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
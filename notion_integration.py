@@ -1,54 +1,178 @@
 from notion_client import Client
+from cache import SharedCache
 from config import get_settings
+from metrics import track_upstream
+from rate_limit import get_upstream
 import logging
-from typing import Dict, Any, Optional
-from datetime import datetime
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+import json
+import os
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+# Notion rounds last_edited_time to the minute, so incremental queries overlap by this much
+LAST_EDITED_OVERLAP = timedelta(minutes=2)
+
+# Incremental reconciles cannot see deleted pages, so the index is rebuilt this often
+CARD_INDEX_FULL_RELOAD_SECONDS = 24 * 3600
+
+# Shared cache namespace of published Card ID index snapshots; the version changes with
+# the snapshot format, so workers running older code never read a newer snapshot or the reverse
+CARD_INDEX_NAMESPACE = "notion_card_index:v3"
+
+def get_rich_text(page: Dict[str, Any], prop_name: str) -> str:
+    """Read the plain text of a rich_text property from a Notion page."""
+    prop = page.get("properties", {}).get(prop_name) or {}
+    return "".join(part.get("plain_text") or part.get("text", {}).get("content", "") for part in prop.get("rich_text", []))
+
+# Properties the collection database must have, by Notion property type
+REQUIRED_PROPERTIES = {
+    "Name": "title",
+    "Set": "rich_text",
+    "Rarity": "rich_text",
+    "Market Price": "number",
+    "Method": "rich_text",
+    "Card Image": "url",
+    "Group ID": "rich_text",
+    "Variant Number": "rich_text",
+    "Created Date": "date",
+    "Card ID": "rich_text",
+    "Repeated": "checkbox",
+    "Quantity": "number",
+    "Last Seen": "date",
+    "Groups": "rich_text"
+}
+
+# Page properties kept in the Card ID index so reports can tell whether a page needs
+# an update without reading it, keyed by the field name used in card data
+INDEXED_PROPERTIES = {
+    "market_price": "Market Price",
+    "quantity": "Quantity",
+    "last_seen": "Last Seen",
+    "group_id": "Group ID",
+    "groups": "Groups"
+}
+
+def get_property(page: Dict[str, Any], prop_name: str) -> Any:
+    """Read the plain value of an indexed property from a Notion page."""
+    prop_type = REQUIRED_PROPERTIES[prop_name]
+    if prop_type == "rich_text":
+        return get_rich_text(page, prop_name)
+    value = (page.get("properties", {}).get(prop_name) or {}).get(prop_type)
+    if prop_type == "date":
+        return (value or {}).get("start")
+    return value
+
+def property_payload(prop_name: str, value: Any) -> Dict[str, Any]:
+    """Notion property value for writing an indexed property."""
+    prop_type = REQUIRED_PROPERTIES[prop_name]
+    if prop_type == "rich_text":
+        return {"rich_text": [{"text": {"content": value or ""}}]}
+    if prop_type == "date":
+        return {"date": {"start": value} if value else None}
+    return {prop_type: value}
+
 def verify_database(database_id: str) -> None:
     """Verify that the Notion database exists and has the correct structure."""
-    integration = NotionIntegration()
-    integration.verify_database()
+    get_notion().verify_database()
+
+@lru_cache()
+def get_notion() -> "NotionIntegration":
+    """Shared NotionIntegration, created on first use."""
+    return NotionIntegration()
 
 class NotionIntegration:
     def __init__(self):
         settings = get_settings()
-        self.client = Client(auth=settings.NOTION_TOKEN)
+        self.client = Client(auth=settings.NOTION_TOKEN, base_url=settings.NOTION_BASE_URL)
         self.database_id = settings.NOTION_DATABASE_ID
-        self.verify_database()
+        self.card_index_reconcile_seconds = settings.NOTION_CARD_INDEX_RECONCILE_SECONDS
+        self.schema_cache_path = settings.NOTION_SCHEMA_CACHE_PATH
+        self.schema_cache_ttl = settings.NOTION_SCHEMA_CACHE_TTL_HOURS * 3600
+        # Lets a worker start from the Card ID index another worker already loaded
+        self.shared_cache = SharedCache(settings.SHARED_CACHE_PATH) if settings.SHARED_CACHE_PATH else None
+        self._verify_lock = threading.Lock()
+        self._verified = False
+
+        # Card ID -> page ids, and page id -> Card ID for pages already in the database
+        self._card_index: Dict[str, List[str]] = {}
+        self._page_card_ids: Dict[str, str] = {}
+        # Page id -> the INDEXED_PROPERTIES values currently stored on the page
+        self._page_fields: Dict[str, Dict[str, Any]] = {}
+        self._card_index_loaded_at: Optional[float] = None
+        self._card_index_reconciled_at: Optional[float] = None
+        self._card_index_watermark: Optional[datetime] = None
+        self._card_index_lock = threading.RLock()
 
-    def verify_database(self) -> None:
-        """Verify that the Notion database exists and has the correct structure."""
+    def _load_schema_cache(self) -> Dict[str, Any]:
+        """Read the verified schemas cached on disk, keyed by database id."""
+        if not self.schema_cache_path or not os.path.exists(self.schema_cache_path):
+            return {}
+        try:
+            with open(self.schema_cache_path) as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable Notion schema cache: {str(e)}")
+            return {}
+
+    def _save_schema_cache(self, properties: Dict[str, str]) -> None:
+        """Record this database's verified schema on disk."""
+        if not self.schema_cache_path:
+            return
+        try:
+            cache = self._load_schema_cache()
+            cache[self.database_id] = {"verified_at": time.time(), "properties": properties}
+            directory = os.path.dirname(self.schema_cache_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.schema_cache_path, "w") as f:
+                json.dump(cache, f)
+        except Exception as e:
+            logger.warning(f"Could not write Notion schema cache: {str(e)}")
+
+    def _schema_is_cached(self) -> bool:
+        """Whether a recent verification of this database already confirmed every property."""
+        entry = self._load_schema_cache().get(self.database_id)
+        if not entry or time.time() - entry.get("verified_at", 0) > self.schema_cache_ttl:
+            return False
+        cached_properties = entry.get("properties", {})
+        return all(cached_properties.get(name) == prop_type for name, prop_type in REQUIRED_PROPERTIES.items())
+
+    def verify_database(self, force: bool = False) -> None:
+        """Verify that the Notion database exists and has the correct structure.
+
+        Runs at most once per process, and is skipped entirely while the schema cached
+        on disk for this database is still fresh.
+        """
+        with self._verify_lock:
+            if self._verified and not force:
+                return
+            if not force and self._schema_is_cached():
+                logger.info("Notion database structure verified from cache")
+                self._verified = True
+                return
+            self._verify_database()
+
+    def _verify_database(self) -> None:
         try:
             # Try to retrieve the database
-            database = self.client.databases.retrieve(self.database_id)
+            database = self._request("retrieve_database", lambda: self.client.databases.retrieve(self.database_id))
             logger.info(f"Successfully connected to Notion database: {database['title'][0]['text']['content']}")
             
-            # Check required properties
-            required_properties = {
-                "Name": "title",
-                "Set": "rich_text",
-                "Rarity": "rich_text",
-                "Market Price": "number",
-                "Method": "rich_text",
-                "Card Image": "url",
-                "Group ID": "rich_text",
-                "Variant Number": "rich_text",
-                "Created Date": "date",
-                "Card ID": "rich_text",
-                "Repeated": "checkbox"
-            }
-            
             # Get actual properties
             actual_properties = database["properties"]
+            verified_properties = {name: prop["type"] for name, prop in actual_properties.items()}
             
             # Check each required property and create if missing
-            for prop_name, prop_type in required_properties.items():
+            for prop_name, prop_type in REQUIRED_PROPERTIES.items():
                 if prop_name not in actual_properties:
                     logger.info(f"Creating missing property: {prop_name}")
                     try:
-                        self.client.databases.update(
+                        self._request("update_database", lambda: self.client.databases.update(
                             database_id=self.database_id,
                             properties={
                                 prop_name: {
@@ -56,13 +180,16 @@ class NotionIntegration:
                                     prop_type: {}  # Empty configuration for the property type
                                 }
                             }
-                        )
+                        ))
+                        verified_properties[prop_name] = prop_type
                         logger.info(f"Successfully created property: {prop_name}")
                     except Exception as e:
                         logger.error(f"Failed to create property {prop_name}: {str(e)}")
                 elif actual_properties[prop_name]["type"] != prop_type:
                     logger.warning(f"Property {prop_name} has incorrect type. Expected {prop_type}, got {actual_properties[prop_name]['type']}")
             
+            self._save_schema_cache(verified_properties)
+            self._verified = True
             logger.info("Database structure verification completed")
             
         except Exception as e:
@@ -70,11 +197,168 @@ class NotionIntegration:
             logger.error(f"Database ID: {self.database_id}")
             logger.error(f"Exception type: {type(e)}")
 
+    def close(self) -> None:
+        """Close the shared cache connection."""
+        if self.shared_cache is not None:
+            self.shared_cache.close()
+
+    def _request(self, operation: str, fn: Callable[[], Any], idempotent: bool = True) -> Any:
+        """Send one Notion API call through the shared rate limit, retry and circuit breaker layer."""
+        def attempt() -> Any:
+            with track_upstream("notion", operation):
+                return fn()
+
+        return get_upstream("notion").call_sync(attempt, idempotent=idempotent)
+
+    def query_all(self, filter: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """Iterate over every page of the database matching the filter, following pagination."""
+        query: Dict[str, Any] = {"database_id": self.database_id, "page_size": 100}
+        if filter:
+            query["filter"] = filter
+        while True:
+            response = self._request("query", lambda: self.client.databases.query(**query))
+            yield from response["results"]
+            if not response.get("has_more"):
+                break
+            query["start_cursor"] = response["next_cursor"]
+
+    def _index_page(self, page: Dict[str, Any]) -> None:
+        """Add or move a page in the Card ID index. Caller holds the lock."""
+        page_id = page["id"]
+        self._page_fields.pop(page_id, None)
+        old_card_id = self._page_card_ids.pop(page_id, None)
+        if old_card_id is not None:
+            page_ids = self._card_index.get(old_card_id, [])
+            if page_id in page_ids:
+                page_ids.remove(page_id)
+            if not page_ids:
+                self._card_index.pop(old_card_id, None)
+
+        card_id = get_rich_text(page, "Card ID")
+        if card_id and not page.get("archived"):
+            self._card_index.setdefault(card_id, []).append(page_id)
+            self._page_card_ids[page_id] = card_id
+            self._page_fields[page_id] = {field: get_property(page, prop_name) for field, prop_name in INDEXED_PROPERTIES.items()}
+
+    def load_card_index(self) -> None:
+        """Load every Card ID in the database with paginated queries."""
+        with self._card_index_lock:
+            started = datetime.now(timezone.utc)
+            self._card_index = {}
+            self._page_card_ids = {}
+            self._page_fields = {}
+            for page in self.query_all():
+                self._index_page(page)
+            self._card_index_watermark = started
+            self._card_index_loaded_at = self._card_index_reconciled_at = time.monotonic()
+            logger.info(f"Loaded Card ID index with {len(self._card_index)} cards")
+            self._share_card_index()
+
+    def _share_card_index(self) -> None:
+        """Publish the Card ID index for the other workers. Caller holds the lock."""
+        if self.shared_cache is None:
+            return
+        snapshot = {
+            "watermark": self._card_index_watermark.isoformat(),
+            "loaded_age": time.monotonic() - self._card_index_loaded_at,
+            "pages": [[page_id, card_id, self._page_fields.get(page_id, {})] for page_id, card_id in self._page_card_ids.items()]
+        }
+        self.shared_cache.set_many(CARD_INDEX_NAMESPACE, [(self.database_id, snapshot)], CARD_INDEX_FULL_RELOAD_SECONDS)
+
+    def _load_shared_card_index(self) -> bool:
+        """Adopt a Card ID index another worker published, if it is not due for a rebuild. Caller holds the lock."""
+        if self.shared_cache is None:
+            return False
+        found = self.shared_cache.get(CARD_INDEX_NAMESPACE, self.database_id)
+        if found is None:
+            return False
+        age, snapshot = found
+        loaded_age = snapshot["loaded_age"] + age
+        if loaded_age > CARD_INDEX_FULL_RELOAD_SECONDS:
+            return False
+
+        self._card_index = {}
+        self._page_card_ids = {}
+        self._page_fields = {}
+        for page_id, card_id, fields in snapshot["pages"]:
+            self._card_index.setdefault(card_id, []).append(page_id)
+            self._page_card_ids[page_id] = card_id
+            self._page_fields[page_id] = fields
+        now = time.monotonic()
+        self._card_index_watermark = datetime.fromisoformat(snapshot["watermark"])
+        self._card_index_loaded_at = now - loaded_age
+        self._card_index_reconciled_at = now - age
+        logger.info(f"Loaded Card ID index with {len(self._card_index)} cards from the shared cache")
+        return True
+
+    def reconcile_card_index(self) -> None:
+        """Pick up pages created or edited outside this process since the last load or reconcile."""
+        with self._card_index_lock:
+            started = datetime.now(timezone.utc)
+            since = self._card_index_watermark - LAST_EDITED_OVERLAP
+            updated = 0
+            for page in self.query_all({
+                "timestamp": "last_edited_time",
+                "last_edited_time": {"on_or_after": since.isoformat()}
+            }):
+                self._index_page(page)
+                updated += 1
+            self._card_index_watermark = started
+            self._card_index_reconciled_at = time.monotonic()
+            logger.debug(f"Reconciled Card ID index with {updated} edited pages")
+            if updated:
+                self._share_card_index()
+
+    def ensure_card_index(self) -> None:
+        """Load the Card ID index on first use, then reconcile or rebuild it when due."""
+        with self._card_index_lock:
+            if self._card_index_loaded_at is None:
+                self._load_shared_card_index()
+            now = time.monotonic()
+            if self._card_index_loaded_at is None or now - self._card_index_loaded_at > CARD_INDEX_FULL_RELOAD_SECONDS:
+                self.load_card_index()
+            elif now - self._card_index_reconciled_at > self.card_index_reconcile_seconds:
+                self.reconcile_card_index()
+
+    def get_card_pages(self) -> List[Tuple[str, str, Optional[float]]]:
+        """Every indexed page as (page_id, card_id, market_price), from a current index."""
+        with self._card_index_lock:
+            self.ensure_card_index()
+            return [
+                (page_id, card_id, self._page_fields.get(page_id, {}).get("market_price"))
+                for page_id, card_id in self._page_card_ids.items()
+            ]
+
+    def get_holdings(self) -> Dict[str, int]:
+        """Copies held of every card: the summed "Quantity" of its pages, counting pages without one as 1."""
+        with self._card_index_lock:
+            self.ensure_card_index()
+            holdings: Dict[str, int] = {}
+            for page_id, card_id in self._page_card_ids.items():
+                quantity = self._page_fields.get(page_id, {}).get("quantity")
+                holdings[card_id] = holdings.get(card_id, 0) + int(quantity or 1)
+            return holdings
+
+    def get_card_page(self, card_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """The oldest indexed page of a card as (page_id, indexed fields), or None if the card has no page."""
+        with self._card_index_lock:
+            self.ensure_card_index()
+            page_ids = self._card_index.get(card_id)
+            if not page_ids:
+                return None
+            return page_ids[0], dict(self._page_fields.get(page_ids[0], {}))
+
     def check_existing_card(self, card_id: str) -> bool:
         """Check if a card with the given ID already exists in the database."""
+        try:
+            self.ensure_card_index()
+            return card_id in self._card_index
+        except Exception as e:
+            logger.error(f"Error loading Card ID index: {str(e)}")
+
         try:
             # Query the database for the card ID
-            response = self.client.databases.query(
+            response = self._request("query", lambda: self.client.databases.query(
                 database_id=self.database_id,
                 filter={
                     "property": "Card ID",
@@ -82,26 +366,32 @@ class NotionIntegration:
                         "equals": card_id
                     }
                 }
-            )
-            
+            ))
+
             # If we found any results, the card exists
             return len(response["results"]) > 0
-            
+
         except Exception as e:
             logger.error(f"Error checking for existing card: {str(e)}")
             return False
 
-    def create_card_report(self, card_data: Dict[str, Any], method: str = "Manual", group_id: Optional[str] = None) -> Optional[str]:
-        """Create a card report in Notion."""
+    def create_card_report(self, card_data: Dict[str, Any], method: str = "Manual", group_id: Optional[str] = None, raise_errors: bool = False) -> Optional[str]:
+        """Create a card report in Notion.
+
+        Errors are logged and reported as None unless `raise_errors` is set, which lets
+        callers such as the batch writer react to rate limiting.
+        """
         try:
             logger.debug(f"Creating Notion report with data: {card_data}")
             logger.debug(f"Using database ID: {self.database_id}")
             
             # Get current date in ISO format
-            current_date = datetime.now().isoformat()
+            now = datetime.now()
+            current_date = now.isoformat()
+            last_seen = now.date().isoformat()
             
             # Create the page
-            new_page = self.client.pages.create(
+            new_page = self._request("create_page", lambda: self.client.pages.create(
                 parent={"database_id": self.database_id},
                 properties={
                     "Name": {"title": [{"text": {"content": card_data["name"]}}]},
@@ -114,11 +404,27 @@ class NotionIntegration:
                     "Variant Number": {"rich_text": [{"text": {"content": card_data["variant_number"]}}]},
                     "Created Date": {"date": {"start": current_date}},
                     "Card ID": {"rich_text": [{"text": {"content": card_data["card_id"]}}]},
-                    "Repeated": {"checkbox": card_data.get("repeated", False)}
+                    "Repeated": {"checkbox": card_data.get("repeated", False)},
+                    "Quantity": {"number": 1},
+                    "Last Seen": {"date": {"start": last_seen}},
+                    "Groups": {"rich_text": [{"text": {"content": group_id or ""}}]}
                 }
-            )
-            
+            ), idempotent=False)
+
             logger.info(f"Success! Card report created with page ID: {new_page['id']}")
+
+            # Keep the Card ID index current without waiting for the next reconcile
+            with self._card_index_lock:
+                if self._card_index_loaded_at is not None:
+                    self._card_index.setdefault(card_data["card_id"], []).append(new_page["id"])
+                    self._page_card_ids[new_page["id"]] = card_data["card_id"]
+                    self._page_fields[new_page["id"]] = {
+                        "market_price": card_data["market_price"],
+                        "quantity": 1,
+                        "last_seen": last_seen,
+                        "group_id": group_id or "",
+                        "groups": group_id or ""
+                    }
             return new_page["id"]
             
         except Exception as e:
@@ -126,4 +432,28 @@ class NotionIntegration:
             logger.error(f"Card data: {card_data}")
             logger.error(f"Database ID: {self.database_id}")
             logger.error(f"Exception type: {type(e)}")
-            return None 
\ No newline at end of file
+            if raise_errors:
+                raise
+            return None 
+
+    def update_market_price(self, page_id: str, market_price: float, raise_errors: bool = False) -> bool:
+        """Set the "Market Price" of an existing card page."""
+        return self.update_card_page(page_id, {"market_price": market_price}, raise_errors=raise_errors)
+
+    def update_card_page(self, page_id: str, fields: Dict[str, Any], raise_errors: bool = False) -> bool:
+        """Write INDEXED_PROPERTIES fields of an existing card page in one request, keeping the index current."""
+        try:
+            self._request("update_page", lambda: self.client.pages.update(
+                page_id=page_id,
+                properties={INDEXED_PROPERTIES[field]: property_payload(INDEXED_PROPERTIES[field], value) for field, value in fields.items()}
+            ))
+            with self._card_index_lock:
+                if page_id in self._page_card_ids:
+                    self._page_fields.setdefault(page_id, {}).update(fields)
+            return True
+
+        except Exception as e:
+            logger.error(f"Error updating page {page_id}: {str(e)}")
+            if raise_errors:
+                raise
+            return False
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from config import get_settings
+from notion_integration import get_notion
+
+logger = logging.getLogger(__name__)
+
+# Separator of the groups listed in a page's "Groups" property
+GROUP_SEPARATOR = ", "
+
+def page_groups(fields: Dict[str, Any]) -> List[str]:
+    """Groups a card page has been counted under; older pages only know their "Group ID"."""
+    groups = fields.get("groups") or fields.get("group_id") or ""
+    return [group.strip() for group in groups.split(",") if group.strip()]
+
+def upsert_changes(fields: Dict[str, Any], group_id: Optional[str], today: str) -> Dict[str, Any]:
+    """Fields of an existing card page a report needs to change, empty when the page is current.
+
+    A card counts one more copy the first time it shows up under a group it was not
+    counted under before, so rerunning any earlier report changes nothing beyond
+    "Last Seen", and that only once a day.
+    """
+    changes = {}
+    if fields.get("last_seen") != today:
+        changes["last_seen"] = today
+    if fields.get("quantity") is None:
+        changes["quantity"] = 1
+    groups = page_groups(fields)
+    if group_id and group_id not in groups:
+        changes["group_id"] = group_id
+        changes["groups"] = GROUP_SEPARATOR.join(groups + [group_id])
+        changes["quantity"] = int(fields.get("quantity") or 1) + 1
+    return changes
+
+class NotionBatchWriter:
+    """Create Notion pages concurrently while staying under Notion's request rate.
+
+    Throttling and retries happen in the shared Notion call layer (`rate_limit.get_upstream`),
+    so the writer only bounds how many writes are in flight.
+    """
+
+    def __init__(self, notion=None):
+        settings = get_settings()
+        self._notion = notion
+        self.concurrency = settings.NOTION_WRITE_CONCURRENCY
+
+    @property
+    def notion(self):
+        """The NotionIntegration pages are written through, the shared one unless given."""
+        return self._notion or get_notion()
+
+    async def _call(self, semaphore: asyncio.Semaphore, card_id: str, write: Callable[[], Any]) -> Dict[str, Any]:
+        """Run one Notion write in a worker thread and return its per-card result."""
+        result = {"card_id": card_id, "success": False, "page_id": None, "error": None}
+        async with semaphore:
+            try:
+                page_id = await asyncio.to_thread(write)
+            except Exception as e:
+                logger.error(f"Error writing card {card_id} to Notion: {str(e)}")
+                result["error"] = str(e)
+                return result
+
+        if page_id:
+            result.update(success=True, page_id=page_id)
+        else:
+            result["error"] = "Notion did not return a page id"
+        return result
+
+    async def _write_card(self, semaphore: asyncio.Semaphore, card_data: Dict[str, Any], method: str, group_id: Optional[str]) -> Dict[str, Any]:
+        """Create one page and return its per-card result."""
+        return await self._call(
+            semaphore,
+            card_data.get("card_id", ""),
+            lambda: self.notion.create_card_report(card_data, method=method, group_id=group_id, raise_errors=True)
+        )
+
+    async def _update_price(self, semaphore: asyncio.Semaphore, update: Dict[str, Any]) -> Dict[str, Any]:
+        """Update one page's market price and return its per-card result."""
+        def write() -> Optional[str]:
+            self.notion.update_market_price(update["page_id"], update["market_price"], raise_errors=True)
+            return update["page_id"]
+
+        return await self._call(semaphore, update.get("card_id", ""), write)
+
+    async def _update_page(self, semaphore: asyncio.Semaphore, update: Dict[str, Any]) -> Dict[str, Any]:
+        """Write the changed fields of one page and return its per-card result."""
+        def write() -> Optional[str]:
+            self.notion.update_card_page(update["page_id"], update["fields"], raise_errors=True)
+            return update["page_id"]
+
+        return await self._call(semaphore, update.get("card_id", ""), write)
+
+    async def write_cards(
+        self,
+        cards: List[Dict[str, Any]],
+        method: str = "Manual",
+        group_id: Optional[str] = None,
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> List[Dict[str, Any]]:
+        """Create a page for every card and return the per-card results in input order.
+
+        `on_result` is called as each card finishes, e.g. to report job progress.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def write(card_data: Dict[str, Any]) -> Dict[str, Any]:
+            result = await self._write_card(semaphore, card_data, method, group_id)
+            if on_result is not None:
+                on_result(result)
+            return result
+
+        return await asyncio.gather(*(write(card_data) for card_data in cards))
+
+    async def update_prices(
+        self,
+        updates: List[Dict[str, Any]],
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> List[Dict[str, Any]]:
+        """Set the market price of existing pages, given as dicts with page_id, card_id and market_price."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def write(update: Dict[str, Any]) -> Dict[str, Any]:
+            result = await self._update_price(semaphore, update)
+            if on_result is not None:
+                on_result(result)
+            return result
+
+        return await asyncio.gather(*(write(update) for update in updates))
+
+    async def update_pages(
+        self,
+        updates: List[Dict[str, Any]],
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> List[Dict[str, Any]]:
+        """Update existing pages, given as dicts with page_id, card_id and the changed fields."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def write(update: Dict[str, Any]) -> Dict[str, Any]:
+            result = await self._update_page(semaphore, update)
+            if on_result is not None:
+                on_result(result)
+            return result
+
+        return await asyncio.gather(*(write(update) for update in updates))
+
+    async def upsert_cards(
+        self,
+        cards: List[Dict[str, Any]],
+        method: str = "Manual",
+        group_id: Optional[str] = None,
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> List[Dict[str, Any]]:
+        """Create pages for new cards and update the changed fields of existing ones.
+
+        Results come back in input order with an `action` of created, updated or unchanged;
+        unchanged cards cost no Notion request.
+        """
+        today = datetime.now().date().isoformat()
+        existing = await asyncio.to_thread(lambda: [self.notion.get_card_page(card_data["card_id"]) for card_data in cards])
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def write(card_data: Dict[str, Any], page: Optional[tuple]) -> Dict[str, Any]:
+            if page is None:
+                result = await self._write_card(semaphore, card_data, method, group_id)
+                action = "created"
+            else:
+                page_id, fields = page
+                changes = upsert_changes(fields, group_id, today)
+                if changes:
+                    result = await self._update_page(semaphore, {"page_id": page_id, "card_id": card_data["card_id"], "fields": changes})
+                    action = "updated"
+                else:
+                    result = {"card_id": card_data["card_id"], "success": True, "page_id": page_id, "error": None}
+                    action = "unchanged"
+            if result["success"]:
+                result["action"] = action
+            if on_result is not None:
+                on_result(result)
+            return result
+
+        return await asyncio.gather(*(write(card_data, page) for card_data, page in zip(cards, existing)))
@@ -1,19 +1,339 @@
-import requests
+import asyncio
+import httpx
 from config import get_settings
+from catalog import CardCatalog
+from price_history import get_price_history
+from cache import SharedCache, TTLCache, MISS, STALE
+from singleflight import SingleFlight
+from metrics import track_upstream
+from rate_limit import get_upstream
 import logging
-from typing import List, Optional, Dict, Any
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of card ids combined into a single `id:` OR-query
+PRICE_LOOKUP_BATCH_SIZE = 50
+
+# Largest (and default) page size the Pokemon TCG API accepts
+MAX_PAGE_SIZE = 250
+
+def extract_market_price(card: Dict[str, Any]) -> Optional[float]:
+    """Read the market price from a raw card payload, or None if it has no price data."""
+    prices = (card.get("cardmarket") or {}).get("prices") or {}
+    if not prices:
+        return None
+
+    # Try to get the average price, fall back to trending price
+    price = prices.get("averageSellPrice", prices.get("trendPrice"))
+    if price is None:
+        return None
+    return float(price)
+
+def normalize_query(text: str) -> str:
+    """Normalize a search term so equivalent queries share a cache key."""
+    return " ".join(text.lower().split())
+
+def process_card(card: Dict[str, Any], market_price: float) -> Dict[str, Any]:
+    """Transform a raw Pokemon TCG API card into the shape used throughout the app."""
+    return {
+        "id": card["id"],
+        "name": card["name"],
+        "set": {
+            "name": card["set"]["name"],
+            "id": card["set"]["id"]
+        },
+        "rarity": card.get("rarity", "Unknown"),
+        "number": card.get("number", ""),
+        "market_price": market_price,
+        "images": card.get("images", {
+            "small": "https://example.com/placeholder.jpg",
+            "large": "https://example.com/placeholder.jpg"
+        })
+    }
+
 class PokemonTCGAPI:
     def __init__(self):
         settings = get_settings()
         self.api_key = settings.POKEMON_TCG_API_KEY
-        self.base_url = "https://api.pokemontcg.io/v2"
+        self.base_url = settings.POKEMON_TCG_BASE_URL
         self.headers = {"X-Api-Key": self.api_key} if self.api_key else {}
+        self.limits = httpx.Limits(
+            max_connections=settings.POKEMON_TCG_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.POKEMON_TCG_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.POKEMON_TCG_KEEPALIVE_EXPIRY
+        )
+        self.timeout = httpx.Timeout(
+            settings.POKEMON_TCG_TIMEOUT,
+            connect=settings.POKEMON_TCG_CONNECT_TIMEOUT
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.catalog = CardCatalog(settings.CATALOG_PATH) if settings.CATALOG_PATH else None
+        self.catalog_max_age = settings.CATALOG_MAX_AGE_HOURS * 3600
+        # Prices fetched live are added to the price history used to value the collection
+        self.price_history = get_price_history() if settings.PRICE_HISTORY_PATH else None
+        # Worker processes on the same host share search results and prices through SQLite
+        self.shared_cache = SharedCache(settings.SHARED_CACHE_PATH) if settings.SHARED_CACHE_PATH else None
+        self.search_cache = TTLCache(
+            settings.CACHE_MAX_ENTRIES,
+            ttl=settings.CARD_CACHE_TTL_SECONDS,
+            stale_ttl=settings.CACHE_STALE_TTL_SECONDS,
+            shared=self.shared_cache,
+            namespace="search"
+        )
+        self.price_cache = TTLCache(
+            settings.CACHE_MAX_ENTRIES,
+            ttl=settings.PRICE_CACHE_TTL_SECONDS,
+            stale_ttl=settings.CACHE_STALE_TTL_SECONDS,
+            shared=self.shared_cache,
+            namespace="prices"
+        )
+        # Concurrent cache misses for the same search, card or price share one upstream request
+        self.search_flights = SingleFlight()
+        self.price_flights = SingleFlight()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared keep-alive client, created on first use in the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            # Pooled connections are bound to the loop that opened them
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                limits=self.limits,
+                timeout=self.timeout
+            )
+            self._client_loop = loop
+        return self._client
+
+    async def aclose(self) -> None:
+        """Close the pooled connections and the shared cache."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+        self._client_loop = None
+        if self.shared_cache is not None:
+            await self.search_cache.flush()
+            await self.price_cache.flush()
+            self.shared_cache.close()
+
+    async def _get(self, path: str, params: Optional[Dict[str, Any]] = None, operation: str = "request") -> Dict[str, Any]:
+        """Send a GET request through the shared client and return the decoded body.
+
+        Requests go through the shared rate limit, retry and circuit breaker layer; errors
+        left after retrying are raised so callers never mistake an outage for missing data.
+        """
+        async def attempt() -> Dict[str, Any]:
+            with track_upstream("tcg", operation):
+                response = await self.client.get(path, params=params)
+                response.raise_for_status()
+                return response.json()
 
-    def search_card(self, name: str, set_id: str = None) -> List[Dict[str, Any]]:
+        return await get_upstream("tcg").call(attempt)
+
+    async def _get_all(self, path: str, params: Optional[Dict[str, Any]] = None, operation: str = "request") -> List[Dict[str, Any]]:
+        """Fetch every page of a listing, requesting the remaining pages concurrently."""
+        params = dict(params or {}, pageSize=MAX_PAGE_SIZE)
+        first = await self._get(path, params=dict(params, page=1), operation=operation)
+        results = list(first.get("data", []))
+
+        total_pages = -(-first.get("totalCount", len(results)) // MAX_PAGE_SIZE)
+        pages = await asyncio.gather(*(
+            self._get(path, params=dict(params, page=page), operation=operation)
+            for page in range(2, total_pages + 1)
+        ))
+        for data in pages:
+            results.extend(data.get("data", []))
+        return results
+
+    def _record_prices(self, prices: Dict[str, float]) -> None:
+        """Add live prices to the price history, skipping unpriced cards."""
+        if self.price_history is None:
+            return
+        try:
+            self.price_history.record({card_id: price for card_id, price in prices.items() if price})
+        except Exception as e:
+            logger.error(f"Error recording price history: {str(e)}")
+
+    async def get_sets(self) -> List[Dict[str, Any]]:
+        """Get every set in the Pokemon TCG catalog."""
+        return await self._get_all("/sets", operation="sets")
+
+    async def get_set_cards(self, set_id: str) -> List[Dict[str, Any]]:
+        """Get every card of a set, transformed like search results."""
+        cards = await self._get_all("/cards", params={"q": f'set.id:"{set_id}"'}, operation="set_cards")
+        return [process_card(card, extract_market_price(card) or 0.0) for card in cards]
+
+    async def get_set_market_prices(self, set_id: str) -> Dict[str, float]:
+        """Current market price of every priced card in a set, fetched with one paginated query."""
+        cards = await self._get_all("/cards", params={"q": f'set.id:"{set_id}"', "select": "id,cardmarket"}, operation="set_prices")
+        prices = {}
+        for card in cards:
+            price = extract_market_price(card)
+            if price is not None:
+                prices[card["id"]] = price
+        self.price_cache.set_many(list(prices.items()))
+        self._record_prices(prices)
+        return prices
+
+    async def search_card(self, name: str, set_id: str = None, page: int = 1, page_size: int = MAX_PAGE_SIZE) -> List[Dict[str, Any]]:
         """Search for a card by name and optionally set ID."""
+        cards, _ = await self.search_card_page(name, set_id, page, page_size)
+        return cards
+
+    async def search_card_page(self, name: str, set_id: str = None, page: int = 1, page_size: int = MAX_PAGE_SIZE) -> Tuple[List[Dict[str, Any]], int]:
+        """Get one page of search results along with the total number of matches."""
+        key = (normalize_query(name), normalize_query(set_id or ""), page, page_size)
+        result = await self.search_cache.get_or_load(
+            key, lambda: self.search_flights.do(key, lambda: self._search_uncached(name, set_id, page, page_size))
+        )
+        if not result:
+            return [], 0
+
+        # Card metadata and prices are cached separately so prices can expire sooner
+        cards = result["cards"]
+        prices = await self.get_card_market_prices([card["id"] for card in cards])
+        return [dict(card, market_price=prices[card["id"]]) for card in cards], result["total_count"]
+
+    async def get_card(self, card_id: str, include_price: bool = True) -> Optional[Dict[str, Any]]:
+        """Get a single card by its exact id, from the catalog when it is fresh.
+
+        Without `include_price` the card's cached metadata is returned as is, skipping the price lookup.
+        """
+        key = ("card", card_id)
+        result = await self.search_cache.get_or_load(key, lambda: self.search_flights.do(key, lambda: self._get_card_uncached(card_id)))
+        if not result:
+            return None
+        if not include_price:
+            return result
+        price = (await self.get_card_market_prices([card_id]))[card_id]
+        return dict(result, market_price=price)
+
+    async def _get_card_uncached(self, card_id: str) -> Optional[Dict[str, Any]]:
+        card = None
+        if self.catalog is not None and self.catalog.is_synced():
+            try:
+                card = self.catalog.get_card(card_id, max_age=self.catalog_max_age)
+            except Exception as e:
+                logger.error(f"Error reading local catalog: {str(e)}")
+
+        if card is None:
+            try:
+                data = await self._get(f"/cards/{card_id}", operation="card")
+            except Exception as e:
+                if isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 404:
+                    return None
+                logger.error(f"Error getting card {card_id}: {str(e)}")
+                raise
+            card = process_card(data["data"], extract_market_price(data["data"]))
+            self._record_prices({card_id: card["market_price"]})
+            if card.get("market_price") is not None:
+                self.price_cache.set(card_id, card["market_price"])
+        return card
+
+    async def get_cards(self, card_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get several cards by id, using the cache and catalog first and one batched query per 50 misses."""
+        cards = {}
+        missing = []
+        cached = await self.search_cache.lookup_many([("card", card_id) for card_id in dict.fromkeys(card_ids)])
+        for (_, card_id), (status, card) in cached.items():
+            if status == MISS and self.catalog is not None and self.catalog.is_synced():
+                card = self.catalog.get_card(card_id, max_age=self.catalog_max_age)
+            if card:
+                cards[card_id] = card
+            else:
+                missing.append(card_id)
+
+        batches = [
+            missing[start:start + PRICE_LOOKUP_BATCH_SIZE]
+            for start in range(0, len(missing), PRICE_LOOKUP_BATCH_SIZE)
+        ]
+        async def fetch_batch(keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Dict[str, Any]]:
+            batch_cards = await self._get_card_batch([card_id for _, card_id in keys])
+            return {("card", card_id): card for card_id, card in batch_cards.items()}
+
+        fetched = {}
+        for batch_cards in await asyncio.gather(*(
+            self.search_flights.do_many([("card", card_id) for card_id in batch], fetch_batch)
+            for batch in batches
+        )):
+            fetched.update({card_id: card for (_, card_id), card in batch_cards.items()})
+        cards.update(fetched)
+
+        self.search_cache.set_many([(("card", card_id), card) for card_id, card in cards.items()])
+        # Only live prices are cached; cached and catalog cards get theirs from the price lookup
+        self.price_cache.set_many([
+            (card_id, card["market_price"]) for card_id, card in fetched.items() if card.get("market_price") is not None
+        ])
+
+        prices = await self.get_card_market_prices(list(cards))
+        return {card_id: dict(card, market_price=prices[card_id]) for card_id, card in cards.items()}
+
+    async def _get_card_batch(self, card_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch one batch of cards with a single `id:` OR-query."""
+        try:
+            query = " OR ".join(f'id:"{card_id}"' for card_id in card_ids)
+            data = await self._get("/cards", params={"q": query, "pageSize": len(card_ids)}, operation="cards")
+            cards = {card["id"]: process_card(card, extract_market_price(card)) for card in data.get("data", [])}
+            self._record_prices({card_id: card["market_price"] for card_id, card in cards.items()})
+            return cards
+
+        except Exception as e:
+            logger.error(f"Error getting cards: {str(e)}")
+            raise
+
+    async def iter_search_pages(self, name: str, set_id: str = None, page_size: int = MAX_PAGE_SIZE) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield every page of search results, prefetching the next page while the caller works."""
+        page = 1
+        pending = asyncio.ensure_future(self.search_card_page(name, set_id, page, page_size))
+        try:
+            while pending is not None:
+                cards, total_count = await pending
+                pending = None
+                if cards and page * page_size < total_count:
+                    pending = asyncio.ensure_future(self.search_card_page(name, set_id, page + 1, page_size))
+                if cards:
+                    yield cards
+                page += 1
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+    async def _search_uncached(self, name: str, set_id: str, page: int, page_size: int) -> Dict[str, Any]:
+        """Search the local catalog, falling back to the live API for misses or stale records."""
+        use_catalog = self.catalog is not None and self.catalog.is_synced()
+        matches = []
+        if use_catalog:
+            try:
+                matches = self.catalog.search(name, set_id, max_age=self.catalog_max_age)
+            except Exception as e:
+                logger.error(f"Error searching local catalog: {str(e)}")
+
+        if matches:
+            cards = matches[(page - 1) * page_size:page * page_size]
+            total_count = len(matches)
+        else:
+            cards, total_count = await self._search_live(name, set_id, page, page_size)
+            if cards and use_catalog:
+                try:
+                    # Refresh the stale or missing records in the mirror
+                    self.catalog.upsert_cards(cards)
+                except Exception as e:
+                    logger.error(f"Error updating local catalog: {str(e)}")
+            # Seed the price cache with the live prices that came with the cards; catalog
+            # prices date from the last sync of the set, so those are looked up live instead
+            self.price_cache.set_many([
+                (card["id"], card["market_price"]) for card in cards if card.get("market_price") is not None
+            ])
+
+        if not cards:
+            return {}
+        return {"cards": cards, "total_count": total_count}
+
+    async def _search_live(self, name: str, set_id: str, page: int, page_size: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Search for a card through the Pokemon TCG API."""
         try:
             # Build query
             query = f'name:"{name}"'
@@ -21,64 +341,101 @@ class PokemonTCGAPI:
                 query += f' set.id:"{set_id}"'
 
             # Make API request
-            response = requests.get(
-                f"{self.base_url}/cards",
-                headers=self.headers,
-                params={"q": query}
-            )
-            response.raise_for_status()
-
-            # Process response
-            data = response.json()
+            data = await self._get("/cards", params={"q": query, "page": page, "pageSize": page_size}, operation="search")
             cards = data.get("data", [])
-            
+
             if not cards:
-                logger.warning(f"No cards found for query: {query}")
-                return []
-
-            # Transform card data
-            processed_cards = []
-            for card in cards:
-                processed_card = {
-                    "id": card["id"],
-                    "name": card["name"],
-                    "set": {
-                        "name": card["set"]["name"],
-                        "id": card["set"]["id"]
-                    },
-                    "rarity": card.get("rarity", "Unknown"),
-                    "number": card.get("number", ""),
-                    "market_price": self.get_card_market_price(card["id"]),
-                    "images": card.get("images", {
-                        "small": "https://example.com/placeholder.jpg",
-                        "large": "https://example.com/placeholder.jpg"
-                    })
-                }
-                processed_cards.append(processed_card)
-
-            return processed_cards
+                logger.warning(f"No cards found for query: {query} (page {page})")
+                return [], 0
+
+            # Transform card data; cards without price data are resolved by a batched lookup
+            cards = [process_card(card, extract_market_price(card)) for card in cards]
+            self._record_prices({card["id"]: card["market_price"] for card in cards})
+            return cards, data.get("totalCount", len(cards))
 
         except Exception as e:
             logger.error(f"Error searching for card: {str(e)}")
-            return []
+            raise
 
-    def get_card_market_price(self, card_id: str) -> float:
-        """Get the market price for a card."""
+    async def _get_price_batch(self, card_ids: List[str]) -> Dict[str, float]:
+        """Look up prices for one batch of card ids with a single `id:` OR-query."""
         try:
-            response = requests.get(
-                f"{self.base_url}/cards/{card_id}",
-                headers=self.headers
+            query = " OR ".join(f'id:"{card_id}"' for card_id in card_ids)
+            data = await self._get(
+                "/cards",
+                params={"q": query, "select": "id,cardmarket", "pageSize": len(card_ids)},
+                operation="prices"
             )
-            response.raise_for_status()
-            
-            data = response.json()
+            return {card["id"]: extract_market_price(card) or 0.0 for card in data.get("data", [])}
+
+        except Exception as e:
+            # Raise rather than report the batch as unpriced, which would read as $0
+            logger.error(f"Error getting card prices: {str(e)}")
+            raise
+
+    async def _fetch_prices(self, card_ids: List[str]) -> Dict[str, float]:
+        """Fetch prices from the API, fanning the batches out concurrently, and cache them."""
+        batches = [
+            card_ids[start:start + PRICE_LOOKUP_BATCH_SIZE]
+            for start in range(0, len(card_ids), PRICE_LOOKUP_BATCH_SIZE)
+        ]
+        prices = {}
+        for batch_prices in await asyncio.gather(*(self._get_price_batch(batch) for batch in batches)):
+            prices.update(batch_prices)
+
+        self.price_cache.set_many(list(prices.items()))
+        self._record_prices(prices)
+        return prices
+
+    async def get_card_market_prices(self, card_ids: List[str]) -> Dict[str, float]:
+        """Get market prices for several cards, only looking up the ones not cached."""
+        prices = {}
+        missing = []
+        stale = []
+        for card_id, (status, price) in (await self.price_cache.lookup_many(list(dict.fromkeys(card_ids)))).items():
+            if status == MISS:
+                missing.append(card_id)
+                continue
+            prices[card_id] = price
+            if status == STALE:
+                stale.append(card_id)
+
+        if stale:
+            self.price_cache.refresh_many_in_background(stale, self._fetch_prices_once)
+        if missing:
+            prices.update(await self._fetch_prices_once(missing))
+
+        # Cards the batch lookup did not return have no price data
+        for card_id in card_ids:
+            prices.setdefault(card_id, 0.0)
+        return prices
+
+    async def _fetch_prices_once(self, card_ids: List[str]) -> Dict[str, float]:
+        """Fetch prices, joining lookups already in flight for any of the cards."""
+        return await self.price_flights.do_many(card_ids, self._fetch_prices)
+
+    async def get_card_market_price(self, card_id: str) -> float:
+        """Get the market price for a card."""
+        return await self.price_cache.get_or_load(
+            card_id, lambda: self.price_flights.do(card_id, lambda: self._fetch_price(card_id))
+        ) or 0.0
+
+    async def _fetch_price(self, card_id: str) -> float:
+        """Fetch the market price for a card from the API."""
+        try:
+            data = await self._get(f"/cards/{card_id}", operation="price")
             card = data.get("data", {})
-            prices = card.get("cardmarket", {}).get("prices", {})
-            
-            # Try to get the average price, fall back to trending price
-            price = prices.get("averageSellPrice", prices.get("trendPrice", 0.0))
-            return float(price)
+            return extract_market_price(card) or 0.0
 
         except Exception as e:
             logger.error(f"Error getting card price: {str(e)}")
-            return 0.0 
\ No newline at end of file
+            raise
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Counters for the search and price caches and their request coalescing."""
+        return {
+            "search": self.search_cache.stats(),
+            "prices": self.price_cache.stats(),
+            "search_flights": self.search_flights.stats(),
+            "price_flights": self.price_flights.stats()
+        }
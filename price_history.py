@@ -0,0 +1,196 @@
+import fcntl
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# One fixed-size record per price point: 12 bytes on disk and in memory
+POINT_DTYPE = np.dtype([("card", "<u4"), ("timestamp", "<u4"), ("price", "<f4")])
+
+# Initial column capacity; columns double when full so appends stay amortized O(1)
+INITIAL_CAPACITY = 1024
+
+class PriceHistory:
+    """Append-only history of card prices held in numpy columns.
+
+    Points are stored as (card index, unix timestamp, price) in `points.bin`, with the
+    card id for each index in `card_ids.txt`; both files are only ever appended to. A
+    point is recorded only when a card's price changes, and timestamps never go
+    backwards, so the price of a card at time t is its last point at or before t.
+
+    Several processes can share one path: appends hold an exclusive lock on the
+    directory and first read what the other processes appended since.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.card_ids: List[str] = []
+        self._card_index: Dict[str, int] = {}
+        self._points = np.empty(INITIAL_CAPACITY, dtype=POINT_DTYPE)
+        self._size = 0
+        # Latest price per card index, to skip points that would not change anything
+        self._latest = np.empty(0, dtype=np.float32)
+        # Bytes of each file already read, so refreshing only reads what was appended since
+        self._ids_offset = 0
+        self._points_offset = 0
+        self._lock = threading.Lock()
+        if path:
+            self._read_appended()
+            logger.info(f"Loaded {self._size} price points for {len(self.card_ids)} cards")
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def points(self) -> np.ndarray:
+        """The recorded points, oldest first."""
+        return self._points[:self._size]
+
+    def refresh(self) -> None:
+        """Pick up the points other processes sharing the path appended since the last read."""
+        if self.path:
+            with self._lock:
+                self._read_appended()
+
+    def _read_appended(self) -> None:
+        ids_path = os.path.join(self.path, "card_ids.txt")
+        points_path = os.path.join(self.path, "points.bin")
+        if not os.path.exists(ids_path) or not os.path.exists(points_path):
+            return
+        with open(ids_path, "rb") as f:
+            f.seek(self._ids_offset)
+            data = f.read()
+        # A trailing partial line is an id another process is still writing
+        data = data[:data.rfind(b"\n") + 1]
+        self._ids_offset += len(data)
+        new_ids = data.decode().splitlines()
+        for card_id in new_ids:
+            self._card_index[card_id] = len(self.card_ids)
+            self.card_ids.append(card_id)
+        if new_ids:
+            self._latest = np.concatenate([self._latest, np.full(len(new_ids), np.nan, dtype=np.float32)])
+
+        with open(points_path, "rb") as f:
+            f.seek(self._points_offset)
+            data = f.read()
+        count = len(data) // POINT_DTYPE.itemsize
+        self._points_offset += count * POINT_DTYPE.itemsize
+        points = np.frombuffer(data, dtype=POINT_DTYPE, count=count)
+        # Drop points whose card id line was lost to an interrupted write
+        points = points[points["card"] < len(self.card_ids)]
+        self._grow(self._size + len(points))
+        self._points[self._size:self._size + len(points)] = points
+        self._size += len(points)
+        cards, last = np.unique(points["card"][::-1], return_index=True)
+        self._latest[cards] = points["price"][::-1][last]
+
+    @contextmanager
+    def _file_lock(self):
+        """Hold an exclusive lock on the history directory, shared by every process using it."""
+        if not self.path:
+            yield
+            return
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, "lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _grow(self, size: int) -> None:
+        if size <= len(self._points):
+            return
+        capacity = max(size, len(self._points) * 2)
+        points = np.empty(capacity, dtype=POINT_DTYPE)
+        points[:self._size] = self._points[:self._size]
+        self._points = points
+
+    def record(self, prices: Dict[str, float], timestamp: Optional[float] = None) -> int:
+        """Append the prices that changed since their last point and return how many were added."""
+        with self._lock, self._file_lock():
+            if self.path:
+                # Indexes are assigned after the ids other processes added, so they never collide
+                self._read_appended()
+            ts = int(timestamp if timestamp is not None else time.time())
+            if self._size:
+                # Keep timestamps sorted so lookups by time can bisect
+                ts = max(ts, int(self._points[self._size - 1]["timestamp"]))
+
+            new_ids = [card_id for card_id in prices if card_id not in self._card_index]
+            for card_id in new_ids:
+                self._card_index[card_id] = len(self.card_ids)
+                self.card_ids.append(card_id)
+            if new_ids:
+                self._latest = np.concatenate([self._latest, np.full(len(new_ids), np.nan, dtype=np.float32)])
+
+            cards = np.fromiter((self._card_index[card_id] for card_id in prices), dtype=np.uint32, count=len(prices))
+            values = np.fromiter(prices.values(), dtype=np.float32, count=len(prices))
+            changed = self._latest[cards] != values  # NaN (no point yet) never compares equal
+            cards, values = cards[changed], values[changed]
+
+            added = np.empty(len(cards), dtype=POINT_DTYPE)
+            added["card"], added["timestamp"], added["price"] = cards, ts, values
+            self._grow(self._size + len(added))
+            self._points[self._size:self._size + len(added)] = added
+            self._size += len(added)
+            self._latest[cards] = values
+
+            if self.path and (new_ids or len(added)):
+                self._append_files(new_ids, added)
+            return len(added)
+
+    def _append_files(self, new_ids: List[str], added: np.ndarray) -> None:
+        try:
+            # Card ids go first so every point on disk refers to a known id. Under the lock,
+            # anything past what was just read is a partial write left by a crash
+            with open(os.path.join(self.path, "card_ids.txt"), "ab") as f:
+                f.truncate(self._ids_offset)
+                data = "".join(f"{card_id}\n" for card_id in new_ids).encode()
+                f.write(data)
+            self._ids_offset += len(data)
+            with open(os.path.join(self.path, "points.bin"), "ab") as f:
+                f.truncate(self._points_offset)
+                added.tofile(f)
+            self._points_offset += added.nbytes
+        except Exception as e:
+            logger.error(f"Error writing price history: {str(e)}")
+
+    def prices_at(self, timestamp: Optional[float]) -> np.ndarray:
+        """Price of every card index as of `timestamp` (the latest if None), NaN before its first point."""
+        points = self.points
+        if timestamp is not None:
+            points = points[:np.searchsorted(points["timestamp"], timestamp, side="right")]
+        prices = np.full(len(self.card_ids), np.nan, dtype=np.float32)
+        # The last point of each card is the first one in the reversed columns
+        cards, first = np.unique(points["card"][::-1], return_index=True)
+        prices[cards] = points["price"][::-1][first]
+        return prices
+
+    def first_prices(self, timestamp: Optional[float]) -> np.ndarray:
+        """Price of every card index at its first point at or before `timestamp`, NaN without one."""
+        points = self.points
+        if timestamp is not None:
+            points = points[:np.searchsorted(points["timestamp"], timestamp, side="right")]
+        prices = np.full(len(self.card_ids), np.nan, dtype=np.float32)
+        cards, first = np.unique(points["card"], return_index=True)
+        prices[cards] = points["price"][first]
+        return prices
+
+    def index_of(self, card_ids: List[str]) -> np.ndarray:
+        """Column index of each card id, or -1 for cards without history."""
+        return np.fromiter((self._card_index.get(card_id, -1) for card_id in card_ids), dtype=np.int64, count=len(card_ids))
+
+@lru_cache()
+def get_price_history() -> PriceHistory:
+    """Shared price history, loaded from PRICE_HISTORY_PATH on first use."""
+    return PriceHistory(get_settings().PRICE_HISTORY_PATH)
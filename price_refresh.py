@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import get_settings
+from schemas import JobStatus
+
+logger = logging.getLogger(__name__)
+
+# Number of sets whose prices are fetched from the Pokemon TCG API at once
+PRICE_REFRESH_SET_CONCURRENCY = 4
+
+def card_set_id(card_id: str) -> str:
+    """The set id a Pokemon TCG card id belongs to, e.g. "base1" for "base1-4"."""
+    return card_id.rsplit("-", 1)[0]
+
+def price_changed(old_price: Optional[float], new_price: float, min_change: float, min_change_percent: float) -> bool:
+    """Whether a price moved far enough, in absolute and relative terms, to be rewritten."""
+    if old_price is None:
+        return True
+    delta = abs(new_price - old_price)
+    if delta < min_change:
+        return False
+    return old_price == 0 or delta / old_price * 100 >= min_change_percent
+
+async def refresh_market_prices(api, writer, notion, job: Optional[JobStatus] = None, history=None) -> Dict[str, Any]:
+    """Re-price every card page in Notion, rewriting only the pages whose price moved.
+
+    Prices are fetched once per set rather than per card, and appended to the price
+    history if one is given. Updated pages carry their new price in the Card ID index,
+    so an interrupted refresh simply re-diffs on resume.
+    """
+    settings = get_settings()
+    pages = await asyncio.to_thread(notion.get_card_pages)
+    pages_by_set: Dict[str, List[Tuple[str, str, Optional[float]]]] = defaultdict(list)
+    for page in pages:
+        pages_by_set[card_set_id(page[1])].append(page)
+
+    semaphore = asyncio.Semaphore(PRICE_REFRESH_SET_CONCURRENCY)
+
+    async def fetch(set_id: str) -> Tuple[str, Optional[Dict[str, float]]]:
+        async with semaphore:
+            try:
+                return set_id, await api.get_set_market_prices(set_id)
+            except Exception as e:
+                logger.error(f"Error fetching prices for set {set_id}: {str(e)}")
+                if job:
+                    job.errors.append(f"{set_id}: {str(e)}")
+                return set_id, None
+
+    updates = []
+    failed_sets = []
+    for set_id, prices in await asyncio.gather(*(fetch(set_id) for set_id in pages_by_set)):
+        if prices is None:
+            failed_sets.append(set_id)
+            continue
+        if history is not None:
+            history.record(prices)
+        for page_id, card_id, old_price in pages_by_set[set_id]:
+            new_price = prices.get(card_id)
+            if new_price is not None and price_changed(
+                old_price, new_price, settings.PRICE_REFRESH_MIN_CHANGE, settings.PRICE_REFRESH_MIN_CHANGE_PERCENT
+            ):
+                updates.append({"page_id": page_id, "card_id": card_id, "market_price": new_price})
+
+    def record_progress(result: Dict[str, Any]) -> None:
+        job.progress.processed += 1
+        if not result["success"]:
+            job.progress.failed += 1
+            job.errors.append(f"{result['card_id']}: {result['error']}")
+
+    if job:
+        job.progress.total = len(updates)
+
+    results = await writer.update_prices(updates, on_result=record_progress if job else None)
+    updated = sum(result["success"] for result in results)
+    logger.info(f"Price refresh checked {len(pages)} pages in {len(pages_by_set)} sets and updated {updated} of {len(updates)} changed prices")
+
+    return {
+        "pages": len(pages),
+        "sets": len(pages_by_set),
+        "failed_sets": failed_sets,
+        "changed": len(updates),
+        "updated": updated,
+        "failed": len(updates) - updated
+    }
+
+async def run_price_refresh_loop(job_manager, interval_hours: float) -> None:
+    """Queue a price refresh job every `interval_hours`, unless one is still pending."""
+    while True:
+        await asyncio.sleep(interval_hours * 3600)
+        pending = any(job.kind == "price_refresh" and job.status in ("queued", "running") for job in job_manager.jobs.values())
+        if pending:
+            logger.info("Skipping scheduled price refresh; the previous one has not finished")
+            continue
+        try:
+            job_manager.submit("price_refresh", {})
+        except Exception as e:
+            logger.error(f"Error queueing price refresh: {str(e)}")
@@ -0,0 +1,273 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Optional
+
+import httpx
+from notion_client.errors import RequestTimeoutError
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Used when a 429 response carries no Retry-After header
+DEFAULT_RETRY_AFTER = 1.0
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream API that keeps failing."""
+
+def error_status(error: Exception) -> Optional[int]:
+    """HTTP status of a failed Notion or httpx call, or None for errors without a response."""
+    status = getattr(error, "status", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Read the Retry-After header of a failed response, in seconds."""
+    headers = getattr(error, "headers", None)
+    if headers is None:
+        headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers or "Retry-After" not in headers:
+        return None
+    try:
+        return float(headers["Retry-After"])
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed call may succeed if sent again."""
+    return error_status(error) in RETRYABLE_STATUSES or isinstance(error, (httpx.TransportError, RequestTimeoutError))
+
+class TokenBucket:
+    """Thread-safe token bucket that adapts its rate to upstream rate limiting.
+
+    Each acquire reserves a token, waiting if the bucket is empty. A 429 pauses the
+    bucket for the server's Retry-After and halves the rate; successful calls then
+    raise it back towards the configured rate.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, min_rate: Optional[float] = None):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate if min_rate is not None else rate / 8
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take a token and return how long the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._blocked_until - now)
+
+    async def acquire(self) -> None:
+        """Wait for a token without blocking the event loop."""
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self) -> None:
+        """Wait for a token from a worker thread."""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None) -> None:
+        """Back off after a 429: pause for Retry-After and halve the rate."""
+        with self._lock:
+            now = time.monotonic()
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def on_success(self) -> None:
+        """Recover the rate additively after a successful call."""
+        if self.rate < self.max_rate:
+            with self._lock:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+
+class CircuitBreaker:
+    """Fail fast while an upstream API is down instead of piling retries onto it.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls are
+    refused for `reset_timeout` seconds; then a single probe call is let through,
+    and its outcome closes the circuit or opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def before_call(self) -> bool:
+        """Raise CircuitOpenError unless a call may be sent now; True if the call is the probe."""
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0 or self._probing:
+                raise CircuitOpenError(f"{self.name} API is unavailable, retry in {max(remaining, 0.0):.0f}s")
+            self._probing = True
+            return True
+
+    def on_abandon(self) -> None:
+        """Let another call probe when the probe ended without an outcome, e.g. cancelled."""
+        with self._lock:
+            self._probing = False
+
+    def on_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def on_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._probing:
+                    logger.warning(f"{self.name} API keeps failing, pausing calls for {self.reset_timeout}s")
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+class UpstreamService:
+    """Throttling, retries and circuit breaking shared by every call to one upstream API.
+
+    429s pause the shared token bucket for Retry-After, so every caller backs off at
+    once; transient server and network errors are retried with full-jitter exponential
+    backoff. Anything else, or the last failed attempt, is raised to the caller.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        max_retries: int,
+        backoff_base: float,
+        backoff_max: float,
+        failure_threshold: int,
+        reset_timeout: float
+    ):
+        self.name = name
+        self.bucket = TokenBucket(rate)
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def _retry_delay(self, attempt: int, error: Exception, idempotent: bool = True) -> Optional[float]:
+        """Record a failed attempt and return how long to wait before the next, or None to give up."""
+        if not is_retryable(error):
+            # The API answered; the request itself was wrong
+            self.breaker.on_success()
+            return None
+
+        if error_status(error) == 429:
+            self.breaker.on_success()
+            self.bucket.on_rate_limited(get_retry_after(error) or DEFAULT_RETRY_AFTER)
+            # The paused bucket holds every caller back; the jitter spreads their retries out
+            delay = random.uniform(0, self.backoff_base)
+        else:
+            self.breaker.on_failure()
+            if not idempotent:
+                # The request may have been applied before it failed, so sending it again could repeat it
+                return None
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+        if attempt >= self.max_retries or self.breaker.is_open:
+            return None
+        logger.warning(f"{self.name} API call failed ({error}), retry {attempt + 1}/{self.max_retries}")
+        return delay
+
+    def _on_success(self) -> None:
+        self.bucket.on_success()
+        self.breaker.on_success()
+
+    async def call(self, fn: Callable[[], Awaitable[Any]], idempotent: bool = True) -> Any:
+        """Await `fn()` under the service's rate limit, retrying transient failures.
+
+        Calls that are not `idempotent`, like creating a page, are only retried after a 429.
+        """
+        attempt = 0
+        while True:
+            probe = self.breaker.before_call()
+            try:
+                await self.bucket.acquire()
+                result = await fn()
+            except Exception as e:
+                delay = self._retry_delay(attempt, e, idempotent)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                if probe:
+                    self.breaker.on_abandon()
+                raise
+            self._on_success()
+            return result
+
+    def call_sync(self, fn: Callable[[], Any], idempotent: bool = True) -> Any:
+        """Blocking `call` for worker threads and synchronous clients."""
+        attempt = 0
+        while True:
+            probe = self.breaker.before_call()
+            try:
+                self.bucket.acquire_sync()
+                result = fn()
+            except Exception as e:
+                delay = self._retry_delay(attempt, e, idempotent)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                if probe:
+                    self.breaker.on_abandon()
+                raise
+            self._on_success()
+            return result
+
+@lru_cache()
+def get_upstream(service: str) -> UpstreamService:
+    """The process-wide call layer for "notion" or "tcg", so all callers share one bucket and breaker."""
+    settings = get_settings()
+    if service == "notion":
+        rate, max_retries = settings.NOTION_RATE_LIMIT_PER_SECOND, settings.NOTION_MAX_RETRIES
+    elif service == "tcg":
+        rate, max_retries = settings.POKEMON_TCG_RATE_LIMIT_PER_SECOND, settings.POKEMON_TCG_MAX_RETRIES
+    else:
+        raise ValueError(f"Unknown upstream service: {service}")
+    return UpstreamService(
+        service,
+        rate,
+        max_retries,
+        settings.UPSTREAM_BACKOFF_BASE_SECONDS,
+        settings.UPSTREAM_BACKOFF_MAX_SECONDS,
+        settings.UPSTREAM_CIRCUIT_FAILURE_THRESHOLD,
+        settings.UPSTREAM_CIRCUIT_RESET_SECONDS
+    )
@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import get_settings
+from notion_integration import LAST_EDITED_OVERLAP, CARD_INDEX_FULL_RELOAD_SECONDS, REQUIRED_PROPERTIES
+
+logger = logging.getLogger(__name__)
+
+# SQLite column type for each Notion property type
+COLUMN_TYPES = {"number": "REAL", "checkbox": "INTEGER"}
+
+# Columns read endpoints may filter and group by, keyed by their query parameter
+FILTER_COLUMNS = {"set": "set", "rarity": "rarity", "group_id": "group_id", "repeated": "repeated", "card_id": "card_id"}
+
+def column_name(prop_name: str) -> str:
+    """Replica column for a Notion property, e.g. "Market Price" -> "market_price"."""
+    return prop_name.lower().replace(" ", "_")
+
+def property_value(prop: Dict[str, Any]) -> Any:
+    """Plain value of a Notion page property."""
+    prop_type = prop.get("type")
+    value = prop.get(prop_type)
+    if prop_type in ("title", "rich_text"):
+        return "".join(part.get("plain_text") or part.get("text", {}).get("content", "") for part in value or [])
+    if prop_type == "date":
+        return (value or {}).get("start")
+    if prop_type == "checkbox":
+        return int(bool(value))
+    return value
+
+class CollectionReplica:
+    """Local SQLite copy of the Notion collection database for fast read queries.
+
+    Columns follow REQUIRED_PROPERTIES. A column added to the schema is created on
+    open and forces the next sync to be a full one.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.columns = {column_name(name): prop_type for name, prop_type in REQUIRED_PROPERTIES.items()}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Open the replica database, creating or migrating it on first use."""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS pages (page_id TEXT PRIMARY KEY, last_edited_time TEXT);"
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);"
+            )
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(pages)")}
+            missing = [column for column in self.columns if column not in existing]
+            for column in missing:
+                conn.execute(f'ALTER TABLE pages ADD COLUMN "{column}" {COLUMN_TYPES.get(self.columns[column], "TEXT")}')
+            if missing and len(existing) > 2:
+                # Pages synced before the column existed lack its values
+                conn.execute("DELETE FROM meta")
+            for column in FILTER_COLUMNS.values():
+                conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_pages_{column}" ON pages ("{column}")')
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        """Close the database connection."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def get_meta(self, key: str) -> Optional[str]:
+        """Read a sync bookkeeping value."""
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str) -> None:
+        """Caller holds the lock."""
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def is_synced(self) -> bool:
+        """Whether a full sync has completed."""
+        return self.get_meta("full_synced_at") is not None
+
+    def _row(self, page: Dict[str, Any]) -> Tuple[Any, ...]:
+        properties = page.get("properties", {})
+        values = [property_value(properties[name]) if name in properties else None for name in REQUIRED_PROPERTIES]
+        return (page["id"], page.get("last_edited_time"), *values)
+
+    def _upsert(self, pages: List[Dict[str, Any]]) -> None:
+        """Caller holds the lock."""
+        columns = ", ".join(f'"{column}"' for column in ["page_id", "last_edited_time", *self.columns])
+        placeholders = ", ".join("?" for _ in range(len(self.columns) + 2))
+        live = [page for page in pages if not page.get("archived")]
+        self.conn.executemany(f"INSERT OR REPLACE INTO pages ({columns}) VALUES ({placeholders})", [self._row(page) for page in live])
+        self.conn.executemany("DELETE FROM pages WHERE page_id = ?", [(page["id"],) for page in pages if page.get("archived")])
+
+    def replace_all(self, pages: List[Dict[str, Any]], watermark: datetime) -> None:
+        """Replace the whole replica with a full snapshot of the database."""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM pages")
+            self._upsert(pages)
+            self._set_meta("watermark", watermark.isoformat())
+            self._set_meta("full_synced_at", str(time.time()))
+
+    def apply_changes(self, pages: List[Dict[str, Any]], watermark: datetime) -> None:
+        """Apply pages created or edited since the last sync."""
+        with self._lock, self.conn:
+            self._upsert(pages)
+            self._set_meta("watermark", watermark.isoformat())
+
+    def _where(self, filters: Dict[str, Any]) -> Tuple[str, List[Any]]:
+        conditions = []
+        params = []
+        for key, value in filters.items():
+            if value is None:
+                continue
+            conditions.append(f'"{FILTER_COLUMNS[key]}" = ?')
+            params.append(int(value) if isinstance(value, bool) else value)
+        return (" WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+    def list_pages(self, filters: Dict[str, Any], limit: int, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """Pages matching the filters, newest first, and the total number of matches."""
+        where, params = self._where(filters)
+        with self._lock:
+            total = self.conn.execute(f"SELECT COUNT(*) FROM pages{where}", params).fetchone()[0]
+            cursor = self.conn.execute(
+                f'SELECT * FROM pages{where} ORDER BY "created_date" DESC, page_id LIMIT ? OFFSET ?',
+                params + [limit, offset]
+            )
+            names = [description[0] for description in cursor.description]
+            rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+        return rows, total
+
+    def count(self, filters: Dict[str, Any], group_by: Optional[str] = None) -> Tuple[int, Dict[str, int]]:
+        """Number of pages matching the filters, optionally broken down by a filter column."""
+        where, params = self._where(filters)
+        with self._lock:
+            total = self.conn.execute(f"SELECT COUNT(*) FROM pages{where}", params).fetchone()[0]
+            groups = {}
+            if group_by:
+                column = FILTER_COLUMNS[group_by]
+                rows = self.conn.execute(
+                    f'SELECT "{column}", COUNT(*) FROM pages{where} GROUP BY "{column}" ORDER BY COUNT(*) DESC', params
+                ).fetchall()
+                groups = {str(value if value is not None else ""): count for value, count in rows}
+        return total, groups
+
+@lru_cache()
+def get_replica() -> Optional[CollectionReplica]:
+    """Shared collection replica, or None if COLLECTION_REPLICA_PATH is not set."""
+    path = get_settings().COLLECTION_REPLICA_PATH
+    return CollectionReplica(path) if path else None
+
+def sync_replica(notion, replica: CollectionReplica, full: bool = False) -> Dict[str, Any]:
+    """Bring the replica up to date: a full snapshot when due, otherwise only edited pages."""
+    with replica.sync_lock:
+        return _sync_replica(notion, replica, full)
+
+def ensure_replica(notion, replica: CollectionReplica) -> None:
+    """Seed the replica if it has never been fully synced."""
+    with replica.sync_lock:
+        if not replica.is_synced():
+            _sync_replica(notion, replica, full=True)
+
+def _sync_replica(notion, replica: CollectionReplica, full: bool) -> Dict[str, Any]:
+    started = datetime.now(timezone.utc)
+    watermark = replica.get_meta("watermark")
+    full_synced_at = replica.get_meta("full_synced_at")
+    if full or watermark is None or full_synced_at is None or time.time() - float(full_synced_at) > CARD_INDEX_FULL_RELOAD_SECONDS:
+        pages = list(notion.query_all())
+        replica.replace_all(pages, started)
+        logger.info(f"Collection replica seeded with {len(pages)} pages")
+        return {"full": True, "pages": len(pages)}
+
+    since = datetime.fromisoformat(watermark) - LAST_EDITED_OVERLAP
+    pages = list(notion.query_all({
+        "timestamp": "last_edited_time",
+        "last_edited_time": {"on_or_after": since.isoformat()}
+    }))
+    replica.apply_changes(pages, started)
+    logger.debug(f"Collection replica applied {len(pages)} edited pages")
+    return {"full": False, "pages": len(pages)}
+
+async def run_replica_sync_loop(notion, replica: CollectionReplica, interval_seconds: float) -> None:
+    """Keep the replica in sync by re-running the incremental sync periodically."""
+    while True:
+        try:
+            await asyncio.to_thread(sync_replica, notion, replica)
+        except Exception as e:
+            logger.error(f"Error syncing collection replica: {str(e)}")
+        await asyncio.sleep(interval_seconds)
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field, HttpUrl
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
+from datetime import datetime
 
 class CardBase(BaseModel):
     name: str = Field(..., min_length=1)
@@ -7,6 +8,7 @@ class CardBase(BaseModel):
     market_price: float = Field(..., ge=0)
     rarity: str = Field(..., min_length=1)
     image_url: HttpUrl
+    thumbnail_url: Optional[str] = None  # Cached thumbnail served by this app
     group_id: Optional[str] = None
     variant_number: Optional[str] = None
     card_id: Optional[str] = None
@@ -15,8 +17,110 @@ class CardBase(BaseModel):
 class CardCreate(CardBase):
     pass
 
+class CardResult(BaseModel):
+    card_id: str
+    success: bool
+    page_id: Optional[str] = None
+    action: Optional[str] = None  # created, updated or unchanged
+    error: Optional[str] = None
+
+class ImageResult(BaseModel):
+    filename: str
+    success: bool
+    card_id: Optional[str] = None
+    error: Optional[str] = None
+
 class CardResponse(BaseModel):
     success: bool
     message: str
     cards: Optional[List[CardBase]] = None
-    error: Optional[str] = None 
\ No newline at end of file
+    results: Optional[List[CardResult]] = None  # Per-card outcome of Notion writes
+    images: Optional[List[ImageResult]] = None  # Per-image outcome of batch uploads
+    job_id: Optional[str] = None  # Set when the work was queued as a background job
+    page: Optional[int] = None
+    page_size: Optional[int] = None
+    error: Optional[str] = None
+
+class Suggestion(BaseModel):
+    text: str
+    set_id: Optional[str] = None  # Set only for set name suggestions
+    popularity: int = 0
+
+class Suggestions(BaseModel):
+    success: bool
+    query: str
+    names: List[Suggestion] = []
+    sets: List[Suggestion] = []
+    error: Optional[str] = None
+
+class CollectionPage(BaseModel):
+    page_id: str
+    card_id: Optional[str] = None
+    name: Optional[str] = None
+    set: Optional[str] = None
+    rarity: Optional[str] = None
+    market_price: Optional[float] = None
+    method: Optional[str] = None
+    card_image: Optional[str] = None
+    group_id: Optional[str] = None
+    variant_number: Optional[str] = None
+    created_date: Optional[str] = None
+    repeated: bool = False
+    quantity: Optional[int] = None
+    last_seen: Optional[str] = None
+    last_edited_time: Optional[str] = None
+
+class CollectionList(BaseModel):
+    success: bool
+    total: int = 0
+    limit: Optional[int] = None
+    offset: Optional[int] = None
+    pages: List[CollectionPage] = []
+    error: Optional[str] = None
+
+class CollectionCount(BaseModel):
+    success: bool
+    total: int = 0
+    groups: Dict[str, int] = {}
+    error: Optional[str] = None
+
+class SetValue(BaseModel):
+    set_id: str
+    cards: int
+    value: float
+    start_value: float
+    change: float
+
+class CollectionValue(BaseModel):
+    success: bool
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    cards: int = 0
+    unpriced_cards: int = 0  # Cards with no recorded price by `end`
+    value: float = 0.0
+    start_value: float = 0.0
+    change: float = 0.0
+    sets: List[SetValue] = []
+    error: Optional[str] = None
+
+class JobProgress(BaseModel):
+    total: int = 0
+    processed: int = 0
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    repeated: int = 0
+    failed: int = 0
+
+class JobStatus(BaseModel):
+    job_id: str
+    kind: str
+    status: str = "queued"  # queued, running, completed or failed
+    params: Dict[str, Any] = {}
+    progress: JobProgress = JobProgress()
+    errors: List[str] = []
+    result: Optional[Dict[str, Any]] = None
+    checkpoint: Dict[str, Any] = {}  # Handler state used to resume interrupted jobs
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
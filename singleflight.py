@@ -0,0 +1,100 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+
+class SingleFlight:
+    """Share one in-flight upstream call among concurrent callers asking for the same key.
+
+    Unlike a cache this holds nothing once the call finishes; it only stops identical
+    requests that arrive while one is already running from being sent again.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def _start(self, key: Hashable) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        return future
+
+    def _finish(self, key: Hashable, future: asyncio.Future) -> None:
+        if self._calls.get(key) is future:
+            del self._calls[key]
+
+    @staticmethod
+    def _fail(future: asyncio.Future, error: BaseException) -> None:
+        if future.done():
+            return
+        if isinstance(error, asyncio.CancelledError):
+            future.cancel()
+        else:
+            future.set_exception(error)
+            # Mark the exception retrieved so callers without waiters do not log a warning
+            future.exception()
+
+    def _settle(self, futures: Dict[Hashable, asyncio.Future], task: asyncio.Future, value: Callable[[Any, Hashable], Any]) -> None:
+        """Pass the outcome of a finished call on to every key it was started for."""
+        for key, future in futures.items():
+            self._finish(key, future)
+            if task.cancelled():
+                future.cancel()
+            elif task.exception() is not None:
+                self._fail(future, task.exception())
+            elif not future.done():
+                future.set_result(value(task.result(), key))
+
+    def _launch(self, futures: Dict[Hashable, asyncio.Future], call: Callable[[], Awaitable[Any]], value: Callable[[Any, Hashable], Any]) -> asyncio.Future:
+        # The call runs as its own task, so cancelling the caller that started it
+        # does not cancel it for the callers that joined it in the meantime
+        try:
+            task = asyncio.ensure_future(call())
+        except BaseException as e:
+            for key, future in futures.items():
+                self._finish(key, future)
+                self._fail(future, e)
+            raise
+        task.add_done_callback(lambda task: self._settle(futures, task, value))
+        return task
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Return `fn()`, or the result of the identical call already in flight."""
+        self.calls += 1
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        task = self._launch({key: self._start(key)}, fn, lambda result, _: result)
+        return await asyncio.shield(task)
+
+    async def do_many(self, keys: List[Hashable], fn: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]) -> Dict[Hashable, Any]:
+        """Batched `do`: call `fn` with only the keys not already in flight and merge in the rest.
+
+        `fn` returns a key -> value map; keys it leaves out are missing from the result too.
+        """
+        keys = list(dict.fromkeys(keys))
+        self.calls += len(keys)
+        waiting = {key: self._calls[key] for key in keys if key in self._calls}
+        self.coalesced += len(waiting)
+        own = {key: self._start(key) for key in keys if key not in waiting}
+
+        results: Dict[Hashable, Any] = {}
+        if own:
+            task = self._launch(own, lambda: fn(list(own)), lambda result, key: result.get(key))
+            results = dict(await asyncio.shield(task))
+
+        for key, future in waiting.items():
+            value = await asyncio.shield(future)
+            if value is not None:
+                results[key] = value
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        """Call and coalescing counters for monitoring."""
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls),
+            "coalesced_rate": round(self.coalesced / self.calls, 4) if self.calls else 0.0
+        }
@@ -0,0 +1,143 @@
+import asyncio
+import io
+import json
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from bulk_import import CardResolver, iter_json_rows, iter_rows, run_import
+from rate_limit import CircuitOpenError
+from schemas import JobStatus
+
+mock_settings = MagicMock()
+mock_settings.IMPORT_BATCH_ROWS = 2
+mock_settings.UPSTREAM_CIRCUIT_RESET_SECONDS = 0.0
+
+def make_card(card_id, name="Pikachu"):
+    set_id, number = card_id.rsplit("-", 1)
+    return {"id": card_id, "name": name, "set": {"id": set_id, "name": set_id}, "number": number, "market_price": 1.0}
+
+def make_api(cards):
+    api = MagicMock()
+    by_id = {card["id"]: card for card in cards}
+    api.get_cards = AsyncMock(side_effect=lambda card_ids: {card_id: by_id[card_id] for card_id in card_ids if card_id in by_id})
+    api.get_sets = AsyncMock(return_value=[{"id": "base1", "name": "Base Set"}, {"id": "sv3", "name": "Obsidian Flames"}])
+    api.get_set_cards = AsyncMock(side_effect=lambda set_id: [card for card in cards if card["set"]["id"] == set_id])
+    return api
+
+def test_json_rows_are_streamed_in_chunks():
+    """Arrays and JSON Lines are both read a few bytes at a time."""
+    rows = [{"card_id": "base1-4"}, {"Set": "Base Set", "Number": "058/102"}, "sv3-1"]
+
+    array = list(iter_rows(io.StringIO(json.dumps(rows)), "json"))
+    lines = list(iter_json_rows(io.StringIO("\n".join(json.dumps(row) for row in rows)), chunk_size=5))
+
+    assert array == [{"card_id": "base1-4"}, {"set": "Base Set", "number": "058/102"}, {"card_id": "sv3-1"}]
+    assert lines == rows
+    with pytest.raises(ValueError):
+        list(iter_json_rows(io.StringIO('[{"card_id": "base1-4"}, {"card_id": '), chunk_size=8))
+
+def test_resolver_batches_ids_and_falls_back_to_set_lists():
+    """Ids and set/number rows share one batched lookup; the rest are matched per set."""
+    api = make_api([make_card("base1-4", "Charizard"), make_card("base1-58"), make_card("sv3-TG01", "Charizard ex")])
+    resolver = CardResolver(api)
+
+    results = asyncio.run(resolver.resolve([
+        {"card_id": "base1-4"},
+        {"set": "base set", "number": "058/102"},
+        {"set": "sv3", "name": "Charizard ex"},
+        {"set": "Jungle", "number": "1"},
+        {"card_id": "base1-999"},
+        {"name": "Pikachu"}
+    ]))
+
+    assert [card["id"] if card else None for card, _ in results] == ["base1-4", "base1-58", "sv3-TG01", None, None, None]
+    assert "unknown set" in results[3][1]
+    assert "not found" in results[4][1]
+    api.get_cards.assert_awaited_once()
+    api.get_set_cards.assert_awaited_once_with("sv3")
+
+def make_writer(interrupt_at=None):
+    """A writer whose upsert call number `interrupt_at` writes one card and is then cancelled, like a shutdown."""
+    writer = MagicMock()
+    calls = 0
+
+    async def upsert_cards(cards, on_result=None, **kwargs):
+        nonlocal calls
+        calls += 1
+        results = []
+        for card in cards:
+            if calls == interrupt_at and results:
+                raise asyncio.CancelledError()
+            result = {"card_id": card["card_id"], "success": True, "page_id": "page", "action": "created", "error": None}
+            on_result(result)
+            results.append(result)
+        return results
+
+    writer.upsert_cards = AsyncMock(side_effect=upsert_cards)
+    return writer
+
+def written_ids(writer):
+    return [card["card_id"] for call in writer.upsert_cards.await_args_list for card in call.args[0]]
+
+def test_import_writes_batches_and_resumes_from_checkpoint(tmp_path):
+    """Rows are checkpointed as they are written, so a resumed job skips exactly the rows already written."""
+    path = tmp_path / "cards.csv"
+    path.write_text("card_id\nbase1-4\nbase1-58\nsv3-1\nbase1-58\nbase1-999\n")
+    api = make_api([make_card("base1-4", "Charizard"), make_card("base1-58"), make_card("sv3-1", "Charizard ex")])
+    transform = lambda card: {"card_id": card["id"], "name": card["name"]}
+    job = JobStatus(
+        job_id="job", kind="import", created_at=datetime.now(),
+        params={"path": str(path), "format": "csv", "group_id": "MIGRATION", "upsert": True}
+    )
+
+    interrupted = make_writer(interrupt_at=2)
+    with patch("bulk_import.get_settings", return_value=mock_settings), pytest.raises(asyncio.CancelledError):
+        asyncio.run(run_import(job, api, interrupted, transform))
+
+    assert written_ids(interrupted) == ["base1-4", "base1-58", "sv3-1", "base1-58"]
+    assert job.checkpoint == {"rows_done": 2, "done_rows": [2]}
+
+    resumed = make_writer()
+    with patch("bulk_import.get_settings", return_value=mock_settings):
+        result = asyncio.run(run_import(job, api, resumed, transform))
+
+    assert written_ids(resumed) == ["base1-58"]
+    assert resumed.upsert_cards.await_args.kwargs["group_id"] == "MIGRATION"
+    assert result["created"] == 4
+    assert result["failed"] == 1
+    assert job.checkpoint == {"rows_done": 5, "done_rows": []}
+
+def test_import_waits_out_upstream_outages_and_fails_on_other_errors(tmp_path):
+    """Rows are not marked failed because the Pokemon TCG API was briefly down."""
+    path = tmp_path / "cards.csv"
+    path.write_text("card_id\nbase1-4\n")
+    api = make_api([make_card("base1-4", "Charizard")])
+    lookup = api.get_cards.side_effect
+    outages = [CircuitOpenError("tcg API is unavailable")]
+
+    def get_cards(card_ids):
+        if outages:
+            raise outages.pop()
+        return lookup(card_ids)
+
+    api.get_cards.side_effect = get_cards
+    transform = lambda card: {"card_id": card["id"], "name": card["name"]}
+
+    def make_job():
+        return JobStatus(
+            job_id="job", kind="import", created_at=datetime.now(),
+            params={"path": str(path), "format": "csv", "group_id": "MIGRATION", "upsert": True}
+        )
+
+    with patch("bulk_import.get_settings", return_value=mock_settings):
+        result = asyncio.run(run_import(make_job(), api, make_writer(), transform))
+        assert result["created"] == 1
+        assert result["failed"] == 0
+
+        api.get_cards.side_effect = ValueError("unexpected response")
+        job = make_job()
+        with pytest.raises(ValueError):
+            asyncio.run(run_import(job, api, make_writer(), transform))
+        assert job.progress.failed == 0
@@ -0,0 +1,88 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, patch
+
+from cache import SharedCache, TTLCache, HIT, STALE, MISS
+
+def test_lru_eviction():
+    """The least recently used entry is evicted once the bound is exceeded."""
+    cache = TTLCache(max_entries=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.lookup("a") == (HIT, 1)
+    cache.set("c", 3)
+
+    assert cache.lookup("b") == (MISS, None)
+    assert cache.lookup("a") == (HIT, 1)
+    assert cache.stats()["evictions"] == 1
+
+def test_stale_entries_are_served_while_refreshing():
+    """Expired entries inside the stale window are returned and reloaded in the background."""
+    cache = TTLCache(max_entries=10, ttl=60, stale_ttl=60)
+    loader = AsyncMock(return_value="new")
+
+    async def run():
+        cache.set("key", "old")
+        with patch("cache.time.monotonic", return_value=time.monotonic() + 90):
+            value = await cache.get_or_load("key", loader)
+            await asyncio.sleep(0)
+        return value
+
+    assert asyncio.run(run()) == "old"
+    loader.assert_awaited_once()
+    assert cache.lookup("key") == (HIT, "new")
+    assert cache.stats()["stale_hits"] == 1
+
+def test_expired_entries_past_stale_window_are_reloaded():
+    """Entries older than ttl + stale_ttl are treated as misses."""
+    cache = TTLCache(max_entries=10, ttl=60, stale_ttl=60)
+    cache.set("key", "old")
+    with patch("cache.time.monotonic", return_value=time.monotonic() + 200):
+        assert cache.lookup("key") == (MISS, None)
+    assert len(cache) == 0
+
+def test_empty_results_are_not_cached():
+    """Empty loader results (e.g. upstream failures) are retried on the next call."""
+    cache = TTLCache(max_entries=10, ttl=60)
+    loader = AsyncMock(return_value=[])
+    asyncio.run(cache.get_or_load("key", loader))
+    asyncio.run(cache.get_or_load("key", loader))
+    assert loader.await_count == 2
+
+def test_workers_share_values_through_the_shared_cache(tmp_path):
+    """A value stored by one process is a hit for another, keeping its original age."""
+    path = str(tmp_path / "shared.db")
+    worker_a = TTLCache(max_entries=10, ttl=60, stale_ttl=60, shared=SharedCache(path), namespace="search")
+    worker_b = TTLCache(max_entries=10, ttl=60, stale_ttl=60, shared=SharedCache(path), namespace="search")
+    other = TTLCache(max_entries=10, ttl=60, shared=SharedCache(path), namespace="prices")
+
+    worker_a.set_many([(("card", "base1-4"), {"name": "Charizard"}), ("base1-58", 4.5)])
+
+    assert worker_b.lookup(("card", "base1-4")) == (HIT, {"name": "Charizard"})
+    assert worker_b.lookup("base1-58") == (HIT, 4.5)
+    assert other.lookup("base1-58") == (MISS, None)
+    assert worker_b.stats()["shared_hits"] == 2
+
+    with patch("cache.time.time", return_value=time.time() + 90):
+        assert worker_b.lookup("missing") == (MISS, None)
+        fresh = TTLCache(max_entries=10, ttl=60, stale_ttl=60, shared=SharedCache(path), namespace="search")
+        assert fresh.lookup("base1-58") == (STALE, 4.5)
+
+    worker_a.invalidate("base1-58")
+    assert TTLCache(max_entries=10, ttl=60, shared=SharedCache(path), namespace="search").lookup("base1-58") == (MISS, None)
+
+def test_shared_cache_is_used_off_the_event_loop(tmp_path):
+    """Inside the event loop, shared reads are batched and writes finish in the background."""
+    path = str(tmp_path / "shared.db")
+    worker_a = TTLCache(max_entries=10, ttl=60, shared=SharedCache(path), namespace="prices")
+    worker_b = TTLCache(max_entries=10, ttl=60, shared=SharedCache(path), namespace="prices")
+
+    async def run():
+        worker_a.set_many([("base1-4", 300.0), ("base1-58", 4.5)])
+        await worker_a.flush()
+        with patch.object(SharedCache, "get", side_effect=AssertionError("read on the event loop")):
+            return await worker_b.lookup_many(["base1-4", "base1-58", "sv3-1"])
+
+    assert asyncio.run(run()) == {"base1-4": (HIT, 300.0), "base1-58": (HIT, 4.5), "sv3-1": (MISS, None)}
+    assert worker_b.stats()["shared_hits"] == 2
+    assert worker_b.stats()["misses"] == 1
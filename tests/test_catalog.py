@@ -0,0 +1,80 @@
+import asyncio
+import time
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from catalog import CardCatalog, sync_catalog
+
+def make_card(card_id, name, set_id="base1", rarity="Rare"):
+    return {
+        "id": card_id,
+        "name": name,
+        "set": {"name": "Base Set", "id": set_id},
+        "rarity": rarity,
+        "number": card_id.split("-")[-1],
+        "market_price": 1.0,
+        "images": {"small": "https://example.com/s.jpg", "large": "https://example.com/l.jpg"}
+    }
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = CardCatalog(str(tmp_path / "catalog.db"))
+    yield catalog
+    catalog.close()
+
+def test_search_matches_name_phrase(catalog):
+    """Name searches behave like the upstream phrase query."""
+    catalog.replace_set({"id": "base1", "name": "Base Set", "updatedAt": "2020/01/01"}, [
+        make_card("base1-58", "Pikachu"),
+        make_card("base1-59", "Pikachu V"),
+        make_card("base1-60", "Flying Pikachu"),
+        make_card("base1-61", "Raichu")
+    ])
+
+    assert catalog.is_synced()
+    assert [card["id"] for card in catalog.search("pikachu")] == ["base1-58", "base1-59", "base1-60"]
+    assert [card["id"] for card in catalog.search("Pikachu V")] == ["base1-59"]
+    assert catalog.search("Pikachu", set_id="sv3") == []
+    assert [card["id"] for card in catalog.find(set_id="base1", number="61")] == ["base1-61"]
+
+def test_search_ignores_stale_records(catalog):
+    """Records older than the max age are treated as misses."""
+    catalog.replace_set({"id": "base1", "name": "Base Set"}, [make_card("base1-4", "Charizard")])
+    catalog.conn.execute("UPDATE cards SET synced_at = ?", (time.time() - 7200,))
+
+    assert catalog.search("Charizard", max_age=3600) == []
+    assert len(catalog.search("Charizard", max_age=86400)) == 1
+
+def test_sync_only_downloads_changed_sets(catalog):
+    """Later syncs skip sets whose updatedAt has not changed."""
+    api = MagicMock()
+    api.get_sets = AsyncMock(return_value=[
+        {"id": "base1", "name": "Base Set", "updatedAt": "2020/01/01"},
+        {"id": "sv3", "name": "Obsidian Flames", "updatedAt": "2023/08/11"}
+    ])
+    api.get_set_cards = AsyncMock(side_effect=lambda set_id: [make_card(f"{set_id}-1", "Charizard", set_id)])
+
+    first = asyncio.run(sync_catalog(api, catalog))
+    assert first["updated_sets"] == 2
+    assert catalog.count_cards() == 2
+
+    api.get_sets.return_value[1]["updatedAt"] = "2023/09/01"
+    second = asyncio.run(sync_catalog(api, catalog))
+    assert second["updated_sets"] == 1
+    assert api.get_set_cards.call_args.args == ("sv3",)
+
+def test_sync_refreshes_unchanged_sets(catalog, monkeypatch):
+    """Sets confirmed unchanged by a later sync stay fresh for searches."""
+    api = MagicMock()
+    api.get_sets = AsyncMock(return_value=[{"id": "base1", "name": "Base Set", "updatedAt": "2020/01/01"}])
+    api.get_set_cards = AsyncMock(return_value=[make_card("base1-4", "Charizard")])
+    now = time.time()
+
+    monkeypatch.setattr("catalog.time.time", lambda: now)
+    asyncio.run(sync_catalog(api, catalog))
+    monkeypatch.setattr("catalog.time.time", lambda: now + 7200)
+    assert catalog.search("Charizard", max_age=3600) == []
+
+    second = asyncio.run(sync_catalog(api, catalog))
+    assert second["updated_sets"] == 0
+    assert [card["id"] for card in catalog.search("Charizard", max_age=3600)] == ["base1-4"]
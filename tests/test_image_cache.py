@@ -0,0 +1,151 @@
+import os
+from io import BytesIO
+from unittest.mock import AsyncMock, patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import pytest
+from PIL import Image
+
+import image_cache
+from image_cache import ImageCache, make_thumbnail
+
+def png_bytes(width=600, height=825):
+    output = BytesIO()
+    Image.new("RGB", (width, height), "gold").save(output, format="PNG")
+    return output.getvalue()
+
+def test_least_recently_used_images_are_evicted(tmp_path):
+    cache = ImageCache(str(tmp_path), max_bytes=250)
+    cache.put("a.large", b"a" * 100, "png")
+    cache.put("b.large", b"b" * 100, "png")
+    cache.get("a.large")
+    cache.put("c.large", b"c" * 100, "png")
+
+    assert cache.get("b.large") is None
+    assert cache.get("a.large") is not None
+    assert len(os.listdir(tmp_path)) == 2
+
+    # A new process rebuilds the index from the files on disk
+    reloaded = ImageCache(str(tmp_path), max_bytes=250)
+    image = reloaded.get("c.large")
+    assert image.etag == cache.get("c.large").etag
+    assert image.media_type == "image/png"
+
+def test_replacing_an_image_removes_the_old_file(tmp_path):
+    cache = ImageCache(str(tmp_path), max_bytes=1000)
+    first = cache.put("a.large", b"old", "png")
+    second = cache.put("a.large", b"new", "png")
+
+    assert first.etag != second.etag
+    assert os.listdir(tmp_path) == [os.path.basename(second.path)]
+
+def test_failed_writes_leave_no_temporary_files(tmp_path):
+    cache = ImageCache(str(tmp_path), max_bytes=1000)
+    cache.put("a.large", b"a", "png")
+
+    with patch("image_cache.os.replace", side_effect=OSError("disk full")), pytest.raises(OSError):
+        cache.put("b.large", b"b", "png")
+
+    assert len(os.listdir(tmp_path)) == 1
+    # Leftovers of an interrupted process are removed when the index is rebuilt
+    (tmp_path / "crashed.tmp").write_bytes(b"partial")
+    assert ImageCache(str(tmp_path), max_bytes=1000).get("a.large") is not None
+    assert not (tmp_path / "crashed.tmp").exists()
+
+def test_thumbnails_are_scaled_webp():
+    thumbnail = make_thumbnail(png_bytes(), 200)
+
+    with Image.open(BytesIO(thumbnail)) as image:
+        assert image.format == "WEBP"
+        assert image.size == (200, 275)
+
+def test_images_are_fetched_once_and_revalidated_with_etags(tmp_path):
+    app = FastAPI()
+    app.include_router(image_cache.router, prefix="/api/images")
+    client = TestClient(app)
+    fetch = AsyncMock(return_value=(png_bytes(), "png"))
+
+    with patch("image_cache.get_image_cache", return_value=ImageCache(str(tmp_path), 10 * 1024 * 1024)), \
+         patch("image_cache.upstream_image_url", AsyncMock(return_value="https://images.example/base1-4_hires.png")), \
+         patch("image_cache.fetch_image", fetch):
+        response = client.get("/api/images/base1-4")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/webp"
+        assert "immutable" in response.headers["cache-control"]
+        etag = response.headers["etag"]
+
+        # The large image was cached while making the thumbnail
+        large = client.get("/api/images/base1-4", params={"size": "large"})
+        assert large.headers["content-type"] == "image/png"
+
+        revalidated = client.get("/api/images/base1-4", headers={"If-None-Match": etag})
+        assert revalidated.status_code == 304
+        assert revalidated.content == b""
+
+        assert client.get("/api/images/..%2Fsecrets").status_code == 404
+
+    assert fetch.await_count == 1
+
+def test_images_evicted_before_they_are_served_are_loaded_again(tmp_path):
+    app = FastAPI()
+    app.include_router(image_cache.router, prefix="/api/images")
+    client = TestClient(app)
+    cache = ImageCache(str(tmp_path), 10 * 1024 * 1024)
+    content = png_bytes()
+    fetch = AsyncMock(return_value=(content, "png"))
+    load_image = image_cache.load_image
+
+    async def evicting_load(*args):
+        # Another request evicts the file between the lookup and the response
+        image = await load_image(*args)
+        if fetch.await_count == 1:
+            os.remove(image.path)
+        return image
+
+    with patch("image_cache.get_image_cache", return_value=cache), \
+         patch("image_cache.upstream_image_url", AsyncMock(return_value="https://images.example/base1-4_hires.png")), \
+         patch("image_cache.fetch_image", fetch), \
+         patch("image_cache.load_image", evicting_load):
+        response = client.get("/api/images/base1-4", params={"size": "large"})
+
+    assert response.status_code == 200
+    assert response.content == content
+    assert fetch.await_count == 2
+
+def test_images_evicted_while_being_served_are_still_sent(tmp_path):
+    app = FastAPI()
+    app.include_router(image_cache.router, prefix="/api/images")
+    client = TestClient(app)
+    cache = ImageCache(str(tmp_path), 10 * 1024 * 1024)
+    content = png_bytes()
+    cache.put("base1-4.large", content, "png")
+    open_image = image_cache.open_image
+
+    async def evicting_open(*args):
+        # Another request evicts the file once it is open but before it is sent
+        image, f = await open_image(*args)
+        os.remove(image.path)
+        return image, f
+
+    with patch("image_cache.get_image_cache", return_value=cache), \
+         patch("image_cache.open_image", evicting_open):
+        response = client.get("/api/images/base1-4", params={"size": "large"})
+
+    assert response.status_code == 200
+    assert response.content == content
+
+def test_matching_etags_are_answered_without_opening_the_image(tmp_path):
+    app = FastAPI()
+    app.include_router(image_cache.router, prefix="/api/images")
+    client = TestClient(app)
+    cache = ImageCache(str(tmp_path), 10 * 1024 * 1024)
+    image = cache.put("base1-4.thumb", png_bytes(), "png")
+    open_image = AsyncMock()
+
+    with patch("image_cache.get_image_cache", return_value=cache), patch("image_cache.open_image", open_image):
+        response = client.get("/api/images/base1-4", headers={"If-None-Match": image.etag})
+
+    assert response.status_code == 304
+    assert response.headers["etag"] == image.etag
+    open_image.assert_not_awaited()
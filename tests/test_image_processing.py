@@ -0,0 +1,74 @@
+import io
+import numpy as np
+import pytest
+from unittest.mock import patch, MagicMock
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+from PIL import Image, ImageDraw, ImageEnhance
+
+import image_processing
+from image_processing import HashIndex, compute_phash, recognize_card, process_card_images
+
+def make_card_image(seed):
+    """A synthetic card: random coloured blocks on a white background."""
+    rng = np.random.default_rng(seed)
+    image = Image.new("RGB", (245, 342), "white")
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = rng.integers(0, 200), rng.integers(0, 300)
+        draw.rectangle([x, y, x + rng.integers(20, 80), y + rng.integers(20, 80)], fill=tuple(int(v) for v in rng.integers(0, 255, 3)))
+    return image
+
+def to_bytes(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=80)
+    return buffer.getvalue()
+
+@pytest.fixture
+def index():
+    card_ids = [f"base1-{number}" for number in range(50)]
+    hashes = np.array([compute_phash(make_card_image(number)) for number in range(50)], dtype=np.uint64)
+    return HashIndex(card_ids, hashes)
+
+def test_nearest_finds_exact_card(index):
+    """A resized, brightened photo of a card still maps to the right id."""
+    photo = ImageEnhance.Brightness(make_card_image(17).resize((490, 684))).enhance(1.2)
+    (card_id, distance), = index.nearest(compute_phash(photo))
+    assert card_id == "base1-17"
+    assert distance <= 12
+
+def test_index_round_trips_through_disk(index, tmp_path):
+    path = str(tmp_path / "hashes.npz")
+    index.save(path)
+    loaded = HashIndex.load(path)
+    assert loaded.card_ids == index.card_ids
+    assert np.array_equal(loaded.hashes, index.hashes)
+
+def test_recognize_card_returns_card_id(index):
+    settings = MagicMock(CARD_MATCH_MAX_DISTANCE=12)
+    with patch.object(image_processing, "_hash_index", index), \
+         patch("image_processing.get_settings", return_value=settings):
+        result = recognize_card(to_bytes(make_card_image(3)))
+        garbage = recognize_card(b"not an image")
+
+    assert result["success"] is True
+    assert result["card_id"] == "base1-3"
+    assert garbage["success"] is False
+
+def test_process_card_images_keeps_upload_order(index):
+    settings = MagicMock(CARD_MATCH_MAX_DISTANCE=12)
+    class Upload:
+        def __init__(self, data):
+            self.data = data
+
+        async def read(self):
+            return self.data
+
+    uploads = [Upload(to_bytes(make_card_image(n))) for n in (5, 9)] + [Upload(b"not an image")]
+    with patch.object(image_processing, "_hash_index", index), \
+         patch("image_processing.get_settings", return_value=settings), \
+         patch("image_processing.get_process_pool", return_value=ThreadPoolExecutor(max_workers=2)):
+        results = asyncio.run(process_card_images(uploads))
+
+    assert [result.get("card_id") for result in results] == ["base1-5", "base1-9", None]
+    assert results[2]["success"] is False
@@ -0,0 +1,118 @@
+import asyncio
+import pytest
+
+from jobs import JobManager
+
+async def wait_for_status(manager, job_id, status):
+    for _ in range(100):
+        if manager.get(job_id).status == status:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"Job never reached status {status}")
+
+def test_job_runs_and_reports_progress():
+    """Submitted jobs run on the workers and expose their progress and result."""
+    async def handler(job):
+        job.progress.total = 2
+        job.progress.processed = 2
+        job.progress.created = 2
+        return {"created": 2}
+
+    async def run():
+        manager = JobManager(workers=1)
+        manager.register("report", handler)
+        job = manager.submit("report", {"query": "Pikachu"})
+        await wait_for_status(manager, job.job_id, "completed")
+        await manager.shutdown(timeout=1)
+        return manager.get(job.job_id)
+
+    job = asyncio.run(run())
+    assert job.result == {"created": 2}
+    assert job.progress.created == 2
+    assert job.finished_at is not None
+
+def test_failed_jobs_record_errors():
+    """Handler exceptions mark the job failed with the error message."""
+    async def handler(job):
+        raise RuntimeError("No cards found")
+
+    async def run():
+        manager = JobManager(workers=1)
+        manager.register("report", handler)
+        job = manager.submit("report", {})
+        await wait_for_status(manager, job.job_id, "failed")
+        await manager.shutdown(timeout=1)
+        return manager.get(job.job_id)
+
+    assert asyncio.run(run()).errors == ["No cards found"]
+
+def test_interrupted_jobs_resume_after_restart(tmp_path):
+    """Jobs still running at shutdown are persisted and resumed from their checkpoint."""
+    state_path = str(tmp_path / "jobs.json")
+    started = []
+
+    async def slow_handler(job):
+        started.append(dict(job.checkpoint))
+        job.checkpoint["done"] = ["card-1"]
+        await asyncio.sleep(10)
+
+    async def first_run():
+        manager = JobManager(workers=1, state_path=state_path)
+        manager.register("report", slow_handler)
+        job = manager.submit("report", {})
+        await wait_for_status(manager, job.job_id, "running")
+        await manager.shutdown(timeout=0.01)
+        return job.job_id
+
+    async def resume_handler(job):
+        started.append(dict(job.checkpoint))
+        return {}
+
+    async def second_run(job_id):
+        manager = JobManager(workers=1, state_path=state_path)
+        manager.register("report", resume_handler)
+        manager.start()
+        await wait_for_status(manager, job_id, "completed")
+        await manager.shutdown(timeout=1)
+
+    job_id = asyncio.run(first_run())
+    asyncio.run(second_run(job_id))
+    assert started == [{}, {"done": ["card-1"]}]
+
+def test_each_process_resumes_its_own_state_file(tmp_path):
+    """Managers sharing a state path save to separate files and each resumes only its own jobs."""
+    state_path = str(tmp_path / "jobs.json")
+
+    async def slow_handler(job):
+        await asyncio.sleep(10)
+
+    async def first_run():
+        managers = [JobManager(workers=1, state_path=state_path) for _ in range(2)]
+        job_ids = []
+        for manager in managers:
+            manager.register("report", slow_handler)
+            job_ids.append(manager.submit("report", {}).job_id)
+        for manager, job_id in zip(managers, job_ids):
+            await wait_for_status(manager, job_id, "running")
+        for manager in managers:
+            await manager.shutdown(timeout=0.01)
+        return job_ids
+
+    async def second_run():
+        manager = JobManager(workers=1, state_path=state_path)
+        manager.register("report", slow_handler)
+        manager.start()
+        job_ids = list(manager.jobs)
+        await manager.shutdown(timeout=0.01)
+        return job_ids
+
+    first, second = asyncio.run(first_run())
+    assert (tmp_path / "jobs.json").exists() and (tmp_path / "jobs.1.json").exists()
+    assert asyncio.run(second_run()) == [first]
+
+def test_submit_rejects_unknown_kinds():
+    async def run():
+        JobManager(workers=1).submit("unknown", {})
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
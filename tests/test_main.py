@@ -1,7 +1,8 @@
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 import os
+import json
 from datetime import datetime
 
 # Mock settings before importing main
@@ -10,6 +11,30 @@ mock_settings.NOTION_TOKEN = "test_notion_token"
 mock_settings.NOTION_DATABASE_ID = "test_database_id"
 mock_settings.POKEMON_TCG_API_KEY = "test_api_key"
 mock_settings.CORS_ORIGINS = ["*"]
+mock_settings.NOTION_RATE_LIMIT_PER_SECOND = 3.0
+mock_settings.NOTION_WRITE_CONCURRENCY = 4
+mock_settings.NOTION_MAX_RETRIES = 5
+mock_settings.POKEMON_TCG_RATE_LIMIT_PER_SECOND = 20.0
+mock_settings.POKEMON_TCG_MAX_RETRIES = 3
+mock_settings.UPSTREAM_BACKOFF_BASE_SECONDS = 0.5
+mock_settings.UPSTREAM_BACKOFF_MAX_SECONDS = 30.0
+mock_settings.UPSTREAM_CIRCUIT_FAILURE_THRESHOLD = 5
+mock_settings.UPSTREAM_CIRCUIT_RESET_SECONDS = 30.0
+mock_settings.JOB_WORKERS = 1
+mock_settings.JOB_STATE_PATH = None
+mock_settings.NOTION_SCHEMA_CACHE_PATH = None
+mock_settings.NOTION_SCHEMA_CACHE_TTL_HOURS = 24.0
+mock_settings.UPLOAD_BATCH_MAX_FILES = 100
+mock_settings.IMPORT_UPLOAD_PATH = None
+mock_settings.IMPORT_BATCH_ROWS = 500
+mock_settings.PRICE_REFRESH_INTERVAL_HOURS = 0
+mock_settings.COLLECTION_REPLICA_PATH = None
+mock_settings.COLLECTION_REPLICA_SYNC_SECONDS = 0
+mock_settings.IMAGE_CACHE_PATH = None
+mock_settings.IMAGE_CACHE_MAX_MB = 500.0
+mock_settings.IMAGE_THUMBNAIL_WIDTH = 200
+mock_settings.SHARED_CACHE_PATH = None
+mock_settings.PRICE_HISTORY_PATH = None
 
 with patch("config.get_settings", return_value=mock_settings):
     from main import app
@@ -93,7 +118,7 @@ def test_search_card_not_found(mock_search_card):
     assert data["success"] is False
     assert "No cards found" in data["message"]
 
-@patch('image_processing.process_card_image')
+@patch('card_processing.process_card_image')
 @patch('pokemon_tcg_api.PokemonTCGAPI.search_card')
 def test_upload_card(mock_search_card, mock_process_image):
     """Test card image upload endpoint."""
@@ -147,6 +172,7 @@ def test_create_card_report():
     """Test the card report creation endpoint."""
     # Mock the create_card_report method
     with patch("notion_integration.NotionIntegration.create_card_report") as mock_create_report, \
+         patch("notion_integration.NotionIntegration.ensure_card_index"), \
          patch("notion_integration.NotionIntegration.check_existing_card") as mock_check_exists, \
          patch("pokemon_tcg_api.PokemonTCGAPI.search_card") as mock_search:
         
@@ -182,4 +208,246 @@ def test_create_card_report():
         mock_create_report.assert_called_once()
         call_args = mock_create_report.call_args[0]
         assert call_args[0]["name"] == "Test Card"
-        assert call_args[0]["group_id"] == "TO-BE-CHECKED" 
\ No newline at end of file
+        assert call_args[0]["group_id"] == "TO-BE-CHECKED" 
+
+def test_create_card_report_upsert():
+    """Upsert reports update existing pages only when a field changed and create the rest."""
+    today = datetime.now().date().isoformat()
+    cards = [{
+        "id": card_id,
+        "name": card_id,
+        "set": {"name": "Test Set"},
+        "rarity": "Common",
+        "number": "1",
+        "market_price": 1.0,
+        "images": {"large": "https://example.com/image.jpg"}
+    } for card_id in ("seen-card", "other-group-card", "new-card")]
+    pages = {
+        "seen-card": ("page-1", {"quantity": 1, "last_seen": today, "group_id": "BINDER"}),
+        "other-group-card": ("page-2", {"quantity": 2, "last_seen": "2024-01-01", "group_id": "OLD"})
+    }
+
+    with patch("notion_integration.NotionIntegration.get_card_page", side_effect=pages.get), \
+         patch("notion_integration.NotionIntegration.check_existing_card") as mock_check_exists, \
+         patch("notion_integration.NotionIntegration.update_card_page") as mock_update, \
+         patch("notion_integration.NotionIntegration.create_card_report", return_value="page-3") as mock_create, \
+         patch("pokemon_tcg_api.PokemonTCGAPI.search_card", return_value=cards):
+        response = client.post("/api/cards/report?query=Test&set_id=test-set&group_id=BINDER&upsert=true")
+
+    data = response.json()
+    assert data["success"] is True
+    assert {result["card_id"]: result["action"] for result in data["results"]} == {
+        "seen-card": "unchanged", "other-group-card": "updated", "new-card": "created"
+    }
+    mock_update.assert_called_once_with("page-2", {"last_seen": today, "group_id": "BINDER", "groups": "OLD, BINDER", "quantity": 3}, raise_errors=True)
+    assert mock_create.call_args[0][0]["card_id"] == "new-card"
+    mock_check_exists.assert_not_called()
+
+def test_create_card_report_async_mode():
+    """Async mode queues a job and returns its id immediately."""
+    with patch("card_processing.job_manager.submit") as mock_submit:
+        mock_submit.return_value.job_id = "test-job-id"
+        response = client.post("/api/cards/report?query=Test&set_id=test-set&group_id=TO-BE-CHECKED&async_mode=true")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["success"] is True
+    assert data["job_id"] == "test-job-id"
+    assert mock_submit.call_args[0][1]["group_id"] == "TO-BE-CHECKED"
+    assert mock_submit.call_args[0][1]["upsert"] is False
+
+def test_resumed_report_job_does_not_double_count():
+    """A resumed report rebuilds its repeated and failed counts instead of adding to them."""
+    import asyncio
+    from card_processing import run_card_report
+    from schemas import JobStatus
+
+    cards = [
+        {"id": card_id, "name": "Test Card", "set": {"name": "Test Set"}, "rarity": "Common", "number": "1",
+         "market_price": 1.0, "images": {"large": "https://example.com/image.jpg"}}
+        for card_id in ("written-card", "retried-card")
+    ]
+    job = JobStatus(
+        job_id="report-job", kind="report", created_at=datetime.now(),
+        errors=["retried-card: timeout"],
+        checkpoint={"written_card_ids": ["written-card"], "repeated_card_ids": ["written-card"]}
+    )
+    job.progress.repeated = 2
+    job.progress.failed = 1
+
+    with patch("notion_integration.NotionIntegration.ensure_card_index"), \
+         patch("notion_integration.NotionIntegration.check_existing_card", return_value=True), \
+         patch("notion_integration.NotionIntegration.create_card_report", return_value="page-2"), \
+         patch("pokemon_tcg_api.PokemonTCGAPI.search_card", return_value=cards):
+        asyncio.run(run_card_report("Test", "test-set", "BINDER", job=job))
+
+    assert job.progress.processed == 2
+    assert job.progress.repeated == 2
+    assert job.progress.failed == 0
+    assert job.errors == []
+    assert job.checkpoint["repeated_card_ids"] == ["written-card", "retried-card"]
+
+def test_import_cards_queues_job():
+    """Imports are copied to disk and queued; unsupported files are rejected."""
+    with patch("card_processing.job_manager.submit") as mock_submit:
+        mock_submit.return_value.job_id = "import-job-id"
+        response = client.post(
+            "/api/cards/import?group_id=MIGRATION&upsert=true",
+            files={"file": ("collection.csv", b"card_id\nbase1-4\n", "text/csv")}
+        )
+        rejected = client.post("/api/cards/import?group_id=MIGRATION", files={"file": ("collection.xlsx", b"", "application/octet-stream")})
+
+    assert response.json()["job_id"] == "import-job-id"
+    params = mock_submit.call_args[0][1]
+    assert params["format"] == "csv" and params["upsert"] is True
+    with open(params["path"]) as f:
+        assert f.read() == "card_id\nbase1-4\n"
+    os.remove(params["path"])
+    assert rejected.json()["success"] is False
+    assert mock_submit.call_count == 1
+
+def test_get_unknown_job():
+    """Unknown job ids return 404."""
+    response = client.get("/api/cards/jobs/does-not-exist")
+    assert response.status_code == 404
+
+def test_search_card_stream():
+    """Streaming search emits one NDJSON line per card across pages."""
+    async def fake_pages(self, query, set_id=None, page_size=250):
+        for number in range(2):
+            yield [{
+                "id": f"test-id-{number}",
+                "name": "Charizard",
+                "set": {"name": "Base Set", "id": "base1"},
+                "rarity": "Rare",
+                "number": str(number),
+                "market_price": 100.0,
+                "images": {"large": f"https://example.com/charizard{number}.jpg"}
+            }]
+
+    with patch("pokemon_tcg_api.PokemonTCGAPI.iter_search_pages", new=fake_pages):
+        response = client.get("/api/cards/search", params={"query": "Charizard", "stream": "true"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["card_id"] for line in lines] == ["test-id-0", "test-id-1"]
+
+@patch('card_processing.process_card_image')
+@patch('pokemon_tcg_api.PokemonTCGAPI.get_card')
+def test_upload_card_recognized_by_id(mock_get_card, mock_process_image):
+    """Recognized images are resolved by exact card id without a name search."""
+    mock_process_image.return_value = {"success": True, "card_id": "base1-4", "distance": 3}
+    mock_get_card.return_value = {
+        "id": "base1-4",
+        "name": "Charizard",
+        "set": {"name": "Base Set", "id": "base1"},
+        "rarity": "Rare Holo",
+        "number": "4",
+        "market_price": 300.0,
+        "images": {"large": "https://example.com/charizard.jpg"}
+    }
+
+    response = client.post("/api/cards/upload", files={"file": ("card.jpg", b"image", "image/jpeg")})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["success"] is True
+    assert [card["card_id"] for card in data["cards"]] == ["base1-4"]
+    mock_get_card.assert_awaited_once_with("base1-4")
+
+@patch('card_processing.process_card_images')
+@patch('pokemon_tcg_api.PokemonTCGAPI.get_cards')
+def test_upload_cards_batch(mock_get_cards, mock_process_images):
+    """Batch uploads dedupe recognized ids into one lookup and report each image."""
+    mock_process_images.return_value = [
+        {"success": True, "card_id": "base1-4", "distance": 2},
+        {"success": False, "error": "No matching card found"},
+        {"success": True, "card_id": "base1-4", "distance": 5}
+    ]
+    mock_get_cards.return_value = {
+        "base1-4": {
+            "id": "base1-4",
+            "name": "Charizard",
+            "set": {"name": "Base Set", "id": "base1"},
+            "rarity": "Rare Holo",
+            "number": "4",
+            "market_price": 300.0,
+            "images": {"large": "https://example.com/charizard.jpg"}
+        }
+    }
+
+    files = [("files", (f"card{i}.jpg", b"image", "image/jpeg")) for i in range(3)]
+    response = client.post("/api/cards/upload/batch", files=files)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["success"] is True
+    assert [card["card_id"] for card in data["cards"]] == ["base1-4"]
+    assert [image["success"] for image in data["images"]] == [True, False, True]
+    assert data["images"][1]["filename"] == "card1.jpg"
+    mock_get_cards.assert_awaited_once_with(["base1-4"])
+
+@patch('collection.get_replica')
+def test_count_collection_reads_replica(mock_get_replica):
+    """Collection counts are answered from the local replica."""
+    replica = MagicMock()
+    replica.is_synced.return_value = True
+    replica.count.return_value = (3, {"Base Set": 2, "Obsidian Flames": 1})
+    mock_get_replica.return_value = replica
+
+    response = client.get("/api/collection/count?repeated=true&group_by=set")
+
+    assert response.status_code == 200
+    assert response.json()["groups"] == {"Base Set": 2, "Obsidian Flames": 1}
+    filters, group_by = replica.count.call_args.args
+    assert filters["repeated"] is True
+    assert group_by == "set"
+
+def test_metrics_and_server_timing():
+    """Responses carry a Server-Timing header and are counted on /metrics by route."""
+    response = client.get("/health")
+    assert "total;dur=" in response.headers["server-timing"]
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert 'http_requests_total{method="GET",route="/health",status="200"}' in response.text
+
+def test_autocomplete_uses_name_index():
+    """Suggestions come from the in-memory index, not the Pokemon TCG API."""
+    typeahead = MagicMock()
+    typeahead.ready = AsyncMock(return_value=True)
+    typeahead.suggest.return_value = ([{"text": "Pikachu", "popularity": 120}], [])
+
+    with patch("card_processing.typeahead", typeahead), \
+         patch("pokemon_tcg_api.PokemonTCGAPI.search_card") as mock_search_card:
+        response = client.get("/api/cards/autocomplete", params={"q": "pika", "limit": 5})
+
+    assert response.status_code == 200
+    assert response.json()["names"] == [{"text": "Pikachu", "set_id": None, "popularity": 120}]
+    typeahead.suggest.assert_called_once_with("pika", 5)
+    mock_search_card.assert_not_called()
+
+def test_trusted_card_response_matches_validated_shape():
+    """The serialization fast path emits the same JSON as validating through CardResponse."""
+    from card_processing import CardBase, CardResponse, transform_card_data_for_notion, trusted_card, trusted_card_response
+
+    card = {
+        "id": "base1-4",
+        "name": "Charizard",
+        "set": {"name": "Base Set", "id": "base1"},
+        "rarity": "Rare Holo",
+        "number": "4",
+        "market_price": 300.0,
+        "images": {"large": "https://images.pokemontcg.io/base1/4_hires.png"}
+    }
+    validated = CardResponse(
+        success=True,
+        message="Cards found successfully",
+        cards=[CardBase(**transform_card_data_for_notion(card))],
+        page=1,
+        page_size=50
+    ).model_dump(mode="json")
+    fast = trusted_card_response(success=True, message="Cards found successfully", cards=[trusted_card(card)], page=1, page_size=50)
+
+    assert json.loads(fast.body) == validated
@@ -0,0 +1,47 @@
+import asyncio
+
+import httpx
+import pytest
+
+from metrics import UPSTREAM_REQUESTS, Histogram, render_metrics, start_request_timings, track_upstream
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Test latency.", buckets=(0.1, 1.0))
+    labels = (("service", "tcg"),)
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(labels, value)
+
+    lines = histogram.render()
+    assert 'latency_seconds_bucket{service="tcg",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{service="tcg",le="1"} 3' in lines
+    assert 'latency_seconds_bucket{service="tcg",le="+Inf"} 4' in lines
+    assert 'latency_seconds_count{service="tcg"} 4' in lines
+
+def test_track_upstream_counts_rate_limits():
+    request = httpx.Request("GET", "https://api.pokemontcg.io/v2/cards")
+    response = httpx.Response(429, request=request)
+    with pytest.raises(httpx.HTTPStatusError):
+        with track_upstream("tcg", "test_rate_limit"):
+            response.raise_for_status()
+
+    labels = (("service", "tcg"), ("operation", "test_rate_limit"), ("status", "rate_limited"))
+    assert UPSTREAM_REQUESTS._values[labels] == 1
+    assert 'upstream_request_duration_seconds_count{service="tcg",operation="test_rate_limit"} 1' in render_metrics()
+
+def test_request_timings_include_worker_threads():
+    def notion_call():
+        with track_upstream("notion", "query"):
+            pass
+
+    async def handle_request():
+        timings = start_request_timings()
+        await asyncio.gather(asyncio.to_thread(notion_call), asyncio.to_thread(notion_call))
+        with track_upstream("tcg", "search"):
+            await asyncio.sleep(0)
+        return timings
+
+    timings = asyncio.run(handle_request())
+    assert timings.phases["notion_query"][1] == 2
+    header = timings.server_timing(0.25)
+    assert 'notion_query;desc="2 calls";dur=' in header
+    assert header.endswith("total;dur=250.0")
@@ -0,0 +1,163 @@
+import pytest
+from unittest.mock import patch, MagicMock
+
+from cache import SharedCache
+from notion_integration import NotionIntegration, REQUIRED_PROPERTIES
+
+mock_settings = MagicMock()
+mock_settings.NOTION_TOKEN = "test_notion_token"
+mock_settings.NOTION_DATABASE_ID = "test_database_id"
+mock_settings.NOTION_CARD_INDEX_RECONCILE_SECONDS = 300.0
+mock_settings.NOTION_SCHEMA_CACHE_PATH = None
+mock_settings.NOTION_SCHEMA_CACHE_TTL_HOURS = 24.0
+mock_settings.SHARED_CACHE_PATH = None
+
+def make_page(page_id, card_id):
+    return {
+        "id": page_id,
+        "properties": {"Card ID": {"rich_text": [{"plain_text": card_id}]}}
+    }
+
+@pytest.fixture
+def notion():
+    with patch("notion_integration.get_settings", return_value=mock_settings), \
+         patch("notion_integration.Client"):
+        yield NotionIntegration()
+
+def test_constructor_makes_no_network_calls(notion):
+    """Creating the integration is cheap; verification only happens when asked for."""
+    notion.client.databases.retrieve.assert_not_called()
+
+def test_verified_schema_is_cached_on_disk(tmp_path):
+    """A fresh on-disk schema for the same database skips the retrieve call."""
+    settings = MagicMock(
+        NOTION_DATABASE_ID="test_database_id",
+        NOTION_SCHEMA_CACHE_PATH=str(tmp_path / "schema.json"),
+        NOTION_SCHEMA_CACHE_TTL_HOURS=24.0,
+        SHARED_CACHE_PATH=None
+    )
+    database = {
+        "title": [{"text": {"content": "Cards"}}],
+        "properties": {name: {"type": prop_type} for name, prop_type in REQUIRED_PROPERTIES.items()}
+    }
+    with patch("notion_integration.get_settings", return_value=settings), \
+         patch("notion_integration.Client") as mock_client:
+        mock_client.return_value.databases.retrieve.return_value = database
+        NotionIntegration().verify_database()
+        NotionIntegration().verify_database()
+
+        other = MagicMock(
+            NOTION_DATABASE_ID="other_database_id",
+            NOTION_SCHEMA_CACHE_PATH=settings.NOTION_SCHEMA_CACHE_PATH,
+            NOTION_SCHEMA_CACHE_TTL_HOURS=24.0,
+            SHARED_CACHE_PATH=None
+        )
+        with patch("notion_integration.get_settings", return_value=other):
+            NotionIntegration().verify_database()
+
+    assert mock_client.return_value.databases.retrieve.call_count == 2
+
+def test_check_existing_card_uses_index(notion):
+    """The Card ID index is loaded once with paginated queries and then answers locally."""
+    notion.client.databases.query.side_effect = [
+        {"results": [make_page("page-1", "base1-4")], "has_more": True, "next_cursor": "cursor-1"},
+        {"results": [make_page("page-2", "sv3-1")], "has_more": False}
+    ]
+
+    assert notion.check_existing_card("base1-4") is True
+    assert notion.check_existing_card("sv3-1") is True
+    assert notion.check_existing_card("base1-58") is False
+    assert notion.client.databases.query.call_count == 2
+    assert notion.client.databases.query.call_args.kwargs["start_cursor"] == "cursor-1"
+
+def test_created_pages_are_added_to_index(notion):
+    """Pages created by this process are visible without another query."""
+    notion.client.databases.query.return_value = {"results": [], "has_more": False}
+    notion.client.pages.create.return_value = {"id": "page-3"}
+    notion.check_existing_card("base1-58")
+
+    notion.create_card_report({
+        "name": "Pikachu",
+        "collection": "Base Set",
+        "rarity": "Common",
+        "market_price": 1.0,
+        "image_url": "https://example.com/pikachu.jpg",
+        "variant_number": "58",
+        "card_id": "base1-58"
+    })
+
+    assert notion.check_existing_card("base1-58") is True
+    assert notion.client.databases.query.call_count == 1
+
+def test_reconcile_picks_up_edited_pages(notion):
+    """Due reconciles only query pages edited since the last sync."""
+    notion.client.databases.query.return_value = {"results": [], "has_more": False}
+    notion.check_existing_card("base1-4")
+
+    notion.client.databases.query.return_value = {"results": [make_page("page-4", "base1-4")], "has_more": False}
+    notion._card_index_reconciled_at -= 600
+
+    assert notion.check_existing_card("base1-4") is True
+    query_filter = notion.client.databases.query.call_args.kwargs["filter"]
+    assert query_filter["timestamp"] == "last_edited_time"
+
+def test_update_market_price_keeps_indexed_price_current(notion):
+    """Indexed pages carry their stored price, which updates follow."""
+    page = make_page("page-1", "base1-4")
+    page["properties"]["Market Price"] = {"number": 250.0}
+    notion.client.databases.query.return_value = {"results": [page], "has_more": False}
+
+    assert notion.get_card_pages() == [("page-1", "base1-4", 250.0)]
+    assert notion.update_market_price("page-1", 310.0) is True
+    assert notion.get_card_pages() == [("page-1", "base1-4", 310.0)]
+    notion.client.pages.update.assert_called_once_with(page_id="page-1", properties={"Market Price": {"number": 310.0}})
+
+def test_update_card_page_writes_only_given_fields(notion):
+    """Page updates send the changed properties in one request and keep the indexed fields current."""
+    page = make_page("page-1", "base1-4")
+    page["properties"]["Quantity"] = {"number": 1}
+    notion.client.databases.query.return_value = {"results": [page], "has_more": False}
+
+    assert notion.get_card_page("base1-4") == ("page-1", {"market_price": None, "quantity": 1, "last_seen": None, "group_id": "", "groups": ""})
+    assert notion.update_card_page("page-1", {"quantity": 2, "last_seen": "2024-05-01"}) is True
+
+    assert notion.client.pages.update.call_args.kwargs["properties"] == {
+        "Quantity": {"number": 2},
+        "Last Seen": {"date": {"start": "2024-05-01"}}
+    }
+    assert notion.get_card_page("base1-4")[1]["quantity"] == 2
+    assert notion.get_holdings() == {"base1-4": 2}
+    assert notion.get_card_page("base1-58") is None
+
+def test_card_index_is_shared_between_workers(tmp_path):
+    """A second worker starts from the index the first one loaded instead of querying every page."""
+    settings = MagicMock(
+        NOTION_DATABASE_ID="test_database_id",
+        NOTION_CARD_INDEX_RECONCILE_SECONDS=300.0,
+        NOTION_SCHEMA_CACHE_PATH=None,
+        SHARED_CACHE_PATH=str(tmp_path / "shared.db")
+    )
+    page = make_page("page-1", "base1-4")
+    page["properties"]["Market Price"] = {"number": 250.0}
+    with patch("notion_integration.get_settings", return_value=settings), \
+         patch("notion_integration.Client") as first_client:
+        first_client.return_value.databases.query.return_value = {"results": [page], "has_more": False}
+        first = NotionIntegration()
+        assert first.check_existing_card("base1-4") is True
+
+    with patch("notion_integration.get_settings", return_value=settings), \
+         patch("notion_integration.Client") as second_client:
+        second = NotionIntegration()
+        assert second.get_card_pages() == [("page-1", "base1-4", 250.0)]
+        second_client.return_value.databases.query.assert_not_called()
+        assert second._card_index_watermark == first._card_index_watermark
+
+    # Snapshots published in the old format are not adopted
+    old_snapshot = {"watermark": first._card_index_watermark.isoformat(), "loaded_age": 0.0, "pages": [["page-9", "sv3-1", {}]]}
+    SharedCache(settings.SHARED_CACHE_PATH).set_many("notion_card_index", [("other_database_id", old_snapshot)], 3600)
+    settings.NOTION_DATABASE_ID = "other_database_id"
+    with patch("notion_integration.get_settings", return_value=settings), \
+         patch("notion_integration.Client") as third_client:
+        third_client.return_value.databases.query.return_value = {"results": [], "has_more": False}
+        assert NotionIntegration().check_existing_card("sv3-1") is False
+        third_client.return_value.databases.query.assert_called_once()
@@ -0,0 +1,74 @@
+import asyncio
+from datetime import datetime
+import httpx
+import pytest
+from unittest.mock import patch, MagicMock
+from notion_client.errors import HTTPResponseError
+
+from notion_writer import NotionBatchWriter, upsert_changes
+
+mock_settings = MagicMock()
+mock_settings.NOTION_WRITE_CONCURRENCY = 4
+
+def make_card(card_id):
+    return {"card_id": card_id, "name": card_id}
+
+@pytest.fixture
+def notion():
+    return MagicMock()
+
+@pytest.fixture
+def writer(notion):
+    with patch("notion_writer.get_settings", return_value=mock_settings):
+        yield NotionBatchWriter(notion)
+
+def test_write_cards_reports_per_card_results(writer, notion):
+    """Each card gets its own success or failure result, in input order."""
+    notion.create_card_report.side_effect = lambda card, **kwargs: None if card["card_id"] == "bad" else f"page-{card['card_id']}"
+
+    results = asyncio.run(writer.write_cards([make_card("a"), make_card("bad"), make_card("b")], group_id="g"))
+
+    assert [result["success"] for result in results] == [True, False, True]
+    assert results[0]["page_id"] == "page-a"
+    assert results[1]["error"]
+    assert notion.create_card_report.call_args.kwargs["group_id"] == "g"
+
+def test_write_cards_reports_raised_errors(writer, notion):
+    """Errors left after the Notion call layer's retries fail only their own card."""
+    def create(card, **kwargs):
+        if card["card_id"] == "a":
+            raise HTTPResponseError(httpx.Response(429))
+        return "page-b"
+    notion.create_card_report.side_effect = create
+
+    results = asyncio.run(writer.write_cards([make_card("a"), make_card("b")]))
+
+    assert [result["success"] for result in results] == [False, True]
+    assert "429" in results[0]["error"]
+
+def test_upsert_cards_only_writes_changed_pages(writer, notion):
+    """Existing pages are updated only when a field changed; unchanged ones cost no request."""
+    today = datetime.now().date().isoformat()
+    notion.get_card_page.side_effect = {
+        "a": ("page-a", {"quantity": 1, "last_seen": today, "group_id": "g"}),
+        "b": ("page-b", {"quantity": 1, "last_seen": today, "group_id": "old"})
+    }.get
+    notion.create_card_report.return_value = "page-c"
+
+    results = asyncio.run(writer.upsert_cards([make_card("a"), make_card("b"), make_card("c")], group_id="g"))
+
+    assert [result["action"] for result in results] == ["unchanged", "updated", "created"]
+    notion.update_card_page.assert_called_once_with("page-b", {"group_id": "g", "groups": "old, g", "quantity": 2}, raise_errors=True)
+    notion.create_card_report.assert_called_once()
+
+def test_alternating_groups_count_each_group_once():
+    """Reports alternating between two groups add one copy per group, not one per report."""
+    today = datetime.now().date().isoformat()
+    fields = {"quantity": 1, "last_seen": today, "group_id": "binder"}
+
+    for group_id in ("box", "binder", "box", "binder"):
+        fields.update(upsert_changes(fields, group_id, today))
+
+    assert fields["quantity"] == 2
+    assert fields["groups"] == "binder, box"
+    assert upsert_changes(fields, "box", today) == {}
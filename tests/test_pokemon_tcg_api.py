@@ -0,0 +1,194 @@
+import asyncio
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+
+from catalog import CardCatalog, sync_catalog
+from pokemon_tcg_api import PokemonTCGAPI
+from price_history import PriceHistory
+
+mock_settings = MagicMock()
+mock_settings.POKEMON_TCG_API_KEY = "test_api_key"
+mock_settings.POKEMON_TCG_MAX_CONNECTIONS = 10
+mock_settings.POKEMON_TCG_MAX_KEEPALIVE_CONNECTIONS = 5
+mock_settings.POKEMON_TCG_KEEPALIVE_EXPIRY = 30.0
+mock_settings.POKEMON_TCG_TIMEOUT = 5.0
+mock_settings.POKEMON_TCG_CONNECT_TIMEOUT = 5.0
+mock_settings.CATALOG_PATH = None
+mock_settings.CATALOG_MAX_AGE_HOURS = 24.0
+mock_settings.CACHE_MAX_ENTRIES = 100
+mock_settings.CARD_CACHE_TTL_SECONDS = 3600.0
+mock_settings.PRICE_CACHE_TTL_SECONDS = 600.0
+mock_settings.CACHE_STALE_TTL_SECONDS = 3600.0
+mock_settings.SHARED_CACHE_PATH = None
+mock_settings.PRICE_HISTORY_PATH = None
+
+def make_card(card_id, prices=None):
+    card = {
+        "id": card_id,
+        "name": "Pikachu",
+        "set": {"name": "Base Set", "id": "base1"},
+        "rarity": "Common",
+        "number": card_id.split("-")[-1],
+        "images": {
+            "small": f"https://example.com/{card_id}.jpg",
+            "large": f"https://example.com/{card_id}_large.jpg"
+        }
+    }
+    if prices is not None:
+        card["cardmarket"] = {"prices": prices}
+    return card
+
+def make_response(cards):
+    return {"data": cards}
+
+@pytest.fixture
+def api():
+    with patch("pokemon_tcg_api.get_settings", return_value=mock_settings):
+        yield PokemonTCGAPI()
+
+def test_search_card_reads_prices_from_search_payload(api):
+    """Prices present in the search response need no extra lookups."""
+    cards = [
+        make_card("base1-58", {"averageSellPrice": 4.5}),
+        make_card("base1-60", {"trendPrice": 2.0})
+    ]
+    with patch.object(api, "_get", AsyncMock(return_value=make_response(cards))) as mock_get:
+        result = asyncio.run(api.search_card("Pikachu"))
+
+    assert mock_get.call_count == 1
+    assert [card["market_price"] for card in result] == [4.5, 2.0]
+
+def test_search_card_batches_missing_prices(api):
+    """Cards without price data are resolved with one batched lookup."""
+    cards = [
+        make_card("base1-58", {"averageSellPrice": 4.5}),
+        make_card("base1-60"),
+        make_card("base1-61")
+    ]
+    prices = [make_card("base1-60", {"averageSellPrice": 1.25})]
+    with patch.object(
+        api, "_get",
+        AsyncMock(side_effect=[make_response(cards), make_response(prices)])
+    ) as mock_get:
+        result = asyncio.run(api.search_card("Pikachu"))
+
+    assert mock_get.call_count == 2
+    batch_query = mock_get.call_args_list[1].kwargs["params"]["q"]
+    assert batch_query == 'id:"base1-60" OR id:"base1-61"'
+    assert [card["market_price"] for card in result] == [4.5, 1.25, 0.0]
+
+def test_live_prices_are_recorded_in_price_history(api):
+    """Prices fetched from the API become price points; unpriced cards do not."""
+    api.price_history = PriceHistory()
+    cards = [make_card("base1-58", {"averageSellPrice": 4.5}), make_card("base1-60"), make_card("base1-61")]
+    prices = [make_card("base1-60", {"averageSellPrice": 1.25})]
+    with patch.object(api, "_get", AsyncMock(side_effect=[make_response(cards), make_response(prices)])):
+        asyncio.run(api.search_card("Pikachu"))
+
+    assert api.price_history.card_ids == ["base1-58", "base1-60"]
+    assert api.price_history.prices_at(None).tolist() == [4.5, 1.25]
+
+def test_catalog_cards_are_priced_live_after_a_resync(api, tmp_path):
+    """Cards served from a re-synced, unchanged set get a live price, not their sync-time one."""
+    api.catalog = CardCatalog(str(tmp_path / "catalog.db"))
+    source = MagicMock()
+    source.get_sets = AsyncMock(return_value=[{"id": "base1", "name": "Base Set", "updatedAt": "2020/01/01"}])
+    source.get_set_cards = AsyncMock(return_value=[dict(make_card("base1-58"), market_price=100.0)])
+    asyncio.run(sync_catalog(source, api.catalog))
+    assert asyncio.run(sync_catalog(source, api.catalog))["updated_sets"] == 0
+
+    prices = [make_card("base1-58", {"averageSellPrice": 4.5})]
+    with patch.object(api, "_get", AsyncMock(return_value=make_response(prices))) as mock_get:
+        result = asyncio.run(api.search_card("Pikachu"))
+        card = asyncio.run(api.get_card("base1-58"))
+    api.catalog.close()
+
+    assert mock_get.call_count == 1
+    assert mock_get.call_args.kwargs["operation"] == "prices"
+    assert [card["market_price"] for card in result] == [4.5]
+    assert card["market_price"] == 4.5
+
+def test_get_card_market_prices_fans_out_batches(api):
+    """Large price lookups are split into concurrent batched queries."""
+    card_ids = [f"sv3-{number}" for number in range(120)]
+
+    async def fake_get(path, params=None, operation=None):
+        ids = [part.split('"')[1] for part in params["q"].split(" OR ")]
+        return make_response([make_card(card_id, {"averageSellPrice": 1.0}) for card_id in ids])
+
+    with patch.object(api, "_get", AsyncMock(side_effect=fake_get)) as mock_get:
+        prices = asyncio.run(api.get_card_market_prices(card_ids))
+
+    assert mock_get.call_count == 3
+    assert len(prices) == 120
+    assert set(prices.values()) == {1.0}
+
+def test_repeat_searches_are_served_from_cache(api):
+    """Equivalent queries share cached card metadata and prices."""
+    cards = [make_card("base1-4", {"averageSellPrice": 300.0})]
+    with patch.object(api, "_get", AsyncMock(return_value=make_response(cards))) as mock_get:
+        first = asyncio.run(api.search_card("Charizard"))
+        second = asyncio.run(api.search_card("  charizard "))
+
+    assert mock_get.call_count == 1
+    assert first == second
+    assert api.cache_stats()["search"]["hits"] == 1
+    assert api.cache_stats()["prices"]["hits"] == 2
+
+def test_search_card_passes_pagination_through(api):
+    """Page and page size are forwarded to the API and the total is reported."""
+    cards = [make_card("base1-58", {"averageSellPrice": 4.5})]
+    response = dict(make_response(cards), totalCount=120)
+    with patch.object(api, "_get", AsyncMock(return_value=response)) as mock_get:
+        result, total_count = asyncio.run(api.search_card_page("Pikachu", page=3, page_size=50))
+
+    params = mock_get.call_args.kwargs["params"]
+    assert (params["page"], params["pageSize"]) == (3, 50)
+    assert total_count == 120
+    assert len(result) == 1
+
+def test_iter_search_pages_walks_every_page(api):
+    """Pages are yielded one at a time until the total count is reached."""
+    async def fake_get(path, params=None, operation=None):
+        first = (params["page"] - 1) * 2
+        cards = [make_card(f"base1-{number}", {"averageSellPrice": 1.0}) for number in range(first, min(first + 2, 5))]
+        return dict(make_response(cards), totalCount=5)
+
+    async def collect():
+        return [[card["id"] for card in cards] async for cards in api.iter_search_pages("Pikachu", page_size=2)]
+
+    with patch.object(api, "_get", AsyncMock(side_effect=fake_get)) as mock_get:
+        pages = asyncio.run(collect())
+
+    assert pages == [["base1-0", "base1-1"], ["base1-2", "base1-3"], ["base1-4"]]
+    assert mock_get.call_count == 3
+
+def test_concurrent_identical_calls_share_one_request(api):
+    """Concurrent misses for the same search and prices are coalesced upstream."""
+    cards = [make_card("base1-4", {"averageSellPrice": 300.0})]
+
+    async def slow_get(path, params=None, operation=None):
+        await asyncio.sleep(0.01)
+        if path == "/cards" and params.get("select") == "id,cardmarket":
+            ids = [part.split('"')[1] for part in params["q"].split(" OR ")]
+            return make_response([make_card(card_id, {"averageSellPrice": 2.0}) for card_id in ids])
+        return make_response(cards)
+
+    async def run():
+        searches = await asyncio.gather(*(api.search_card(query) for query in ["Charizard", "charizard", " CHARIZARD"]))
+        prices = await asyncio.gather(
+            api.get_card_market_prices(["sv3-1", "sv3-2"]),
+            api.get_card_market_prices(["sv3-2", "sv3-3"])
+        )
+        return searches, prices
+
+    with patch.object(api, "_get", AsyncMock(side_effect=slow_get)) as mock_get:
+        searches, prices = asyncio.run(run())
+
+    assert searches[0] == searches[1] == searches[2]
+    assert prices[1] == {"sv3-2": 2.0, "sv3-3": 2.0}
+    # One search, then one price batch each for ["sv3-1", "sv3-2"] and ["sv3-3"]
+    assert mock_get.call_count == 3
+    stats = api.cache_stats()
+    assert stats["search_flights"]["coalesced"] == 2
+    assert stats["price_flights"]["coalesced"] == 1
@@ -0,0 +1,91 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import numpy as np
+
+from collection import seed_price_history, value_collection
+from price_history import PriceHistory
+
+def test_record_skips_unchanged_prices_and_round_trips(tmp_path):
+    history = PriceHistory(str(tmp_path))
+    assert history.record({"base1-4": 300.0, "base1-58": 1.0}, timestamp=100) == 2
+    assert history.record({"base1-4": 300.0, "base1-58": 1.5}, timestamp=200) == 1
+    assert len(history) == 3
+
+    loaded = PriceHistory(str(tmp_path))
+    assert loaded.card_ids == ["base1-4", "base1-58"]
+    assert np.array_equal(loaded.points, history.points)
+    # Loaded latest prices still suppress duplicate points
+    assert loaded.record({"base1-58": 1.5}, timestamp=300) == 0
+
+def test_instances_sharing_a_path_do_not_collide(tmp_path):
+    """Two processes appending to one history keep distinct indexes and see each other's points."""
+    first, second = PriceHistory(str(tmp_path)), PriceHistory(str(tmp_path))
+    first.record({"base1-4": 300.0}, timestamp=100)
+    second.record({"sv3-1": 2.0, "base1-4": 300.0}, timestamp=200)
+    first.record({"base1-58": 1.0}, timestamp=300)
+
+    assert second.record({"base1-4": 300.0}, timestamp=400) == 0
+    second.refresh()
+    for history in (first, second, PriceHistory(str(tmp_path))):
+        assert history.card_ids == ["base1-4", "sv3-1", "base1-58"]
+        assert history.prices_at(None).tolist() == [300.0, 2.0, 1.0]
+        assert history.points["timestamp"].tolist() == [100, 200, 300]
+
+def test_prices_at_returns_last_point_before_time():
+    history = PriceHistory()
+    history.record({"a-1": 1.0}, timestamp=100)
+    history.record({"a-1": 2.0, "b-1": 5.0}, timestamp=200)
+    history.record({"a-1": 3.0}, timestamp=300)
+
+    assert np.isnan(history.prices_at(50)).all()
+    assert history.prices_at(250).tolist() == [2.0, 5.0]
+    assert history.prices_at(None).tolist() == [3.0, 5.0]
+
+def test_value_collection_totals_sets_and_change():
+    history = PriceHistory()
+    start, end = datetime.fromtimestamp(1_000_000), datetime.fromtimestamp(2_000_000)
+    history.record({"base1-4": 300.0, "base1-58": 1.0, "sv3-1": 2.0}, timestamp=start.timestamp())
+    history.record({"base1-4": 350.0, "sv3-1": 1.0}, timestamp=end.timestamp())
+
+    result = value_collection(history, {"base1-4": 1, "base1-58": 2, "sv3-1": 1, "sv4-9": 1}, start, end)
+
+    assert result.value == 353.0
+    assert result.start_value == 304.0
+    assert result.change == 49.0
+    assert result.cards == 5
+    assert result.unpriced_cards == 1
+    assert [(s.set_id, s.cards, s.value, s.change) for s in result.sets] == [
+        ("base1", 3, 352.0, 50.0),
+        ("sv3", 1, 1.0, -1.0),
+        ("sv4", 1, 0.0, 0.0)
+    ]
+
+def test_value_collection_starts_cards_first_seen_mid_window_at_their_first_price():
+    history = PriceHistory()
+    start, end = datetime.fromtimestamp(1_000_000), datetime.fromtimestamp(2_000_000)
+    history.record({"base1-4": 300.0}, timestamp=start.timestamp())
+    history.record({"sv3-1": 20.0}, timestamp=1_500_000)
+    history.record({"sv3-1": 25.0}, timestamp=1_800_000)
+
+    result = value_collection(history, {"base1-4": 1, "sv3-1": 2}, start, end)
+
+    assert result.value == 350.0
+    assert result.start_value == 340.0
+    assert result.change == 10.0
+    assert [(s.set_id, s.start_value, s.change) for s in result.sets] == [("base1", 300.0, 0.0), ("sv3", 40.0, 10.0)]
+
+def test_value_collection_without_history():
+    result = value_collection(PriceHistory(), {"base1-4": 2}, datetime.fromtimestamp(0), datetime.now())
+    assert result.value == 0.0
+    assert result.unpriced_cards == 2
+
+def test_seed_price_history_adds_page_prices_of_cards_without_history():
+    history = PriceHistory()
+    history.record({"base1-4": 350.0}, timestamp=100)
+    notion = MagicMock()
+    notion.get_card_pages.return_value = [("page-1", "base1-4", 300.0), ("page-2", "sv3-1", 2.0), ("page-3", "sv4-9", None)]
+
+    assert seed_price_history(history, notion) == 1
+    assert history.card_ids == ["base1-4", "sv3-1"]
+    assert history.prices_at(None).tolist() == [350.0, 2.0]
@@ -0,0 +1,46 @@
+import asyncio
+from unittest.mock import patch, MagicMock, AsyncMock
+
+from notion_writer import NotionBatchWriter
+from price_refresh import card_set_id, price_changed, refresh_market_prices
+
+mock_settings = MagicMock()
+mock_settings.NOTION_WRITE_CONCURRENCY = 4
+mock_settings.PRICE_REFRESH_MIN_CHANGE = 0.05
+mock_settings.PRICE_REFRESH_MIN_CHANGE_PERCENT = 2.0
+
+def test_price_changed_uses_absolute_and_relative_thresholds():
+    assert price_changed(None, 1.0, 0.05, 2.0) is True
+    assert price_changed(0.0, 0.10, 0.05, 2.0) is True
+    assert price_changed(0.10, 0.12, 0.05, 2.0) is False  # 20% but only two cents
+    assert price_changed(300.0, 303.0, 0.05, 2.0) is False  # $3 but only 1%
+    assert price_changed(300.0, 310.0, 0.05, 2.0) is True
+
+def test_card_set_id():
+    assert card_set_id("base1-4") == "base1"
+    assert card_set_id("swsh12pt5-GG01") == "swsh12pt5"
+
+def test_refresh_fetches_each_set_once_and_updates_only_moved_prices():
+    notion = MagicMock()
+    notion.get_card_pages.return_value = [
+        ("page-1", "base1-4", 250.0),
+        ("page-2", "base1-4", 300.0),
+        ("page-3", "base1-58", 1.0),
+        ("page-4", "sv3-1", None)
+    ]
+    api = MagicMock()
+    api.get_set_market_prices = AsyncMock(side_effect=lambda set_id: {
+        "base1": {"base1-4": 300.0, "base1-58": 1.01},
+        "sv3": {}
+    }[set_id])
+
+    with patch("notion_writer.get_settings", return_value=mock_settings), \
+         patch("price_refresh.get_settings", return_value=mock_settings):
+        writer = NotionBatchWriter(notion)
+        result = asyncio.run(refresh_market_prices(api, writer, notion))
+
+    assert sorted(call.args[0] for call in api.get_set_market_prices.await_args_list) == ["base1", "sv3"]
+    notion.update_market_price.assert_called_once_with("page-1", 300.0, raise_errors=True)
+    assert result["changed"] == 1
+    assert result["updated"] == 1
+    assert result["pages"] == 4
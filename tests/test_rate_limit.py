@@ -0,0 +1,120 @@
+import asyncio
+
+import httpx
+import pytest
+from notion_client.errors import HTTPResponseError
+
+from rate_limit import CircuitOpenError, UpstreamService
+
+def make_service(max_retries=2, failure_threshold=5):
+    return UpstreamService("test", 100.0, max_retries, 0.001, 0.01, failure_threshold, 60.0)
+
+def status_error(status, headers=None):
+    request = httpx.Request("GET", "https://api.pokemontcg.io/v2/cards")
+    return httpx.HTTPStatusError("failed", request=request, response=httpx.Response(status, headers=headers, request=request))
+
+def test_rate_limited_calls_wait_and_slow_the_bucket():
+    """429s are retried after Retry-After and halve the shared rate."""
+    service = make_service()
+    outcomes = [HTTPResponseError(httpx.Response(429, headers={"Retry-After": "0.01"})), "page-a"]
+
+    def call():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert service.call_sync(call) == "page-a"
+    assert service.bucket.rate < service.bucket.max_rate
+
+def test_gives_up_after_max_retries():
+    """Persistent server errors are raised instead of retrying forever."""
+    service = make_service(max_retries=2)
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        raise status_error(503)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(service.call(call))
+    assert calls == 3
+
+def test_client_errors_are_not_retried():
+    service = make_service()
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        raise status_error(404)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(service.call(call))
+    assert calls == 1
+    assert not service.breaker.is_open
+
+def test_circuit_opens_after_repeated_failures():
+    """Once the breaker opens, calls fail fast without reaching the API."""
+    service = make_service(max_retries=0, failure_threshold=2)
+    calls = 0
+
+    def call():
+        nonlocal calls
+        calls += 1
+        raise httpx.ConnectError("connection refused")
+
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            service.call_sync(call)
+    with pytest.raises(CircuitOpenError):
+        service.call_sync(call)
+    assert calls == 2
+
+def test_half_open_probe_closes_the_circuit():
+    service = make_service(max_retries=0, failure_threshold=1)
+    service.breaker.reset_timeout = 0.0
+
+    with pytest.raises(httpx.ConnectError):
+        service.call_sync(lambda: (_ for _ in ()).throw(httpx.ConnectError("down")))
+    assert service.breaker.is_open
+
+    assert service.call_sync(lambda: "ok") == "ok"
+    assert not service.breaker.is_open
+
+def test_cancelled_probe_lets_the_next_call_probe():
+    service = make_service(max_retries=0, failure_threshold=1)
+    service.breaker.reset_timeout = 0.0
+
+    with pytest.raises(httpx.ConnectError):
+        service.call_sync(lambda: (_ for _ in ()).throw(httpx.ConnectError("down")))
+
+    async def run():
+        probe = asyncio.ensure_future(service.call(lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        return await service.call(lambda: asyncio.sleep(0, "ok"))
+
+    assert asyncio.run(run()) == "ok"
+    assert not service.breaker.is_open
+
+def test_non_idempotent_calls_are_only_retried_after_429():
+    """A create that failed mid-flight may have been applied, so only refused requests are sent again."""
+    service = make_service(max_retries=2)
+    outcomes = [HTTPResponseError(httpx.Response(429, headers={"Retry-After": "0.01"})), httpx.ReadTimeout("timed out"), "page-a"]
+    calls = 0
+
+    def call():
+        nonlocal calls
+        calls += 1
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    with pytest.raises(httpx.ReadTimeout):
+        service.call_sync(call, idempotent=False)
+    assert calls == 2
@@ -0,0 +1,63 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from replica import CollectionReplica, ensure_replica, sync_replica
+
+def make_page(page_id, card_id, set_name, rarity="Common", group_id="", repeated=False, archived=False):
+    return {
+        "id": page_id,
+        "archived": archived,
+        "last_edited_time": "2024-01-01T00:00:00.000Z",
+        "properties": {
+            "Name": {"type": "title", "title": [{"plain_text": card_id}]},
+            "Set": {"type": "rich_text", "rich_text": [{"plain_text": set_name}]},
+            "Rarity": {"type": "rich_text", "rich_text": [{"plain_text": rarity}]},
+            "Market Price": {"type": "number", "number": 1.5},
+            "Group ID": {"type": "rich_text", "rich_text": [{"plain_text": group_id}]},
+            "Created Date": {"type": "date", "date": {"start": f"2024-01-0{page_id[-1]}"}},
+            "Card ID": {"type": "rich_text", "rich_text": [{"plain_text": card_id}]},
+            "Repeated": {"type": "checkbox", "checkbox": repeated}
+        }
+    }
+
+@pytest.fixture
+def replica(tmp_path):
+    replica = CollectionReplica(str(tmp_path / "collection.db"))
+    yield replica
+    replica.close()
+
+def test_seed_then_filter_and_count(replica):
+    notion = MagicMock()
+    notion.query_all.return_value = iter([
+        make_page("page-1", "base1-4", "Base Set", rarity="Rare Holo", group_id="binder"),
+        make_page("page-2", "base1-58", "Base Set", group_id="binder", repeated=True),
+        make_page("page-3", "sv3-1", "Obsidian Flames")
+    ])
+    ensure_replica(notion, replica)
+    ensure_replica(notion, replica)
+    assert notion.query_all.call_count == 1
+
+    pages, total = replica.list_pages({"set": "Base Set"}, limit=1)
+    assert total == 2
+    assert [page["card_id"] for page in pages] == ["base1-58"]  # newest first
+    assert pages[0]["market_price"] == 1.5
+
+    assert replica.count({"repeated": True})[0] == 1
+    assert replica.count({"group_id": "binder"}, group_by="rarity") == (2, {"Rare Holo": 1, "Common": 1})
+
+def test_incremental_sync_applies_edits_and_archives(replica):
+    notion = MagicMock()
+    notion.query_all.return_value = iter([make_page("page-1", "base1-4", "Base Set"), make_page("page-2", "sv3-1", "Obsidian Flames")])
+    sync_replica(notion, replica)
+
+    notion.query_all.return_value = iter([
+        make_page("page-1", "base1-4", "Base Set", repeated=True),
+        make_page("page-2", "sv3-1", "Obsidian Flames", archived=True)
+    ])
+    result = sync_replica(notion, replica)
+
+    assert result == {"full": False, "pages": 2}
+    assert notion.query_all.call_args.args[0]["timestamp"] == "last_edited_time"
+    assert replica.count({})[0] == 1
+    assert replica.count({"repeated": True})[0] == 1
@@ -0,0 +1,54 @@
+import asyncio
+
+from singleflight import SingleFlight
+
+def test_errors_are_shared_and_keys_released():
+    flights = SingleFlight()
+    calls = 0
+
+    async def failing():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream down")
+
+    async def run():
+        results = await asyncio.gather(*(flights.do("key", failing) for _ in range(3)), return_exceptions=True)
+        # A later call is not joined to the finished one
+        later = await flights.do("key", lambda: asyncio.sleep(0, "ok"))
+        return results, later
+
+    results, later = asyncio.run(run())
+
+    assert calls == 1
+    assert all(isinstance(result, ValueError) for result in results)
+    assert later == "ok"
+    assert flights.stats()["coalesced"] == 2
+    assert flights.stats()["in_flight"] == 0
+
+def test_cancelling_the_first_caller_does_not_cancel_joined_callers():
+    flights = SingleFlight()
+    calls = 0
+
+    async def slow():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    async def run():
+        owner = asyncio.ensure_future(flights.do("key", slow))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flights.do("key", slow))
+        batch = asyncio.ensure_future(flights.do_many(["key"], lambda keys: slow()))
+        await asyncio.sleep(0)
+        owner.cancel()
+        return await asyncio.gather(owner, waiter, batch, return_exceptions=True)
+
+    owner, waiter, batch = asyncio.run(run())
+
+    assert isinstance(owner, asyncio.CancelledError)
+    assert waiter == "ok"
+    assert batch == {"key": "ok"}
+    assert calls == 1
+    assert flights.stats()["in_flight"] == 0
@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from catalog import CardCatalog
+from typeahead import NameIndex, Typeahead
+
+def make_card(card_id, name, set_id):
+    return {"id": card_id, "name": name, "set": {"id": set_id, "name": set_id}, "rarity": "Rare", "number": card_id.split("-")[-1]}
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = CardCatalog(str(tmp_path / "catalog.db"))
+    yield catalog
+    catalog.close()
+
+def test_prefix_matches_are_ranked_by_popularity():
+    index = NameIndex([
+        {"text": "Pikachu V", "popularity": 3},
+        {"text": "Pikachu", "popularity": 40},
+        {"text": "Flying Pikachu", "popularity": 50},
+        {"text": "Pidgey", "popularity": 10}
+    ])
+
+    assert [entry["text"] for entry in index.suggest("pi")] == ["Pikachu", "Pidgey", "Pikachu V", "Flying Pikachu"]
+    assert [entry["text"] for entry in index.suggest("PIKA", limit=2)] == ["Pikachu", "Pikachu V"]
+
+def test_typos_fall_back_to_trigram_matches():
+    index = NameIndex([{"text": "Charizard", "popularity": 5}, {"text": "Chansey", "popularity": 9}])
+
+    assert [entry["text"] for entry in index.suggest("charzard")] == ["Charizard"]
+    assert index.suggest("xyzzy") == []
+
+def test_typeahead_rebuilds_after_catalog_changes(catalog):
+    typeahead = Typeahead(catalog)
+
+    async def run():
+        assert await typeahead.ready() is False
+        catalog.replace_set({"id": "base1", "name": "Base Set"}, [
+            make_card("base1-4", "Charizard", "base1"),
+            make_card("base1-58", "Pikachu", "base1")
+        ])
+        assert await typeahead.ready() is True
+        before = typeahead.suggest("pik")
+
+        catalog.replace_set({"id": "jungle", "name": "Jungle"}, [make_card("jungle-60", "Pikachu", "jungle")])
+        await typeahead.ready()
+        await typeahead._build
+        return before, typeahead.suggest("pik"), typeahead.suggest("jun")
+
+    before, after, sets = asyncio.run(run())
+    assert before[0] == [{"text": "Pikachu", "popularity": 1}]
+    assert after[0] == [{"text": "Pikachu", "popularity": 2}]
+    assert sets[1] == [{"text": "Jungle", "set_id": "jungle", "popularity": 1}]
@@ -0,0 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+from unittest.mock import AsyncMock, patch, MagicMock
+
+import cv2
+import numpy as np
+import pytest
+
+import image_processing
+from config import Settings
+from image_processing import HashIndex, compute_phash
+from video_processing import collapse_detections, process_video_file, save_upload
+from tests.test_image_processing import make_card_image
+
+def test_collapse_detections_counts_repeated_pulls_and_drops_misreads():
+    detections = [(0.0, "a", 1), (0.2, "a", 1), (0.4, "b", 1), (0.6, "c", 1), (0.8, "c", 1), (1.0, "a", 1), (1.2, "a", 1)]
+    assert collapse_detections(detections, min_detections=2) == ["a", "c", "a"]
+    # A keyframe standing for several skipped near-duplicate frames is not a misread
+    assert collapse_detections([(0.0, "a", 12), (2.0, "b", 1)], min_detections=2) == ["a"]
+
+@pytest.fixture
+def video(tmp_path):
+    """Two seconds of card 1, a blank second, then two seconds of card 2, at 30 fps."""
+    path = str(tmp_path / "opening.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30.0, (245, 342))
+    card_1 = cv2.cvtColor(np.asarray(make_card_image(1)), cv2.COLOR_RGB2BGR)
+    card_2 = cv2.cvtColor(np.asarray(make_card_image(2)), cv2.COLOR_RGB2BGR)
+    blank = np.zeros_like(card_1)
+    for frame in [card_1] * 60 + [blank] * 30 + [card_2] * 60:
+        writer.write(frame)
+    writer.release()
+    return path
+
+def test_process_video_file_detects_each_card_once(video):
+    index = HashIndex(["base1-1", "base1-2"], np.array([compute_phash(make_card_image(n)) for n in (1, 2)], dtype=np.uint64))
+    settings = Settings(NOTION_TOKEN="test_notion_token", NOTION_DATABASE_ID="test_database_id")
+    with patch.object(image_processing, "_hash_index", index), \
+         patch("image_processing.get_settings", return_value=settings), \
+         patch("video_processing.get_settings", return_value=settings), \
+         ThreadPoolExecutor(max_workers=2) as executor:
+        result = process_video_file(video, executor)
+
+    assert result["card_ids"] == ["base1-1", "base1-2"]
+    assert result["frames"] == 150
+    assert result["sampled_frames"] == 30
+    # Identical consecutive frames are skipped, so only scene changes are recognized
+    assert result["keyframes"] == 3
+
+def test_failed_upload_removes_the_temp_file(tmp_path):
+    upload = MagicMock(filename="opening.mp4")
+    upload.read = AsyncMock(side_effect=[b"frames", ConnectionResetError()])
+
+    with patch("tempfile.tempdir", str(tmp_path)), pytest.raises(ConnectionResetError):
+        asyncio.run(save_upload(upload))
+
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,160 @@
+import asyncio
+import heapq
+import logging
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from catalog import CardCatalog, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Most suggestions returned for one query
+MAX_SUGGESTIONS = 20
+
+# Prefixes up to this length match thousands of keys, so their results are precomputed
+SHORT_PREFIX_LENGTH = 2
+
+# Share of the query's trigrams a name must contain to be offered as a typo correction
+MIN_TRIGRAM_SIMILARITY = 0.5
+
+def normalize(text: str) -> str:
+    """Lowercase a name and collapse punctuation, as the catalog does for its name search."""
+    return " ".join(tokenize(text))
+
+def query_trigrams(text: str) -> Set[str]:
+    """Trigrams of a partially typed name; padded at the start only, since the last word may be unfinished."""
+    padded = f"  {text}"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class NameIndex:
+    """In-memory prefix and trigram index over a list of names, for search-as-you-type.
+
+    Names are ranked by popularity once at build time, so an entry's position doubles
+    as its rank and every lookup only has to pick the smallest positions.
+    """
+
+    def __init__(self, entries: List[Dict[str, Any]]):
+        # Each entry has "text" and "popularity", plus any fields returned with it
+        self.entries = sorted(entries, key=lambda entry: (-entry["popularity"], entry["text"]))
+        self._names = [normalize(entry["text"]) for entry in self.entries]
+
+        # One key per word of every name so "char" finds "Dark Charizard" too
+        keys = []
+        trigrams: Dict[str, List[int]] = defaultdict(list)
+        for position, name in enumerate(self._names):
+            start = 0
+            for word in name.split(" "):
+                keys.append((name[start:], position, start == 0))
+                start += len(word) + 1
+            for trigram in query_trigrams(name):
+                trigrams[trigram].append(position)
+        keys.sort()
+        self._keys = [key[0] for key in keys]
+        self._key_entries = [(key[1], key[2]) for key in keys]
+        self._trigrams = dict(trigrams)
+
+        self._short: Dict[str, List[int]] = {}
+        for length in range(1, SHORT_PREFIX_LENGTH + 1):
+            for prefix in {key[:length] for key in self._keys if len(key) >= length}:
+                self._short[prefix] = self._scan(prefix, MAX_SUGGESTIONS)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _scan(self, prefix: str, limit: int) -> List[int]:
+        """Positions of names with a word starting with `prefix`, whole-name matches first."""
+        ranked: Dict[int, Tuple[bool, int]] = {}
+        index = bisect_left(self._keys, prefix)
+        while index < len(self._keys) and self._keys[index].startswith(prefix):
+            position, at_start = self._key_entries[index]
+            rank = (not at_start, position)
+            if rank < ranked.get(position, (True, len(self.entries))):
+                ranked[position] = rank
+            index += 1
+        return [rank[1] for rank in heapq.nsmallest(limit, ranked.values())]
+
+    def _fuzzy(self, query: str, limit: int, exclude: Set[int]) -> List[int]:
+        """Positions of names sharing most of the query's trigrams, to tolerate typos."""
+        grams = query_trigrams(query)
+        shared: Dict[int, int] = defaultdict(int)
+        for trigram in grams:
+            for position in self._trigrams.get(trigram, ()):
+                shared[position] += 1
+        needed = MIN_TRIGRAM_SIMILARITY * len(grams)
+        candidates = [
+            (-count, position) for position, count in shared.items()
+            if count >= needed and position not in exclude
+        ]
+        return [position for _, position in heapq.nsmallest(limit, candidates)]
+
+    def suggest(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Best matches for a partially typed name: prefix matches by popularity, then typo corrections."""
+        query = normalize(query)
+        limit = min(limit, MAX_SUGGESTIONS)
+        if not query or limit < 1:
+            return []
+
+        if query in self._short:
+            positions = self._short[query][:limit]
+        else:
+            positions = self._scan(query, limit)
+        if len(positions) < limit and len(query) >= 3:
+            positions += self._fuzzy(query, limit - len(positions), set(positions))
+        return [self.entries[position] for position in positions]
+
+def build_name_indexes(catalog: CardCatalog) -> Tuple[NameIndex, NameIndex]:
+    """Card name and set name indexes, ranked by how many cards carry the name or belong to the set."""
+    names = NameIndex([
+        {"text": name, "popularity": printings}
+        for name, printings in catalog.name_counts()
+    ])
+    sets = NameIndex([
+        {"text": name, "set_id": set_id, "popularity": cards}
+        for set_id, name, cards in catalog.set_card_counts()
+    ])
+    return names, sets
+
+class Typeahead:
+    """Name indexes built from the local catalog and rebuilt in the background when it changes."""
+
+    def __init__(self, catalog: CardCatalog):
+        self.catalog = catalog
+        self.names: Optional[NameIndex] = None
+        self.sets: Optional[NameIndex] = None
+        self._version: Optional[int] = None
+        self._build: Optional[asyncio.Task] = None
+
+    async def _rebuild(self) -> None:
+        version = self.catalog.version
+        started = time.perf_counter()
+        try:
+            self.names, self.sets = await asyncio.to_thread(build_name_indexes, self.catalog)
+        except Exception as e:
+            logger.error(f"Error building typeahead index: {str(e)}")
+            return
+        self._version = version
+        logger.info(
+            f"Typeahead index built with {len(self.names)} names and {len(self.sets)} sets "
+            f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+        )
+
+    async def ready(self) -> bool:
+        """Whether suggestions can be served; the first call waits for the index to be built."""
+        building = self._build is not None and not self._build.done()
+        if self.names is None:
+            if not self.catalog.is_synced():
+                return False
+            if not building:
+                self._build = asyncio.create_task(self._rebuild())
+            await asyncio.shield(self._build)
+            return self.names is not None
+        elif self._version != self.catalog.version and not building:
+            # Keep serving the current index while the new one is built
+            self._build = asyncio.create_task(self._rebuild())
+        return True
+
+    def suggest(self, query: str, limit: int = 10) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Matching card names and set names."""
+        return self.names.suggest(query, limit), self.sets.suggest(query, limit)
@@ -0,0 +1,193 @@
+from fastapi import APIRouter, UploadFile, File
+from concurrent.futures import Executor, Future
+from typing import Dict, Any, List, Optional, Tuple
+from collections import deque
+import asyncio
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+from schemas import CardResponse
+from config import get_settings
+from image_processing import get_process_pool, recognize_frame
+from card_processing import pokemon_tcg, trusted_card, trusted_card_response
+
+try:
+    import cv2
+except ImportError:  # pragma: no cover - optional dependency
+    cv2 = None
+
+logger = logging.getLogger(__name__)
+router = APIRouter(tags=["videos"])
+
+# Uploads are copied to disk in chunks of this size so the video is never held in memory
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Frames are downscaled to this longest side before being sent to the recognition workers
+KEYFRAME_MAX_SIZE = 512
+
+# Size of the greyscale thumbnail used for the cheap frame-difference check
+DIFF_THUMBNAIL_SIZE = (32, 32)
+
+def frame_signature(frame: np.ndarray) -> np.ndarray:
+    """Tiny greyscale thumbnail of a frame for near-duplicate detection."""
+    grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(grey, DIFF_THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+def shrink_frame(frame: np.ndarray) -> np.ndarray:
+    """Downscale a frame so it is cheap to send to another process."""
+    height, width = frame.shape[:2]
+    scale = KEYFRAME_MAX_SIZE / max(height, width)
+    if scale >= 1:
+        return frame
+    return cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+def collapse_detections(detections: List[Tuple[float, str, int]], min_detections: int) -> List[str]:
+    """Turn per-keyframe detections into a card list.
+
+    Each detection is (timestamp, card_id, frames), where `frames` counts the sampled
+    frames the keyframe stands for, itself and the near-duplicates skipped after it.
+    Consecutive detections of the same card are one sighting; sightings seen in fewer
+    than `min_detections` sampled frames are treated as misreads. A card shown again
+    later (a duplicate pull) counts again.
+    """
+    cards = []
+    current_id = None
+    hits = 0
+    for _, card_id, frames in sorted(detections):
+        if card_id == current_id:
+            hits += frames
+            continue
+        if current_id is not None and hits >= min_detections:
+            cards.append(current_id)
+        current_id, hits = card_id, frames
+    if current_id is not None and hits >= min_detections:
+        cards.append(current_id)
+    return cards
+
+def process_video_file(path: str, executor: Executor) -> Dict[str, Any]:
+    """Decode a video frame by frame and recognize the distinct keyframes on the executor."""
+    settings = get_settings()
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError("Could not decode video")
+
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    step = max(1, round(fps / settings.VIDEO_SAMPLE_FPS))
+    # Bound the frames waiting for recognition so decoding never runs far ahead
+    max_in_flight = (getattr(executor, "_max_workers", None) or os.cpu_count() or 1) * 2
+
+    pending: "deque[Tuple[int, float, Future]]" = deque()
+    detections = []
+    # Sampled frames each keyframe stands for, so a card held still is not taken for a misread
+    keyframe_frames: List[int] = []
+    previous = None
+    frame_number = 0
+    sampled = 0
+    keyframes = 0
+
+    def collect(keep: int = 0) -> None:
+        """Drain finished recognitions, waiting until at most `keep` remain in flight."""
+        while pending and (len(pending) > keep or pending[0][2].done()):
+            keyframe, timestamp, future = pending.popleft()
+            result = future.result()
+            if result["success"]:
+                detections.append((keyframe, timestamp, result["card_id"]))
+
+    try:
+        while True:
+            # grab() advances without converting the frame; only sampled frames are retrieved
+            if not capture.grab():
+                break
+            frame_number += 1
+            if (frame_number - 1) % step:
+                continue
+            ok, frame = capture.retrieve()
+            if not ok:
+                break
+            sampled += 1
+
+            signature = frame_signature(frame)
+            if previous is not None and np.abs(signature - previous).mean() < settings.VIDEO_FRAME_DIFF_THRESHOLD:
+                keyframe_frames[-1] += 1
+                continue
+            previous = signature
+            keyframe_frames.append(1)
+            keyframes += 1
+
+            collect(keep=max_in_flight - 1)
+            pending.append((keyframes - 1, frame_number / fps, executor.submit(recognize_frame, shrink_frame(frame))))
+
+        collect()
+    finally:
+        capture.release()
+
+    return {
+        "card_ids": collapse_detections(
+            [(timestamp, card_id, keyframe_frames[keyframe]) for keyframe, timestamp, card_id in detections],
+            settings.VIDEO_MIN_DETECTIONS
+        ),
+        "frames": frame_number,
+        "sampled_frames": sampled,
+        "keyframes": keyframes,
+        "detections": len(detections)
+    }
+
+async def save_upload(file: UploadFile) -> str:
+    """Stream an upload to a temporary file and return its path."""
+    suffix = os.path.splitext(file.filename or "")[1] or ".mp4"
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        try:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                await asyncio.to_thread(tmp.write, chunk)
+        except BaseException:
+            # Nothing will process a partial upload, so don't leave it behind
+            tmp.close()
+            os.unlink(tmp.name)
+            raise
+        return tmp.name
+
+@router.post("/process", response_model=CardResponse)
+async def process_video(file: UploadFile = File(...)):
+    """Detect the cards shown in a booster pack opening video."""
+    if cv2 is None:
+        return CardResponse(
+            success=False,
+            message="Error processing video",
+            error="Video processing requires opencv-python-headless"
+        )
+
+    path: Optional[str] = None
+    try:
+        path = await save_upload(file)
+        result = await asyncio.to_thread(process_video_file, path, get_process_pool())
+
+        if not result["card_ids"]:
+            return CardResponse(
+                success=False,
+                message="No cards found",
+                error="No cards were recognized in the video"
+            )
+
+        # Resolve every distinct card with batched lookups, keeping duplicate pulls
+        cards = await pokemon_tcg.get_cards(result["card_ids"])
+        transformed_cards = [trusted_card(cards[card_id]) for card_id in result["card_ids"] if card_id in cards]
+
+        return trusted_card_response(
+            success=True,
+            message=f"Detected {len(transformed_cards)} cards in {result['keyframes']} keyframes ({result['sampled_frames']} frames sampled)",
+            cards=transformed_cards
+        )
+
+    except Exception as e:
+        logger.error(f"Error processing video: {str(e)}")
+        return CardResponse(
+            success=False,
+            message="Error processing video",
+            error=str(e)
+        )
+    finally:
+        if path is not None:
+            os.remove(path)